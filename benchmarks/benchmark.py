@@ -0,0 +1,344 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Benchmarks the Create Vertex Cache operator on synthetic scenes.
+# Each run builds a scene procedurally (grids of meshes deformed by animated armatures, with a subdivision surface),
+# saves it to a temporary folder, and caches all its meshes with some operator settings.
+#
+# Usage:
+#   blender --background --factory-startup --python benchmarks/benchmark.py -- [options]
+# Options:
+#   --output results.json       Where to write the results (default: benchmark_results.json)
+#   --quick                     Only run the smallest scenes
+#   --scenes name,name          Only run these scenes
+#   --repeat 3                  Run each benchmark several times, the fastest run is kept
+#   --compare previous.json     Print the speed change compared to previous results
+#
+# The comparison can also be made without Blender:
+#   python benchmarks/benchmark.py --compare previous.json --output results.json
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import bpy # pylint: disable=import-error
+except ImportError:
+    bpy = None
+
+import numpy as np
+
+REPO_DIR = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+
+# The synthetic scenes: number of objects, vertices per side of each grid, number of bones, frame range
+SCENES = (
+    { 'name': 'small', 'objects': 1, 'resolution': 32, 'bones': 4, 'frames': 24 },
+    { 'name': 'dense', 'objects': 1, 'resolution': 160, 'bones': 8, 'frames': 24 },
+    { 'name': 'crowd', 'objects': 25, 'resolution': 32, 'bones': 4, 'frames': 24 },
+    { 'name': 'long', 'objects': 4, 'resolution': 64, 'bones': 4, 'frames': 250 },
+    { 'name': 'heavy', 'objects': 16, 'resolution': 128, 'bones': 8, 'frames': 100 },
+)
+QUICK_SCENES = ( 'small', 'crowd' )
+
+# The operator settings: a baseline, and each setting changed one at a time
+SETTINGS = (
+    { 'name': 'baseline', 'sampling': '1', 'world_space': True, 'apply_subsurf': False },
+    { 'name': 'subframes', 'sampling': '0.5', 'world_space': True, 'apply_subsurf': False },
+    { 'name': 'local_space', 'sampling': '1', 'world_space': False, 'apply_subsurf': False },
+    { 'name': 'apply_subsurf', 'sampling': '1', 'world_space': True, 'apply_subsurf': True },
+)
+
+# ========= MEASURES ===================
+
+def reset_peak_rss():
+    """Resets the peak resident set size of the process (Linux only), so it can be measured for each run"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss():
+    """
+    Gets the peak resident set size of the process, since the last reset if supported.
+
+    :return: The size in bytes.
+    :rtype: int
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int( line.split()[1] ) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss * 1024
+
+def directory_size( directory ):
+    """Gets the total size of the files in a directory and its subdirectories"""
+    size = 0
+    for root, dirs, files in os.walk( directory ):
+        for name in files:
+            size = size + os.path.getsize( os.path.join(root, name) )
+    return size
+
+def git_commit():
+    """Gets the current commit of the repository, or an empty string"""
+    try:
+        return subprocess.check_output( ['git', 'rev-parse', 'HEAD'], cwd = REPO_DIR, stderr = subprocess.DEVNULL ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+# ========= SCENES =====================
+
+def clear_scene():
+    """Removes all the objects and data of the current file"""
+    for collection in ( bpy.data.objects, bpy.data.meshes, bpy.data.armatures, bpy.data.actions ):
+        for item in list(collection):
+            collection.remove( item )
+
+def make_grid( name, resolution, size = 2.0 ):
+    """Creates a grid mesh along the X axis, with resolution x resolution vertices"""
+    xs = np.linspace( -size / 2.0, size / 2.0, resolution )
+    x, y = np.meshgrid( xs, xs )
+    co = np.stack( (x.ravel(), y.ravel(), np.zeros(resolution * resolution)), axis = 1 )
+    indices = np.arange( resolution * resolution ).reshape( (resolution, resolution) )
+    faces = np.stack( (indices[:-1, :-1], indices[:-1, 1:], indices[1:, 1:], indices[1:, :-1]), axis = -1 ).reshape( (-1, 4) )
+    mesh = bpy.data.meshes.new( name )
+    mesh.from_pydata( co.tolist(), [], faces.tolist() )
+    mesh.update()
+    return mesh
+
+def make_armature( context, name, num_bones, frame_start, frame_end, size = 2.0 ):
+    """Creates an animated chain of bones along the X axis"""
+    armature = bpy.data.armatures.new( name )
+    arm_obj = bpy.data.objects.new( name, armature )
+    context.scene.collection.objects.link( arm_obj )
+    context.view_layer.objects.active = arm_obj
+    bpy.ops.object.mode_set( mode = 'EDIT' )
+    length = size / num_bones
+    parent = None
+    for i in range(num_bones):
+        bone = armature.edit_bones.new( 'Bone.' + str(i).zfill(3) )
+        bone.head = ( -size / 2.0 + i * length, 0.0, 0.0 )
+        bone.tail = ( -size / 2.0 + (i + 1) * length, 0.0, 0.0 )
+        if parent is not None:
+            bone.parent = parent
+            bone.use_connect = True
+        parent = bone
+    bpy.ops.object.mode_set( mode = 'OBJECT' )
+
+    # a wave along the chain
+    middle = (frame_start + frame_end) / 2.0
+    for i, pose_bone in enumerate(arm_obj.pose.bones):
+        pose_bone.rotation_mode = 'XYZ'
+        for frame, angle in ( (frame_start, -0.3), (middle, 0.3), (frame_end, -0.3) ):
+            pose_bone.rotation_euler = ( 0.0, 0.0, angle * (1.0 if i % 2 == 0 else -1.0) )
+            pose_bone.keyframe_insert( 'rotation_euler', frame = frame )
+    return arm_obj
+
+def build_scene( context, scene_settings ):
+    """
+    Builds a synthetic scene: a grid of meshes, each one deformed by its own animated armature
+    and smoothed by a subdivision surface.
+
+    :return: The meshes to cache.
+    :rtype: bpy.types.Object[]
+    """
+    clear_scene()
+    scene = context.scene
+    scene.frame_start = 1
+    scene.frame_end = scene_settings['frames']
+    num_bones = scene_settings['bones']
+    resolution = scene_settings['resolution']
+    side = int( np.ceil( np.sqrt( scene_settings['objects'] ) ) )
+
+    objs = []
+    for i in range(scene_settings['objects']):
+        name = 'Bench.' + str(i).zfill(3)
+        offset = ( (i % side) * 3.0, (i // side) * 3.0, 0.0 )
+        arm_obj = make_armature( context, name + '.Armature', num_bones, scene.frame_start, scene.frame_end )
+        arm_obj.location = offset
+
+        obj = bpy.data.objects.new( name, make_grid( name, resolution ) )
+        scene.collection.objects.link( obj )
+        obj.parent = arm_obj
+        # one vertex group per bone, along the X axis
+        x = np.array( [ v.co.x for v in obj.data.vertices ] )
+        bone_indices = np.clip( ((x + 1.0) / 2.0 * num_bones).astype(int), 0, num_bones - 1 )
+        for b, bone in enumerate(arm_obj.data.bones):
+            group = obj.vertex_groups.new( name = bone.name )
+            group.add( np.flatnonzero( bone_indices == b ).tolist(), 1.0, 'REPLACE' )
+        armature_mod = obj.modifiers.new( 'Armature', 'ARMATURE' )
+        armature_mod.object = arm_obj
+        subsurf_mod = obj.modifiers.new( 'Subdivision', 'SUBSURF' )
+        subsurf_mod.levels = 1
+        subsurf_mod.render_levels = 1
+        objs.append( obj )
+    return objs
+
+# ========= BENCHMARK ==================
+
+def run( context, scene_settings, settings, work_dir ):
+    """
+    Builds a scene and caches all its meshes.
+
+    :return: The measures.
+    :rtype: dict
+    """
+    from duvertexcache import pc2 # pylint: disable=import-outside-toplevel
+
+    objs = build_scene( context, scene_settings )
+    blend_path = os.path.join( work_dir, scene_settings['name'] + '.blend' )
+    bpy.ops.wm.save_as_mainfile( filepath = blend_path )
+    cache_dir = os.path.join( work_dir, scene_settings['name'] + '_VertexCache' )
+    if os.path.isdir( cache_dir ):
+        shutil.rmtree( cache_dir )
+
+    for obj in context.view_layer.objects:
+        obj.select_set( obj in objs )
+    context.view_layer.objects.active = objs[0]
+
+    reset_peak_rss()
+    start_time = time.perf_counter()
+    bpy.ops.duvertexcache.create_vertex_cache(
+        sampling = settings['sampling'],
+        world_space = settings['world_space'],
+        apply_subsurf = settings['apply_subsurf'],
+        skip_unchanged = False,
+        )
+    wall_time = time.perf_counter() - start_time
+    rss = peak_rss()
+
+    num_samples = 0
+    num_vertices = 0
+    for root, dirs, files in os.walk( cache_dir ):
+        for name in files:
+            if not name.endswith('.pc2'):
+                continue
+            header = pc2.read_header( os.path.join(root, name) )
+            num_samples = num_samples + header['num_samples']
+            num_vertices = num_vertices + header['num_samples'] * header['num_points']
+
+    return {
+        'wall_time': wall_time,
+        'samples': num_samples,
+        'samples_per_second': num_samples / wall_time if wall_time > 0 else 0.0,
+        'vertices_per_second': num_vertices / wall_time if wall_time > 0 else 0.0,
+        'peak_rss': rss,
+        'bytes_written': directory_size( cache_dir ),
+    }
+
+def run_all( scene_names, repeat ):
+    """Runs the benchmarks and returns the results"""
+    import duvertexcache # pylint: disable=import-outside-toplevel
+    if not hasattr( bpy.types, 'DUVERTEXCACHE_OT_create_vertex_cache' ):
+        duvertexcache.register()
+
+    context = bpy.context
+    work_dir = tempfile.mkdtemp( prefix = 'duvertexcache_benchmark_' )
+    results = []
+    try:
+        for scene_settings in SCENES:
+            if scene_names and not scene_settings['name'] in scene_names:
+                continue
+            for settings in SETTINGS:
+                measures = None
+                for i in range(repeat):
+                    m = run( context, scene_settings, settings, work_dir )
+                    if measures is None or m['wall_time'] < measures['wall_time']:
+                        measures = m
+                result = {
+                    'id': scene_settings['name'] + '/' + settings['name'],
+                    'scene': dict(scene_settings),
+                    'settings': dict(settings),
+                }
+                result.update( measures )
+                results.append( result )
+                print( "{:<28} {:>8.3f} s {:>10.1f} samples/s {:>12.0f} vertices/s {:>8.1f} MB RSS {:>8.1f} MB written".format(
+                    result['id'], result['wall_time'], result['samples_per_second'], result['vertices_per_second'],
+                    result['peak_rss'] / 1048576, result['bytes_written'] / 1048576 ) )
+    finally:
+        shutil.rmtree( work_dir, ignore_errors = True )
+    return results
+
+def compare( results, previous ):
+    """Prints the speed change of each benchmark compared to previous results"""
+    previous_by_id = { r['id']: r for r in previous['results'] }
+    print( "Compared to " + (previous.get('commit') or 'previous results')[:12] + ":" )
+    for result in results['results']:
+        old = previous_by_id.get( result['id'] )
+        if old is None or result['wall_time'] <= 0:
+            continue
+        speedup = old['wall_time'] / result['wall_time']
+        memory = result['peak_rss'] / max( old['peak_rss'], 1 )
+        print( "{:<28} {:>6.2f}x speed {:>6.2f}x memory".format( result['id'], speedup, memory ) )
+
+def parse_args():
+    argv = sys.argv[ sys.argv.index('--') + 1: ] if '--' in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser( description = "Benchmarks the Create Vertex Cache operator" )
+    parser.add_argument( '--output', default = 'benchmark_results.json' )
+    parser.add_argument( '--quick', action = 'store_true' )
+    parser.add_argument( '--scenes', default = '' )
+    parser.add_argument( '--repeat', type = int, default = 1 )
+    parser.add_argument( '--compare', default = '' )
+    return parser.parse_args( argv )
+
+def main():
+    args = parse_args()
+
+    if bpy is None:
+        # outside of Blender, only compare existing results
+        if args.compare == '':
+            print( "Run the benchmarks with: blender --background --factory-startup --python benchmarks/benchmark.py -- [options]" )
+            return 1
+        with open(args.output, 'r') as f:
+            results = json.load( f )
+    else:
+        if not REPO_DIR in sys.path:
+            sys.path.insert( 0, REPO_DIR )
+        scene_names = [ name for name in args.scenes.split(',') if name != '' ]
+        if args.quick and not scene_names:
+            scene_names = list(QUICK_SCENES)
+        results = {
+            'commit': git_commit(),
+            'date': time.strftime( '%Y-%m-%dT%H:%M:%S' ),
+            'blender': bpy.app.version_string,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'results': run_all( scene_names, max( args.repeat, 1 ) ),
+        }
+        with open(args.output, 'w') as f:
+            json.dump( results, f, indent = 4 )
+        print( "Results written to " + os.path.abspath( args.output ) )
+
+    if args.compare != '':
+        with open(args.compare, 'r') as f:
+            compare( results, json.load( f ) )
+    return 0
+
+if __name__ == '__main__':
+    status = main()
+    if bpy is None:
+        sys.exit( status )
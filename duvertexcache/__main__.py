@@ -0,0 +1,142 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Caches many Blender files with a pool of background Blender processes, see cli.py
+# This runs with any Python 3, it does not need Blender.
+# Usage: python -m duvertexcache [--blender path] [--processes N] [--enable-autoexec] [--summary file.json] files.blend... [-- cli options]
+# Files can also be listed in a text file, one per line, passed as @list.txt
+#
+# Exit code: 0 if all the files are cached, 1 if any failed.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CLI_SCRIPT = os.path.join( os.path.dirname( os.path.abspath(__file__) ), 'cli.py' )
+
+def read_files( paths ):
+    """Expands @list files to the files they list"""
+    files = []
+    for path in paths:
+        if not path.startswith('@'):
+            files.append( path )
+            continue
+        with open(path[1:], 'r') as f:
+            files.extend( [ line.strip() for line in f if line.strip() != '' and not line.strip().startswith('#') ] )
+    return files
+
+def log_path( log_dir, index, blend_file ):
+    """The log file of a Blender process; files may have the same name in different folders"""
+    name = os.path.splitext( os.path.basename( blend_file ) )[0]
+    return os.path.join( log_dir, str(index).zfill(4) + '_' + name + '.log' )
+
+def cache_file( blender, blend_file, cli_args, log_path, timeout, autoexec = False ):
+    """
+    Caches one file in a background Blender process.
+
+    :arg autoexec: Runs the Python scripts and drivers of the file, which --factory-startup disables otherwise.
+    :type autoexec: bool
+    :return: The summary written by cli.py, with the exit code, log file and time of the process.
+    :rtype: dict
+    """
+    name = os.path.splitext( os.path.basename( blend_file ) )[0]
+    summary_fd, summary_path = tempfile.mkstemp( prefix = name + '_', suffix = '.json' )
+    os.close( summary_fd )
+    autoexec_arg = '--enable-autoexec' if autoexec else '--disable-autoexec'
+    # without --python-exit-code, Blender exits with 0 when the script raises an exception
+    command = [ blender, '--background', '--factory-startup', autoexec_arg, blend_file, '--python-exit-code', '1', '--python', CLI_SCRIPT, '--', '--summary', summary_path ] + cli_args
+    start_time = time.time()
+    summary = { 'blend_file': os.path.abspath( blend_file ), 'result': 'FAILED', 'message': '' }
+    try:
+        with open(log_path, 'w') as log:
+            process = subprocess.run( command, stdout = log, stderr = subprocess.STDOUT, timeout = timeout )
+        exit_code = process.returncode
+        try:
+            with open(summary_path, 'r') as f:
+                summary.update( json.load( f ) )
+        except (OSError, ValueError):
+            summary['message'] = "Blender exited without a summary, see the log"
+            if exit_code == 0:
+                exit_code = -1
+    except subprocess.TimeoutExpired:
+        exit_code = -1
+        summary['message'] = "Timed out after " + str(timeout) + " seconds"
+    except OSError as e:
+        exit_code = -1
+        summary['message'] = "Can't run Blender: " + str(e)
+    finally:
+        if os.path.isfile( summary_path ):
+            os.remove( summary_path )
+    summary['exit_code'] = exit_code
+    summary['log'] = log_path
+    summary['process_time'] = time.time() - start_time
+    return summary
+
+def parse_args( argv ):
+    cli_args = []
+    if '--' in argv:
+        cli_args = argv[ argv.index('--') + 1: ]
+        argv = argv[ :argv.index('--') ]
+    parser = argparse.ArgumentParser(
+        prog = "python -m duvertexcache",
+        description = "Caches the objects of many Blender files with a pool of background Blender processes. The arguments after -- are passed to cli.py, run it with --help to list them",
+        )
+    parser.add_argument( 'files', nargs = '+', help = "The Blender files to cache, or @list.txt to read them from a text file" )
+    parser.add_argument( '--blender', default = os.environ.get( 'BLENDER', 'blender' ), help = "The Blender executable, $BLENDER or blender by default" )
+    parser.add_argument( '--processes', type = int, default = max( (os.cpu_count() or 2) // 2, 1 ), help = "The maximum number of Blender processes running at once" )
+    parser.add_argument( '--timeout', type = float, default = None, help = "Kills a Blender process after this number of seconds" )
+    parser.add_argument( '--enable-autoexec', action = 'store_true', help = "Runs the Python scripts and drivers of the files (rigs, Python drivers); only use it with trusted files" )
+    parser.add_argument( '--log-dir', default = '', help = "The folder for the Blender logs, a temporary folder by default" )
+    parser.add_argument( '--summary', default = '', help = "Writes the JSON summary to this file, instead of printing it" )
+    args = parser.parse_args( argv )
+    return args, cli_args
+
+def main( argv ):
+    args, cli_args = parse_args( argv )
+    files = read_files( args.files )
+    log_dir = args.log_dir or tempfile.mkdtemp( prefix = 'duvertexcache_' )
+    os.makedirs( log_dir, exist_ok = True )
+
+    start_time = time.time()
+    results = []
+    with ThreadPoolExecutor( max_workers = max( args.processes, 1 ) ) as executor:
+        futures = [ executor.submit( cache_file, args.blender, blend_file, cli_args, log_path( log_dir, i, blend_file ), args.timeout, args.enable_autoexec ) for i, blend_file in enumerate(files) ]
+        for i, future in enumerate(futures):
+            result = future.result()
+            results.append( result )
+            status = "OK" if result['exit_code'] == 0 else "FAILED (" + str(result['exit_code']) + ") " + result['message']
+            print( "[" + str(i + 1) + "/" + str(len(files)) + "] " + result['blend_file'] + ": " + status, file = sys.stderr )
+
+    failed = [ result['blend_file'] for result in results if result['exit_code'] != 0 ]
+    summary = {
+        'files': results,
+        'failed': failed,
+        'processes': args.processes,
+        'time': time.time() - start_time,
+    }
+    if args.summary != '':
+        with open(args.summary, 'w') as f:
+            json.dump( summary, f, indent = 4 )
+    else:
+        print( json.dumps( summary, indent = 4 ) )
+    return 0 if len(failed) == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit( main( sys.argv[1:] ) )
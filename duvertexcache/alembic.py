@@ -0,0 +1,174 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Caches many objects to a single Alembic archive, with Blender's Alembic exporter,
+# and reads them back with Mesh Sequence Cache modifiers sharing a single Cache File.
+# Unlike PC2 files, Alembic archives can store meshes whose topology changes over time.
+
+import bpy # pylint: disable=import-error
+
+import hashlib
+import os
+import re
+
+from . import manifest
+
+EXTENSION = manifest.ARCHIVE_EXTENSION
+# The names of the modifiers and constraints added by DuVertexCache
+MODIFIER_NAME = "Mesh Sequence Cache (DuVertexCache)"
+TRANSFORM_CONSTRAINT_NAME = "Transform Cache (DuVertexCache)"
+# The exporter samples at most this number of times per frame
+MAX_SAMPLES_PER_FRAME = 128
+
+def archive_path( cache_dir, objs ):
+    """
+    Gets the archive of a set of objects. The same objects are always cached to the same archive,
+    so that caching them again replaces their previous archive, without changing the ones of other objects.
+
+    :rtype: str
+    """
+    h = hashlib.sha1()
+    for name in sorted( obj.name for obj in objs ):
+        h.update( name.encode('utf-8') + b'\0' )
+    return cache_dir + "/Cache_" + h.hexdigest()[:12] + EXTENSION
+
+def samples_per_frame( sampling ):
+    """Converts a sampling (frames per sample) to the number of samples per frame of the exporter.
+    The exporter samples every frame at least, larger samplings are rounded to one sample per frame"""
+    return min( max( int(round( 1.0 / sampling )), 1 ), MAX_SAMPLES_PER_FRAME )
+
+def export_archive( context, objs, filepath, start, end, sampling ):
+    """
+    Exports the evaluated meshes and the world transformations of some objects to an Alembic archive,
+    in a single pass over the frame range.
+
+    :arg objs: The objects to export, other objects are not exported.
+    :type objs: Object[]
+    :arg sampling: The number of frames per sample.
+    :type sampling: float
+    """
+    view_layer = context.view_layer
+    selection = [ obj for obj in view_layer.objects if obj.select_get() ]
+    samples = samples_per_frame( sampling )
+    # The options of the exporter changed with the versions of Blender, only the existing ones are set
+    options = {
+        'filepath': filepath,
+        'start': start,
+        'end': end,
+        'xsamples': samples,
+        'gsamples': samples,
+        'sh_open': 0.0,
+        'sh_close': 1.0,
+        'selected': True,
+        'visible_objects_only': False,
+        'renderable_only': False,
+        # world transformations without the hierarchy, each object is read back independently
+        'flatten': True,
+        'uvs': True,
+        'normals': True,
+        'vcolors': True,
+        'face_sets': True,
+        'apply_subdiv': False,
+        'curves_as_mesh': True,
+        'use_instancing': False,
+        'export_hair': False,
+        'export_particles': False,
+        'as_background_job': False,
+        'init_scene_frame_range': False,
+        'evaluation_mode': 'VIEWPORT',
+    }
+    rna = bpy.ops.wm.alembic_export.get_rna_type()
+    options = { name: value for name, value in options.items() if name in rna.properties }
+    try:
+        for obj in selection:
+            obj.select_set( False )
+        for obj in objs:
+            obj.select_set( True )
+        bpy.ops.wm.alembic_export( **options )
+    finally:
+        for obj in objs:
+            obj.select_set( False )
+        for obj in selection:
+            obj.select_set( True )
+    if not os.path.isfile( filepath ):
+        raise RuntimeError( "The Alembic archive could not be exported to " + filepath )
+
+def find_cache_file( filepath ):
+    """Gets the Cache File datablock reading an archive, or None"""
+    for cache_file in bpy.data.cache_files:
+        if os.path.abspath( bpy.path.abspath( cache_file.filepath ) ) == os.path.abspath( filepath ):
+            return cache_file
+    return None
+
+def load_cache_file( filepath ):
+    """Gets the Cache File datablock of an archive, opening it if needed, or reloading it if it already exists"""
+    cache_file = find_cache_file( filepath )
+    if cache_file is not None:
+        # setting the path reloads the archive, which may have been exported again
+        cache_file.filepath = cache_file.filepath
+        return cache_file
+    bpy.ops.cachefile.open( filepath = filepath )
+    cache_file = find_cache_file( filepath )
+    if cache_file is None:
+        raise RuntimeError( "The Alembic archive " + filepath + " could not be opened" )
+    return cache_file
+
+def archive_name( name ):
+    """The name of an object or mesh in an archive, where the exporter replaces some characters"""
+    return re.sub( r'[ .:]', '_', name )
+
+def object_paths( cache_file, obj ):
+    """
+    Finds an object in an archive exported with flatten.
+
+    :return: The path of its transformation and the path of its mesh, or empty strings if it's not found.
+    :rtype: tuple (str, str)
+    """
+    xform_path = '/' + archive_name( obj.name )
+    paths = [ item.path for item in cache_file.object_paths ]
+    if not xform_path in paths:
+        # older exporters keep the original names
+        xform_path = '/' + obj.name
+        if not xform_path in paths:
+            return '', ''
+    shapes = [ path for path in paths if path.startswith( xform_path + '/' ) and path.count('/') == 2 ]
+    if len(shapes) == 0:
+        return xform_path, ''
+    return xform_path, shapes[0]
+
+def add_cache( obj, cache_file, world_space = True ):
+    """
+    Reads the mesh of an object from an archive with a Mesh Sequence Cache modifier,
+    and in world space its transformation with a Transform Cache constraint.
+    The modifiers of the object must have been removed.
+
+    :return: The modifier, or None if the object is not in the archive.
+    :rtype: MeshSequenceCacheModifier
+    """
+    xform_path, mesh_path = object_paths( cache_file, obj )
+    if mesh_path == '':
+        return None
+    mod = obj.modifiers.new( MODIFIER_NAME, 'MESH_SEQUENCE_CACHE' )
+    mod.cache_file = cache_file
+    mod.object_path = mesh_path
+    if world_space:
+        # the archive contains the world transformations, including the ones of the constraints
+        for constraint in obj.constraints:
+            constraint.mute = True
+        constraint = obj.constraints.new( 'TRANSFORM_CACHE' )
+        constraint.name = TRANSFORM_CONSTRAINT_NAME
+        constraint.cache_file = cache_file
+        constraint.object_path = xform_path
+    return mod
@@ -0,0 +1,220 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Error-bounded selection of the temporal sampling of a cache
+# This module only depends on NumPy, it does not need Blender.
+
+from collections import deque
+
+import numpy as np
+
+def segment_error( segment ):
+    """
+    Measures how well the linear interpolation between the first and last samples of a segment
+    reproduces the samples in between.
+
+    :arg segment: The samples.
+    :type segment: numpy.ndarray of shape (n, num_points, 3)
+    :return: The largest distance between an interpolated point and the actual one.
+    :rtype: float
+    """
+    n = len(segment) - 1
+    if n < 2:
+        return 0.0
+    first = segment[0]
+    delta = segment[-1] - first
+    t = np.arange( 1, n ) / n
+    predicted = first + t[:, np.newaxis, np.newaxis] * delta
+    diff = predicted - segment[1:-1]
+    return float( np.sqrt( np.einsum( 'ijk,ijk->ij', diff, diff ).max() ) ) if diff.size > 0 else 0.0
+
+class SamplingEstimator():
+    """
+    Finds the coarsest sampling whose linear interpolation (as done by the Mesh Cache modifier)
+    reproduces the motion within a tolerance.
+    Samples are added one by one at a fine reference sampling; each candidate sampling must be a multiple of it.
+    Only the last samples are kept in memory, so the memory used does not depend on the frame range.
+    """
+
+    def __init__( self, reference, candidates, tolerance ):
+        """
+        :arg reference: The sampling of the samples which are added (frames per sample).
+        :type reference: float
+        :arg candidates: The samplings to choose from; the ones which are not a multiple of the reference are ignored.
+        :type candidates: float[]
+        :arg tolerance: The maximum distance between an interpolated point and the actual one.
+        :type tolerance: float
+        """
+        self.reference = reference
+        self.tolerance = tolerance
+        steps = set()
+        for candidate in candidates:
+            step = round( candidate / reference )
+            if step >= 1 and abs( step * reference - candidate ) < 1e-6:
+                steps.add( int(step) )
+        steps.add( 1 )
+        self.steps = sorted( steps )
+        # the largest error of each candidate, in samples of the reference sampling
+        self.errors = { step: 0.0 for step in self.steps }
+        self.num_samples = 0
+        self._buffer = deque( maxlen = self.steps[-1] + 1 )
+
+    @property
+    def is_decided( self ):
+        """True when only the reference sampling is still accurate enough, no need to add more samples"""
+        return all( self.errors[step] > self.tolerance for step in self.steps if step > 1 )
+
+    def add( self, points ):
+        """Adds the next sample, at the reference sampling"""
+        self._buffer.append( np.array( points, dtype=np.float64 ) )
+        i = self.num_samples
+        self.num_samples = i + 1
+        if i == 0:
+            return
+        for step in self.steps:
+            if step == 1 or i % step != 0 or self.errors[step] > self.tolerance:
+                continue
+            segment = np.stack( list(self._buffer)[-step - 1:] )
+            self.errors[step] = max( self.errors[step], segment_error( segment ) )
+
+    def finish( self ):
+        """Measures the samples after the last sample of each candidate.
+        The cache has a sample at or after the last frame (see pc2.sample_count), which is estimated by the last frame"""
+        last = self.num_samples - 1
+        for step in self.steps:
+            tail = last % step if last > 0 else 0
+            if tail < 2 or self.errors[step] > self.tolerance:
+                continue
+            segment = np.stack( list(self._buffer)[-tail - 1:] )
+            self.errors[step] = max( self.errors[step], segment_error( segment ) )
+
+    def choose( self ):
+        """
+        Gets the coarsest sampling within the tolerance.
+
+        :return: The sampling (frames per sample) and its error.
+        :rtype: tuple (float, float)
+        """
+        best = 1
+        for step in self.steps:
+            if self.errors[step] <= self.tolerance:
+                best = step
+        return round( best * self.reference, 6 ), self.errors[best]
+
+def refinement_chain( candidates, start = 1.0 ):
+    """
+    Gets the samplings at which the motion is checked below a starting sampling:
+    the candidates finer than it, each one dividing the previous one, so that the samples of a level are reused by the next one.
+
+    :arg candidates: The samplings to choose from (frames per sample).
+    :type candidates: float[]
+    :return: The samplings, from start to the finest.
+    :rtype: float[]
+    """
+    chain = [ start ]
+    for candidate in sorted( candidates, reverse = True ):
+        ratio = chain[-1] / candidate
+        if candidate < chain[-1] and abs( ratio - round(ratio) ) < 1e-6:
+            chain.append( candidate )
+    return chain
+
+def curved_segments( samples, tolerance ):
+    """
+    Finds where the motion is not linear between consecutive samples:
+    the segments around a sample which is not reproduced by interpolating the previous and next ones.
+    The motion between the samples is only checked on these segments.
+
+    :arg samples: The samples.
+    :type samples: numpy.ndarray of shape (n, num_points, 3)
+    :return: The indices i of the segments from sample i to sample i + 1.
+    :rtype: int[]
+    """
+    if len(samples) < 3 or samples.shape[1] == 0:
+        return []
+    diff = ( samples[:-2] + samples[2:] ) * 0.5 - samples[1:-1]
+    errors = np.sqrt( np.einsum( 'ijk,ijk->ij', diff, diff ).max(axis=1) )
+    curved = np.nonzero( errors > tolerance )[0]
+    return sorted( set( curved.tolist() ) | set( (curved + 1).tolist() ) )
+
+class SegmentRefiner():
+    """
+    Finds the sampling needed between some samples, checking their segments at finer and finer samplings (see refinement_chain).
+    At each level, the segments are checked by evaluating the samples of the next level inside them,
+    and only the segments whose interpolation is not within the tolerance are refined again.
+    """
+
+    def __init__( self, chain, tolerance ):
+        """
+        :arg chain: The samplings to check, from the coarsest, see refinement_chain.
+        :type chain: float[]
+        :arg tolerance: The maximum distance between an interpolated point and the actual one.
+        :type tolerance: float
+        """
+        self.chain = chain
+        self.tolerance = tolerance
+        self.level = 0
+        self.error = 0.0
+        # (start time, first sample, last sample) of the segments to check at the current level
+        self.segments = []
+
+    def add_segment( self, time, first, last ):
+        """Adds a segment of the coarsest sampling to check"""
+        self.segments.append( (time, first, last) )
+
+    @property
+    def is_done( self ):
+        return len(self.segments) == 0 or self.level >= len(self.chain) - 1
+
+    @property
+    def sampling( self ):
+        """The sampling found, once done"""
+        return self.chain[self.level]
+
+    def _sub_times( self, time ):
+        ratio = int(round( self.chain[self.level] / self.chain[self.level + 1] ))
+        return [ round( time + k * self.chain[self.level + 1], 6 ) for k in range(1, ratio) ]
+
+    def times( self ):
+        """The times to evaluate to check the segments of the current level"""
+        if self.is_done:
+            return []
+        return [ t for segment in self.segments for t in self._sub_times( segment[0] ) ]
+
+    def refine( self, samples ):
+        """
+        Checks the segments of the current level, and goes to the next level if some are not within the tolerance.
+
+        :arg samples: The samples at the times to evaluate, by time.
+        :type samples: dict of numpy.ndarray of shape (num_points, 3)
+        """
+        failed = []
+        error = 0.0
+        for time, first, last in self.segments:
+            sub_times = self._sub_times( time )
+            segment = [ first ] + [ samples[t] for t in sub_times ] + [ last ]
+            segment_err = segment_error( np.stack( segment ) )
+            if segment_err <= self.tolerance:
+                error = max( error, segment_err )
+                continue
+            times = [ time ] + sub_times
+            failed.extend( (t, segment[k], segment[k + 1]) for k, t in enumerate(times) )
+        self.error = max( self.error, error )
+        if len(failed) == 0:
+            self.segments = []
+            return
+        # the samples of the failed segments are the segments of the next level
+        self.level = self.level + 1
+        self.error = 0.0
+        self.segments = failed
@@ -0,0 +1,408 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Samples the evaluated geometry of objects and writes it to point caches
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from . import pc2
+
+# Added to the name of a cache for the file storing the world matrices of the object at each sample
+TRANSFORMS_SUFFIX = '_Transforms.npz'
+
+def transforms_path( filepath ):
+    """Gets the path of the world matrices stored next to a cache"""
+    return os.path.splitext( filepath )[0] + TRANSFORMS_SUFFIX
+
+def save_transforms( filepath, frames, matrices ):
+    """Stores the world matrices of an object at some frames"""
+    # numpy adds the extension if it's missing, the temporary file keeps it
+    tmp_path = filepath[:-len('.npz')] + '.tmp.npz'
+    np.savez( tmp_path, frames = np.asarray( frames, dtype=np.float64 ), matrices = np.asarray( matrices, dtype=np.float32 ) )
+    os.replace( tmp_path, filepath )
+
+def load_transforms( filepath ):
+    """
+    Reads the world matrices stored by save_transforms.
+
+    :return: The frames and the matrices, or None if the file is missing or invalid.
+    :rtype: tuple (numpy.ndarray of shape (n,), numpy.ndarray of shape (n, 4, 4))
+    """
+    try:
+        with np.load( filepath ) as data:
+            return data['frames'], data['matrices']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def patch_samples( times, patch_range ):
+    """
+    Gets the samples overwritten by a patch.
+
+    :arg times: The frames of all the samples of the cache.
+    :arg patch_range: The first and last frame (included) of the patch.
+    :type patch_range: tuple (first frame, last frame)
+    :return: The index of the first sample of the patch, and the frames of its samples.
+    :rtype: tuple (int, float[])
+    """
+    patch_from = next( (i for i, frame in enumerate(times) if frame >= patch_range[0] - 1e-5), len(times) )
+    return patch_from, [ frame for frame in times[patch_from:] if frame <= patch_range[1] + 1e-5 ]
+
+class CacheJob():
+    """
+    Caches the evaluated vertex coordinates of one object.
+    The coordinates are read with foreach_get into buffers which are reused for every sample.
+    """
+
+    def __init__( self, obj, filepath, world_space = True, sampling = None ):
+        self.obj = obj
+        self.filepath = filepath
+        self.world_space = world_space
+        # frames per sample, None to use the sampling of the bake
+        self.sampling = sampling
+        self.num_points = 0
+        # modifiers removed before baking, to be restored afterwards
+        self.removed_modifiers = []
+        # what the cache depends on, see manifest.object_fingerprint
+        self.fingerprint = ''
+        # True if the existing cache file can be used as is
+        self.up_to_date = False
+        # A compressed file replacing the PC2 file, which is expanded to a local PC2 file when needed
+        self.source = ''
+        # When set to a rigid.RigidTracker, samples are checked for rigid motion instead of being written
+        self.tracker = None
+        # When set to another job, samples are compared to the ones of this leader instead of being written,
+        # until they differ; shared stays True if they're all identical
+        self.leader = None
+        self.shared = False
+        self.shared_samples = 0
+        # A lower sampling version of the cache, read in the viewport
+        self.preview = ''
+        # The rigid tolerance with which the rigid parts of the cache were too large to be kept, or None
+        self.rigid_parts_rejected = None
+        # The cache file of another object used by this one, when their samples are identical
+        self.shared_filepath = ''
+        # the data of the object before it was made unique, see operators
+        self.original_data = None
+        # When set to a list, the world matrix of the object is appended to it at each sample
+        self.matrices = None
+        # The frames and world matrices of the object at each sample, once they're all known
+        self.transforms = None
+        self.writer = None
+        self._co = None
+        self._world = None
+        self._last = None
+        self._matrix = None
+        self._file_settings = None
+
+    def open( self, depsgraph, start, sampling, num_samples, resume = False, patch_from = -1 ):
+        """Allocates the buffers and opens the cache file.
+        With resume, an interrupted export of the same file is continued, see pc2.PC2Writer.
+        With patch_from, the samples of the existing file are overwritten from this sample index, see pc2.PC2Patcher"""
+        self.allocate( depsgraph )
+        self._file_settings = (start, sampling, num_samples)
+        self.shared = self.leader is not None and self.leader.num_points == self.num_points
+        self.shared_samples = 0
+        if self.tracker is None and not self.shared:
+            if patch_from >= 0:
+                self.writer = pc2.PC2Patcher( self.filepath, self.num_points, start - patch_from * sampling, sampling, patch_from )
+            else:
+                self.writer = pc2.PC2Writer( self.filepath, self.num_points, start, sampling, num_samples, resume = resume )
+
+    def allocate( self, depsgraph ):
+        """Allocates the buffers used to read the coordinates"""
+        mesh, obj_eval = self._get_mesh( depsgraph )
+        self.num_points = len(mesh.vertices) if mesh is not None else 0
+        obj_eval.to_mesh_clear()
+        self._co = np.empty( self.num_points * 3, dtype=np.float32 )
+        self._world = np.empty( (self.num_points, 3), dtype=np.float32 )
+
+    @property
+    def samples_written( self ):
+        """The number of samples already in the cache file (or checked by the tracker)"""
+        if self.tracker is not None:
+            return self.tracker.num_samples
+        if self.shared:
+            return self.shared_samples
+        if self.writer is None:
+            return 0
+        return self.writer.samples_written
+
+    def sample( self, depsgraph, stats = None ):
+        """Writes the current evaluated coordinates as a new sample.
+        The evaluation and write times are added to stats (a dublf.DUBLF_stats) if any"""
+        start = time.perf_counter()
+        co = self.read_coords( depsgraph )
+        evaluated = time.perf_counter()
+        if self.matrices is not None:
+            self.matrices.append( self._matrix )
+        if self.tracker is not None:
+            # once the motion is not rigid, the tracker stops counting samples and the job is not sampled anymore
+            self.tracker.update( co )
+        elif self.shared:
+            # the leader is sampled first, at the same frames
+            leader = self.leader
+            if leader.samples_written == self.shared_samples + 1 and np.array_equal( co, leader._last ):
+                self.shared_samples = self.shared_samples + 1
+            else:
+                self.detach()
+                self.writer.write_sample( co )
+        else:
+            self.writer.write_sample( co )
+        self._last = co
+        if stats is not None:
+            stats.add_time( 'evaluate', evaluated - start, self.obj.name )
+            stats.add_time( 'track' if self.tracker is not None else 'write', time.perf_counter() - evaluated, self.obj.name )
+            stats.count( 'samples', 1, self.obj.name )
+
+    def detach( self ):
+        """Stops sharing the samples of the leader: opens the cache file, and copies the samples which were identical"""
+        start, sampling, num_samples = self._file_settings
+        print(self.obj.name + " differs from " + self.leader.obj.name + " at frame " + str(round(start + self.shared_samples * sampling, 6)) + ", writing its own cache")
+        self.writer = pc2.PC2Writer( self.filepath, self.num_points, start, sampling, num_samples )
+        samples_per_block = max( pc2.PC2File.chunk_bytes // max(self.writer.sample_size, 1), 1 )
+        for first in range(0, self.shared_samples, samples_per_block):
+            self.writer.write_samples( self.leader.writer.read_samples( first, min( samples_per_block, self.shared_samples - first ) ) )
+        self.shared = False
+
+    def read_coords( self, depsgraph ):
+        """
+        Reads the evaluated vertex coordinates of the object.
+
+        :return: The coordinates, in world space if the job is set to, in a buffer owned by the job.
+        :rtype: numpy.ndarray of shape (num_points, 3)
+        """
+        mesh, obj_eval = self._get_mesh( depsgraph )
+        count = len(mesh.vertices) if mesh is not None else 0
+        if count != self.num_points:
+            obj_eval.to_mesh_clear()
+            raise RuntimeError( "The vertex count of " + self.obj.name + " changes over time (" + str(self.num_points) + " -> " + str(count) + "), it can't be cached to a PC2 file." )
+        if count > 0:
+            mesh.vertices.foreach_get( 'co', self._co )
+        matrix = np.array( obj_eval.matrix_world, dtype=np.float32 )
+        obj_eval.to_mesh_clear()
+        self._matrix = matrix
+
+        co = self._co.reshape( (-1, 3) )
+        if not self.world_space:
+            return co
+        # one matrix multiply for all the vertices
+        np.matmul( co, matrix[:3, :3].T, out=self._world )
+        self._world += matrix[:3, 3]
+        return self._world
+
+    def close( self ):
+        """Closes the cache file and releases the buffers"""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self._co = None
+        self._world = None
+        self._last = None
+
+    def _get_mesh( self, depsgraph ):
+        obj_eval = self.obj.evaluated_get( depsgraph )
+        return obj_eval.to_mesh(), obj_eval
+
+def evaluated_edges( obj, depsgraph ):
+    """
+    Reads the edges of the evaluated mesh of an object.
+
+    :return: The vertex indices of the edges.
+    :rtype: numpy.ndarray of shape (num_edges, 2)
+    """
+    obj_eval = obj.evaluated_get( depsgraph )
+    mesh = obj_eval.to_mesh()
+    if mesh is None:
+        obj_eval.to_mesh_clear()
+        return np.zeros( (0, 2), dtype=np.int32 )
+    edges = np.empty( len(mesh.edges) * 2, dtype=np.int32 )
+    if len(edges) > 0:
+        mesh.edges.foreach_get( 'vertices', edges )
+    obj_eval.to_mesh_clear()
+    return edges.reshape( (-1, 2) )
+
+def set_frame( scene, frame ):
+    """Sets the current frame, including the subframe"""
+    frame_int = int(frame)
+    scene.frame_set( frame_int, subframe = frame - frame_int )
+
+def read_samples( context, jobs, times ):
+    """
+    Evaluates the jobs at some frames, without writing anything.
+
+    :arg times: The frames.
+    :type times: float[]
+    :return: The samples of each job, in the same order as the jobs.
+    :rtype: list of numpy.ndarray of shape (len(times), num_points, 3)
+    """
+    scene = context.scene
+    frame_current = scene.frame_current
+    samples = []
+    if len(jobs) == 0 or len(times) == 0:
+        return samples
+    try:
+        set_frame( scene, times[0] )
+        depsgraph = context.evaluated_depsgraph_get()
+        for job in jobs:
+            job.allocate( depsgraph )
+            samples.append( np.empty( (len(times), job.num_points, 3), dtype=np.float32 ) )
+        for i, frame in enumerate(times):
+            set_frame( scene, frame )
+            for job, job_samples in zip(jobs, samples):
+                job_samples[i] = job.read_coords( depsgraph )
+    finally:
+        for job in jobs:
+            job.close()
+        scene.frame_set( frame_current )
+    return samples
+
+def hash_samples( context, jobs, times ):
+    """
+    Evaluates the jobs at some frames and hashes their samples, without keeping them in memory.
+
+    :arg times: The frames.
+    :type times: float[]
+    :return: The SHA1 digest of the samples of each job, in the same order as the jobs.
+    :rtype: str[]
+    """
+    scene = context.scene
+    frame_current = scene.frame_current
+    hashes = [ hashlib.sha1() for job in jobs ]
+    if len(jobs) == 0 or len(times) == 0:
+        return [ h.hexdigest() for h in hashes ]
+    try:
+        set_frame( scene, times[0] )
+        depsgraph = context.evaluated_depsgraph_get()
+        for job in jobs:
+            job.allocate( depsgraph )
+        for frame in times:
+            set_frame( scene, frame )
+            for job, h in zip(jobs, hashes):
+                h.update( np.ascontiguousarray( job.read_coords( depsgraph ), dtype=np.float32 ).tobytes() )
+    finally:
+        for job in jobs:
+            job.close()
+        scene.frame_set( frame_current )
+    return [ h.hexdigest() for h in hashes ]
+
+def read_matrices( context, objs, times ):
+    """
+    Evaluates the world matrices of objects at some frames.
+
+    :return: The matrices of each object, in the same order as the objects.
+    :rtype: list of numpy.ndarray of shape (len(times), 4, 4)
+    """
+    scene = context.scene
+    frame_current = scene.frame_current
+    matrices = [ np.empty( (len(times), 4, 4), dtype=np.float32 ) for obj in objs ]
+    if len(objs) == 0 or len(times) == 0:
+        return matrices
+    try:
+        set_frame( scene, times[0] )
+        depsgraph = context.evaluated_depsgraph_get()
+        for i, frame in enumerate(times):
+            set_frame( scene, frame )
+            for obj, obj_matrices in zip(objs, matrices):
+                obj_matrices[i] = np.array( obj.evaluated_get( depsgraph ).matrix_world, dtype=np.float32 )
+    finally:
+        scene.frame_set( frame_current )
+    return matrices
+
+def bake_steps( context, jobs, start, end, sampling, resume = False, sample_range = None, stats = None, patch_range = None ):
+    """
+    Steps the timeline from start to end and writes a sample for each job at each step.
+    All the jobs are evaluated from the same depsgraph and their files stay open during the whole pass,
+    so the scene is evaluated only once per sample, whatever the number of jobs.
+
+    :arg context: The context, used to get the scene and the evaluated depsgraph.
+    :arg jobs: The jobs to bake.
+    :type jobs: CacheJob[]
+    :arg start: The first frame.
+    :type start: int
+    :arg end: The last frame.
+    :type end: int
+    :arg sampling: The number of frames per sample, for the jobs which don't have their own sampling.
+    :type sampling: float
+    :arg resume: Continue interrupted exports from their last complete sample.
+    :type resume: bool
+    :arg sample_range: Only bake the samples from first (included) to stop (excluded).
+        The files then start at the first sample of the range.
+    :type sample_range: tuple (first, stop)
+    :arg stats: Records the time spent evaluating the scene, and evaluating and writing each job.
+    :type stats: dublf.DUBLF_stats
+    :arg patch_range: Only bake the samples from the first to the last frame (included) of this range,
+        and overwrite them in the existing files, which must cover the frames from start.
+    :type patch_range: tuple (first frame, last frame)
+    :return: A generator which bakes one frame each time it is advanced, and yields the number of frames done and to do.
+        If it is closed before the end, the files are closed and can be resumed.
+    :rtype: generator of tuple (int, int)
+    """
+    scene = context.scene
+    frame_current = scene.frame_current
+    if len(jobs) == 0:
+        return
+    # each job may have its own sampling
+    job_times = []
+    job_patches = []
+    for job in jobs:
+        times = pc2.sample_times( start, end, job.sampling or sampling )
+        if sample_range is not None:
+            times = times[sample_range[0]:sample_range[1]]
+        patch_from = -1
+        if patch_range is not None:
+            patch_from, times = patch_samples( times, patch_range )
+        job_times.append( times )
+        job_patches.append( patch_from )
+    # all the frames to evaluate, the ones shared by several jobs are evaluated once
+    frames = sorted( set( round(frame, 6) for times in job_times for frame in times ) )
+    if len(frames) == 0:
+        return
+    try:
+        set_frame( scene, frames[0] )
+        depsgraph = context.evaluated_depsgraph_get()
+        for job, times, patch_from in zip(jobs, job_times, job_patches):
+            if len(times) > 0:
+                job.open( depsgraph, times[0], job.sampling or sampling, len(times), resume = resume, patch_from = patch_from )
+        # Samples are written as soon as they're evaluated, only the missing ones are evaluated when resuming
+        due = [ times[job.samples_written] for job, times in zip(jobs, job_times) if job.samples_written < len(times) ]
+        first = min( due ) if len(due) > 0 else end
+        if first > frames[0]:
+            print("Resuming cache at frame " + str(first))
+        for done, frame in enumerate(frames):
+            if frame < first - 1e-5:
+                continue
+            sampled = [ job for job, times in zip(jobs, job_times) if job.samples_written < len(times) and abs( times[job.samples_written] - frame ) < 1e-5 ]
+            if len(sampled) == 0:
+                continue
+            frame_start = time.perf_counter()
+            set_frame( scene, frame )
+            if stats is not None:
+                stats.add_time( 'evaluate_scene', time.perf_counter() - frame_start )
+            for job in sampled:
+                job.sample( depsgraph, stats )
+            yield done + 1, len(frames)
+    finally:
+        for job in jobs:
+            job.close()
+        scene.frame_set( frame_current )
+
+def bake( context, jobs, start, end, sampling, resume = False, sample_range = None, stats = None, patch_range = None ):
+    """Bakes all the frames at once, see bake_steps"""
+    for progress in bake_steps( context, jobs, start, end, sampling, resume, sample_range, stats, patch_range ):
+        pass
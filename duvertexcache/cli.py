@@ -0,0 +1,212 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Caches the objects of a file from the command line
+# Usage: blender --background file.blend --python duvertexcache/cli.py -- [options]
+# Run with --help to list the options; all the options of the Create Vertex Cache operator are available.
+# To cache many files with a pool of Blender processes, see __main__.py
+#
+# Exit codes: 0 if the objects are cached, 1 if the bake failed or was cancelled,
+# 2 if the arguments are wrong or no object matches the selection.
+
+import bpy # pylint: disable=import-error
+
+import argparse
+import fnmatch
+import importlib
+import json
+import os
+import sys
+import time
+
+EXIT_SUCCESS = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+CACHEABLE_TYPES = ('MESH', 'CURVE', 'SURFACE', 'FONT')
+
+def register_addon():
+    """Registers the add-on if it's not enabled in this Blender session"""
+    if hasattr( bpy.types, 'DUVERTEXCACHE_OT_create_vertex_cache' ):
+        return
+    # This script is run by Blender as a file, make the package importable, whatever the name of its folder
+    package_dir = os.path.dirname( os.path.abspath(__file__) )
+    sys.path.insert( 0, os.path.dirname( package_dir ) )
+    importlib.import_module( os.path.basename( package_dir ) ).register()
+
+def operator_properties():
+    """Gets the RNA properties of the Create Vertex Cache operator"""
+    rna = bpy.ops.duvertexcache.create_vertex_cache.get_rna_type()
+    return [ prop for prop in rna.properties if prop.identifier != 'rna_type' ]
+
+def parse_bool( value ):
+    value = value.lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'off'):
+        return False
+    raise argparse.ArgumentTypeError( "Expected true or false, got " + value )
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog = "blender --background file.blend --python cli.py --",
+        description = "Creates the vertex caches of the objects of a Blender file" )
+
+    selection = parser.add_argument_group( "selection", "Objects matching all the given criteria are cached; all the cacheable objects of the scene by default" )
+    selection.add_argument( '--scene', default = '', help = "The scene to cache, the current one by default" )
+    selection.add_argument( '--collection', action = 'append', default = [], help = "Only objects in this collection (and its children). Can be repeated" )
+    selection.add_argument( '--name', action = 'append', default = [], help = "Only objects whose name matches this pattern (* and ? wildcards). Can be repeated" )
+    selection.add_argument( '--type', action = 'append', default = [], choices = CACHEABLE_TYPES, help = "Only objects of this type. Can be repeated" )
+
+    output = parser.add_argument_group( "output" )
+    output.add_argument( '--summary', default = '', help = "Writes the JSON summary to this file, instead of printing it" )
+    output.add_argument( '--save', action = 'store_true', help = "Saves the file after caching" )
+    output.add_argument( '--save-as', default = '', help = "Saves the file after caching to this path" )
+
+    options = parser.add_argument_group( "operator options" )
+    options.add_argument( '--no-undo', action = 'store_true', help = "Runs the operator without an undo step, the converted scene is not copied to the undo history" )
+    for prop in operator_properties():
+        arg = '--' + prop.identifier.replace( '_', '-' )
+        description = prop.description + " (default: " + str(prop.default) + ")"
+        if prop.type == 'BOOLEAN':
+            options.add_argument( arg, dest = prop.identifier, type = parse_bool, metavar = 'BOOL', help = description )
+        elif prop.type == 'INT':
+            options.add_argument( arg, dest = prop.identifier, type = int, help = description )
+        elif prop.type == 'FLOAT':
+            options.add_argument( arg, dest = prop.identifier, type = float, help = description )
+        elif prop.type == 'ENUM':
+            options.add_argument( arg, dest = prop.identifier, choices = [ item.identifier for item in prop.enum_items ], help = description )
+    return parser
+
+def select_objects( scene, args ):
+    """
+    Gets the objects of the scene matching the selection arguments.
+
+    :rtype: Object[]
+    """
+    types = args.type or CACHEABLE_TYPES
+    collection_objects = None
+    if len(args.collection) > 0:
+        collection_objects = set()
+        for name in args.collection:
+            collection = bpy.data.collections.get( name )
+            if collection is None:
+                raise ValueError( "Collection " + name + " not found" )
+            collection_objects.update( collection.all_objects )
+    objs = []
+    for obj in scene.objects:
+        if not obj.type in types:
+            continue
+        if collection_objects is not None and not obj in collection_objects:
+            continue
+        if len(args.name) > 0 and not any( fnmatch.fnmatchcase( obj.name, pattern ) for pattern in args.name ):
+            continue
+        objs.append( obj )
+    return objs
+
+def cache_dir( scene ):
+    """The folder where the operator writes the caches of a scene"""
+    blend_filepath = bpy.data.filepath
+    blend_name = os.path.splitext( bpy.path.basename( blend_filepath ) )[0]
+    return os.path.dirname( blend_filepath ) + "/" + blend_name + "_VertexCache/" + scene.name
+
+def write_summary( summary, filepath ):
+    if filepath == '':
+        print( json.dumps( summary, indent = 4 ) )
+        return
+    with open(filepath, 'w') as f:
+        json.dump( summary, f, indent = 4 )
+
+def main():
+    argv = sys.argv[ sys.argv.index('--') + 1: ] if '--' in sys.argv else []
+    register_addon()
+    parser = build_parser()
+    try:
+        args = parser.parse_args( argv )
+    except SystemExit as e:
+        # --help, or wrong arguments
+        return EXIT_SUCCESS if e.code == 0 else EXIT_USAGE
+
+    start_time = time.time()
+    summary = {
+        'blend_file': bpy.data.filepath,
+        'scene': '',
+        'objects': [],
+        'result': 'FAILED',
+        'message': '',
+    }
+
+    scene = bpy.data.scenes.get( args.scene ) if args.scene != '' else bpy.context.scene
+    if scene is None or bpy.data.filepath == '':
+        summary['message'] = "Scene " + args.scene + " not found" if scene is None else "The file must be saved to be cached"
+        write_summary( summary, args.summary )
+        return EXIT_USAGE
+    summary['scene'] = scene.name
+
+    try:
+        objs = select_objects( scene, args )
+    except ValueError as e:
+        objs = []
+        summary['message'] = str(e)
+    summary['objects'] = [ obj.name for obj in objs ]
+    if len(objs) == 0:
+        summary['message'] = summary['message'] or "No object matches the selection"
+        write_summary( summary, args.summary )
+        return EXIT_USAGE
+
+    options = { prop.identifier: getattr( args, prop.identifier ) for prop in operator_properties() if getattr( args, prop.identifier ) is not None }
+    options['modal'] = False
+    summary['options'] = options
+
+    view_layer = scene.view_layers[0]
+    for obj in scene.objects:
+        obj.select_set( obj in objs, view_layer = view_layer )
+    context_override = bpy.context.copy()
+    context_override['scene'] = scene
+    context_override['view_layer'] = view_layer
+    context_override['selected_objects'] = objs
+    context_override['active_object'] = objs[0]
+    context_override['object'] = objs[0]
+
+    status = EXIT_FAILED
+    try:
+        operator = bpy.ops.duvertexcache.create_vertex_cache_no_undo if args.no_undo else bpy.ops.duvertexcache.create_vertex_cache
+        result = operator( context_override, **options )
+        summary['result'] = list(result)[0]
+        if 'FINISHED' in result:
+            status = EXIT_SUCCESS
+    except RuntimeError as e:
+        # errors reported by the operator
+        summary['message'] = str(e)
+
+    if status == EXIT_SUCCESS and (args.save or args.save_as != ''):
+        if args.save_as != '':
+            bpy.ops.wm.save_as_mainfile( filepath = os.path.abspath( args.save_as ) )
+        else:
+            bpy.ops.wm.save_mainfile()
+        summary['saved_to'] = bpy.data.filepath
+
+    summary['cache_dir'] = cache_dir( scene )
+    try:
+        with open( summary['cache_dir'] + "/report.json", 'r' ) as f:
+            summary['report'] = json.load( f )
+    except (OSError, ValueError):
+        pass
+    summary['time'] = time.time() - start_time
+    write_summary( summary, args.summary )
+    return status
+
+if __name__ == '__main__':
+    sys.exit( main() )
@@ -0,0 +1,270 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Compact vertex cache (.duvc) format
+# This module only depends on NumPy, it does not need Blender.
+#
+# Positions are quantized to 16 bits inside the bounding box of the whole cache,
+# or to 32 bits when the box is too large for the maximum error with 16 bits (version 2),
+# each sample stores the (wrapping) difference with the previous one, split in byte planes,
+# held samples (identical to the previous one once quantized) are only recorded as runs,
+# and the whole stream is compressed with zlib.
+#
+# Layout: header | compressed samples (data_size bytes) | runs (num_runs uint32)
+# The runs alternate between stored and held samples, starting with stored samples.
+
+import hashlib
+import math
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+from . import pc2
+
+EXTENSION = '.duvc'
+# signature, version, num_points, start, sampling, num_samples, max_error, min (3), step (3), data_size, num_runs, coordinate_bytes
+HEADER_FORMAT = '<4siiffif3f3fQIB'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# version 1 files have no coordinate_bytes, always 2
+HEADER_FORMAT_V1 = '<4siiffif3f3fQI'
+HEADER_SIZE_V1 = struct.calcsize(HEADER_FORMAT_V1)
+SIGNATURE = b'DUVC'
+FILE_VERSION = 2
+# the quantization types, from the most compact
+COORDINATE_TYPES = ( np.uint16, np.uint32 )
+
+def compact_path( pc2_path ):
+    """Gets the path of the compact file stored next to a PC2 file"""
+    return os.path.splitext( pc2_path )[0] + EXTENSION
+
+def local_path( source_path, extension = '.pc2' ):
+    """
+    Gets the path of the local file where a compact cache (or any other cache which needs to be expanded) is expanded.
+    Expanded files are written in the temporary directory of the user, not next to the source
+    which may be on a slow network share.
+    """
+    source_path = os.path.abspath( source_path )
+    key = hashlib.sha1( source_path.encode('utf-8') ).hexdigest()[:12]
+    name = os.path.splitext( os.path.basename(source_path) )[0]
+    return os.path.join( tempfile.gettempdir(), 'DuVertexCache', key + '_' + name + extension )
+
+def read_header( filepath ):
+    """
+    Reads the header of a compact cache.
+
+    :rtype: dict
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE_V1:
+        raise ValueError( filepath + " is not a compact cache: the header is incomplete." )
+    signature, version = struct.unpack('<4si', data[:8])
+    if signature != SIGNATURE:
+        raise ValueError( filepath + " is not a compact cache: wrong signature." )
+    if version == 1:
+        values = struct.unpack(HEADER_FORMAT_V1, data[:HEADER_SIZE_V1]) + (2,)
+        header_size = HEADER_SIZE_V1
+    elif version == FILE_VERSION and len(data) == HEADER_SIZE:
+        values = struct.unpack(HEADER_FORMAT, data)
+        header_size = HEADER_SIZE
+    elif version == FILE_VERSION:
+        raise ValueError( filepath + " is not a compact cache: the header is incomplete." )
+    else:
+        raise ValueError( filepath + " uses an unsupported compact cache version (" + str(version) + ")." )
+    if values[15] not in [ np.dtype(t).itemsize for t in COORDINATE_TYPES ]:
+        raise ValueError( filepath + " is not a compact cache: wrong coordinate size." )
+    return {
+        'num_points': values[2],
+        'start': values[3],
+        'sampling': values[4],
+        'num_samples': values[5],
+        'max_error': values[6],
+        'min': np.array( values[7:10], dtype=np.float64 ),
+        'step': np.array( values[10:13], dtype=np.float64 ),
+        'data_size': values[13],
+        'num_runs': values[14],
+        'coordinate_bytes': values[15],
+        'header_size': header_size,
+    }
+
+def encode( pc2_path, filepath = '', max_error = 0.0001, level = 6 ):
+    """
+    Writes the compact version of a PC2 file.
+
+    :arg pc2_path: The PC2 file.
+    :arg filepath: The compact file, next to the PC2 file if empty.
+    :arg max_error: The maximum distance between an original point and its decoded position.
+    :type max_error: float
+    :arg level: The zlib compression level.
+    :return: The path to the compact file.
+    :rtype: str
+    :raises ValueError: If the bounding box is too large to keep the error below max_error, even with 32 bits.
+    """
+    if filepath == '':
+        filepath = compact_path( pc2_path )
+
+    with pc2.PC2File( pc2_path ) as cache:
+        bb_min, bb_max = cache.bounding_box()
+        bb_min = bb_min.astype(np.float64)
+        extent = bb_max.astype(np.float64) - bb_min
+        # Rounding moves each coordinate by at most step / 2, so a point moves by at most sqrt(3) * step / 2
+        step = np.full( 3, 2.0 * max_error / math.sqrt(3.0) )
+        # the smallest type keeping the error below max_error
+        for coordinate_type in COORDINATE_TYPES:
+            levels = np.iinfo( coordinate_type ).max
+            if np.all( extent / step <= levels ):
+                break
+        else:
+            needed = float( extent.max() / levels * math.sqrt(3.0) / 2.0 )
+            raise ValueError( "The cache " + pc2_path + " is too large to be quantized with a maximum error of " + str(max_error) + " (" + str(needed) + " needed)." )
+        # use all the levels available when they're more precise than needed
+        step = np.where( extent > 0, np.minimum( step, extent / levels ), 1.0 )
+        # quantize with the exact values stored in the header
+        bb_min = bb_min.astype(np.float32).astype(np.float64)
+        step = step.astype(np.float32).astype(np.float64)
+        error = float( math.sqrt( np.sum( (step / 2.0) ** 2 ) ) )
+
+        runs = []
+        data_size = 0
+        compressor = zlib.compressobj( level )
+        previous = np.zeros( (cache.num_points, 3), dtype=coordinate_type )
+        inv_step = 1.0 / step
+        with open(filepath, 'wb') as f:
+            f.write( bytes(HEADER_SIZE) )
+            for first, chunk in cache.chunks():
+                q = np.clip( np.rint( (chunk - bb_min) * inv_step ), 0, levels ).astype(coordinate_type)
+                # held samples are identical to the previous one
+                held = np.all( q == np.concatenate( (previous[np.newaxis], q[:-1]) ), axis=(1, 2) )
+                if first == 0 and len(held) > 0:
+                    held[0] = False
+                _append_runs( runs, held )
+                stored = q[~held]
+                if len(stored) > 0:
+                    # wrapping differences with the previous stored sample
+                    deltas = np.diff( np.concatenate( (previous[np.newaxis], stored) ), axis=0 )
+                    data = compressor.compress( _to_planes(deltas) )
+                    f.write( data )
+                    data_size = data_size + len(data)
+                previous = q[-1]
+            data = compressor.flush()
+            f.write( data )
+            data_size = data_size + len(data)
+            f.write( np.array( runs, dtype='<u4' ).tobytes() )
+            f.seek(0)
+            f.write( struct.pack( HEADER_FORMAT, SIGNATURE, FILE_VERSION,
+                cache.num_points, cache.start, cache.sampling, cache.num_samples, error,
+                *bb_min, *step, data_size, len(runs), np.dtype(coordinate_type).itemsize ) )
+    return filepath
+
+def expand( filepath, pc2_path ):
+    """
+    Decodes a compact cache to a PC2 file which can be read by the Mesh Cache modifier.
+    The file is decoded by blocks of samples, memory use does not depend on the number of samples.
+
+    :arg filepath: The compact file.
+    :arg pc2_path: The PC2 file to write.
+    :return: The path to the PC2 file.
+    :rtype: str
+    """
+    header = read_header( filepath )
+    num_points = header['num_points']
+    bb_min = header['min']
+    step = header['step']
+    coordinate_type = np.dtype( '<u' + str(header['coordinate_bytes']) )
+    sample_bytes = num_points * 3 * coordinate_type.itemsize
+    samples_per_block = max( (32 * 1024 * 1024) // max(sample_bytes, 1), 1 )
+
+    os.makedirs( os.path.dirname( os.path.abspath(pc2_path) ), exist_ok = True )
+    tmp_path = pc2_path + '.tmp'
+    with open(filepath, 'rb') as f:
+        f.seek( header['header_size'] + header['data_size'] )
+        runs = np.frombuffer( f.read( header['num_runs'] * 4 ), dtype='<u4' )
+        # the number of times each stored sample is written: once, plus the held samples which follow it
+        repeats = _stored_repeats( runs )
+
+        f.seek( header['header_size'] )
+        decompressor = zlib.decompressobj()
+        remaining = header['data_size']
+        pending = b''
+        previous = np.zeros( (num_points, 3), dtype=coordinate_type )
+        stored_index = 0
+        with pc2.PC2Writer( tmp_path, num_points, header['start'], header['sampling'], header['num_samples'] ) as writer:
+            while stored_index < len(repeats):
+                # read until a block of samples is available
+                count = min( samples_per_block, len(repeats) - stored_index )
+                while len(pending) < count * sample_bytes:
+                    data = f.read( min(remaining, 4 * 1024 * 1024) )
+                    remaining = remaining - len(data)
+                    if len(data) == 0:
+                        pending = pending + decompressor.flush()
+                        break
+                    pending = pending + decompressor.decompress( data )
+                if sample_bytes > 0:
+                    count = min( count, len(pending) // sample_bytes )
+                if count == 0:
+                    raise ValueError( filepath + " is truncated." )
+                deltas = _from_planes( pending[:count * sample_bytes], count, num_points, coordinate_type )
+                pending = pending[count * sample_bytes:]
+                deltas[0] += previous
+                q = np.cumsum( deltas, axis=0, dtype=coordinate_type )
+                previous = q[-1]
+                positions = (q * step + bb_min).astype(np.float32)
+                writer.write_samples( np.repeat( positions, repeats[stored_index:stored_index + count], axis=0 ) )
+                stored_index = stored_index + count
+    os.replace( tmp_path, pc2_path )
+    return pc2_path
+
+def _append_runs( runs, held ):
+    """Adds the held flags of a block of samples to the runs (stored, held, stored...)"""
+    if len(held) == 0:
+        return
+    if len(runs) == 0:
+        runs.append( 0 )
+    changes = np.flatnonzero( np.diff( held.astype(np.int8) ) ) + 1
+    bounds = np.concatenate( ([0], changes, [len(held)]) )
+    for a, b in zip( bounds[:-1], bounds[1:] ):
+        # runs with an odd index are held samples
+        if bool( held[a] ) == (len(runs) % 2 == 0):
+            runs[-1] = runs[-1] + int(b - a)
+        else:
+            runs.append( int(b - a) )
+
+def _stored_repeats( runs ):
+    """Converts the runs to the number of times each stored sample is repeated"""
+    stored_runs = runs[0::2]
+    held_runs = runs[1::2]
+    repeats = np.ones( int( stored_runs.sum() ), dtype=np.int64 )
+    # the held samples repeat the last stored sample of the previous run
+    ends = np.cumsum( stored_runs ) - 1
+    repeats[ ends[:len(held_runs)] ] += held_runs
+    return repeats
+
+def _to_planes( deltas ):
+    """Splits (n, points, 3) unsigned integers into per-sample byte planes: all the low bytes of x, y, z, then the next bytes"""
+    n, num_points = deltas.shape[0], deltas.shape[1]
+    width = deltas.dtype.itemsize
+    axes = np.ascontiguousarray( deltas.transpose(0, 2, 1) ).astype( '<u' + str(width) )
+    planes = axes.view(np.uint8).reshape( (n, 3, num_points, width) ).transpose(0, 3, 1, 2)
+    return np.ascontiguousarray( planes ).tobytes()
+
+def _from_planes( data, n, num_points, coordinate_type = np.uint16 ):
+    """Reverts _to_planes"""
+    width = np.dtype(coordinate_type).itemsize
+    planes = np.frombuffer( data, dtype=np.uint8 ).reshape( (n, width, 3, num_points) )
+    axes = np.ascontiguousarray( planes.transpose(0, 2, 3, 1) ).view( '<u' + str(width) ).reshape( (n, 3, num_points) )
+    return np.ascontiguousarray( axes.transpose(0, 2, 1) ).astype(coordinate_type)
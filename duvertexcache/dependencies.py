@@ -0,0 +1,125 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Index of the objects deforming other objects (armatures, lattices, curves, surface deform targets...)
+
+# The modifiers which deform an object with another one, and the name of the property holding that other object
+DEFORMER_TARGETS = {
+    'ARMATURE': 'object',
+    'LATTICE': 'object',
+    'CURVE': 'object',
+    'MESH_DEFORM': 'object',
+    'SURFACE_DEFORM': 'target',
+}
+# Parenting types which deform the child
+DEFORMER_PARENTS = {'ARMATURE', 'LATTICE'}
+
+def object_targets( obj ):
+    """
+    Gets the objects deforming an object, through its modifiers or its parent.
+
+    :rtype: set of Object
+    """
+    targets = set()
+    for mod in obj.modifiers:
+        prop = DEFORMER_TARGETS.get( mod.type )
+        if prop is None:
+            continue
+        target = getattr( mod, prop, None )
+        if target is not None:
+            targets.add( target )
+    if obj.parent is not None and obj.parent_type in DEFORMER_PARENTS:
+        targets.add( obj.parent )
+    return targets
+
+class DependencyIndex():
+    """
+    Maps each deformer target to the objects using it, and each object to its targets.
+    It is built in a single pass over the objects, and updated object by object when their modifiers change.
+    """
+
+    def __init__( self, objects ):
+        """
+        :arg objects: All the objects to index, usually bpy.data.objects.
+        :type objects: Object[]
+        """
+        # target -> set of users
+        self.users = {}
+        # user -> set of targets
+        self.targets = {}
+        for obj in objects:
+            self.update( obj )
+
+    def update( self, obj ):
+        """Indexes the object again, after its modifiers or its parent have changed"""
+        for target in self.targets.pop( obj, () ):
+            users = self.users[target]
+            users.discard( obj )
+            if len(users) == 0:
+                del self.users[target]
+        targets = object_targets( obj )
+        if len(targets) == 0:
+            return
+        self.targets[obj] = targets
+        for target in targets:
+            self.users.setdefault( target, set() ).add( obj )
+
+    def is_used( self, obj ):
+        """True if the object deforms at least one other object"""
+        return obj in self.users
+
+    def unused_armatures( self, objects, armatures ):
+        """
+        Gets the armatures which don't deform any object anymore.
+
+        :arg objects: All the objects, usually bpy.data.objects.
+        :arg armatures: All the armatures, usually bpy.data.armatures.
+        :return: The armature data of which no object deforms anything.
+        :rtype: Armature[]
+        """
+        used = set()
+        for obj in objects:
+            if obj.type == 'ARMATURE' and self.is_used( obj ):
+                used.add( obj.data )
+        return [ armature for armature in armatures if not armature in used ]
+
+    def sort( self, objects ):
+        """
+        Orders objects so that the targets come before the objects they deform.
+        The original order is kept as much as possible; objects in a dependency cycle keep their original order.
+
+        :rtype: Object[]
+        """
+        objects = list(objects)
+        remaining = set(objects)
+        # number of targets in the list which must be processed before each object
+        waiting = { obj: len( self.targets.get( obj, set() ) & remaining ) for obj in objects }
+        ordered = []
+        done = set()
+        progress = True
+        while progress:
+            progress = False
+            for obj in objects:
+                if obj in done or waiting[obj] > 0:
+                    continue
+                ordered.append( obj )
+                done.add( obj )
+                progress = True
+                for user in self.users.get( obj, () ):
+                    if user in waiting:
+                        waiting[user] -= 1
+        # cycles
+        ordered.extend( [ obj for obj in objects if not obj in done ] )
+        return ordered
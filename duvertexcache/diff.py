@@ -0,0 +1,239 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Compares two caches, or two cache directories, and measures how much the vertices moved
+# This module only depends on NumPy, it does not need Blender.
+# Usage: python -m duvertexcache.diff old new [--tolerance 0.0001] [--json report.json] [--frames]
+# old and new are two PC2 files or two _VertexCache (scene) directories.
+#
+# Exit codes: 0 if the caches are identical within the tolerance, 1 if they differ, 2 if they can't be compared.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from . import (
+    pc2,
+    manifest,
+)
+
+EXIT_IDENTICAL = 0
+EXIT_CHANGED = 1
+EXIT_ERROR = 2
+
+def sample_deviations( samples_a, samples_b ):
+    """
+    Measures the distances between the points of two blocks of samples.
+
+    :type samples_a: numpy.ndarray of shape (num_samples, num_points, 3)
+    :type samples_b: numpy.ndarray of shape (num_samples, num_points, 3)
+    :return: The max, mean and RMS distance of each sample.
+    :rtype: tuple of three numpy.ndarray of shape (num_samples,)
+    """
+    diff = np.subtract( samples_a, samples_b, dtype=np.float64 )
+    squared = np.einsum( 'sij,sij->si', diff, diff )
+    distances = np.sqrt( squared )
+    return distances.max(axis=1), distances.mean(axis=1), np.sqrt( squared.mean(axis=1) )
+
+def compare_files( path_a, path_b, tolerance = 0.0 ):
+    """
+    Compares two PC2 files sample by sample, by blocks, so that the memory used does not depend on the size of the files.
+
+    :arg tolerance: The caches are considered changed if a point moved more than this distance.
+    :type tolerance: float
+    :return: The comparison: 'status' ('identical', 'changed' or 'mismatch'), 'mismatches' (what prevents or limits the comparison;
+        caches with a different number of samples are changed, their common samples are compared),
+        'max', 'mean', 'rms' (over all the compared samples), 'worst_frame', 'compared_samples',
+        and for each compared sample: 'frame', 'frame_max', 'frame_mean', 'frame_rms'.
+    :rtype: dict
+    """
+    result = {
+        'file_a': path_a,
+        'file_b': path_b,
+        'status': 'identical',
+        'mismatches': [],
+        'compared_samples': 0,
+        'max': 0.0,
+        'mean': 0.0,
+        'rms': 0.0,
+        'worst_frame': None,
+        'frame': [],
+        'frame_max': [],
+        'frame_mean': [],
+        'frame_rms': [],
+    }
+    with pc2.PC2File( path_a ) as file_a, pc2.PC2File( path_b ) as file_b:
+        mismatches = result['mismatches']
+        same_sampling = abs( file_a.sampling - file_b.sampling ) < 1e-6 and abs( file_a.start - file_b.start ) < 1e-6
+        if file_a.num_points != file_b.num_points:
+            mismatches.append( "vertex count: " + str(file_a.num_points) + " -> " + str(file_b.num_points) )
+        if abs( file_a.sampling - file_b.sampling ) > 1e-6:
+            mismatches.append( "sampling: " + str(round(file_a.sampling, 6)) + " -> " + str(round(file_b.sampling, 6)) )
+        if abs( file_a.start - file_b.start ) > 1e-6:
+            mismatches.append( "start frame: " + str(round(file_a.start, 6)) + " -> " + str(round(file_b.start, 6)) )
+        # the common samples can still be compared, the caches are changed
+        other_length = file_a.num_samples != file_b.num_samples
+        if other_length:
+            mismatches.append( "sample count: " + str(file_a.num_samples) + " -> " + str(file_b.num_samples) )
+        for f in (file_a, file_b):
+            if not f.is_complete:
+                mismatches.append( f.filepath + " is incomplete" )
+        # the samples can't be paired
+        if file_a.num_points != file_b.num_points or not same_sampling:
+            result['status'] = 'mismatch'
+            return result
+
+        # the common samples are compared
+        num_samples = min( file_a.num_samples, file_b.num_samples )
+        frame_max = np.zeros( num_samples, dtype=np.float64 )
+        frame_mean = np.zeros( num_samples, dtype=np.float64 )
+        frame_rms = np.zeros( num_samples, dtype=np.float64 )
+        if file_a.num_points > 0:
+            # float64 differences of both blocks, at most about chunk_bytes
+            sample_size = max( file_a.num_points * 3 * 8 * 2, 1 )
+            step = max( pc2.PC2File.chunk_bytes // sample_size, 1 )
+            for first in range(0, num_samples, step):
+                last = min( first + step, num_samples )
+                frame_max[first:last], frame_mean[first:last], frame_rms[first:last] = sample_deviations( file_a.samples[first:last], file_b.samples[first:last] )
+
+        frames = file_a.start + np.arange( num_samples ) * file_a.sampling
+        result['compared_samples'] = num_samples
+        result['frame'] = [ round(float(frame), 6) for frame in frames ]
+        result['frame_max'] = frame_max.tolist()
+        result['frame_mean'] = frame_mean.tolist()
+        result['frame_rms'] = frame_rms.tolist()
+        if num_samples > 0:
+            worst = int( np.argmax( frame_max ) )
+            result['max'] = float( frame_max[worst] )
+            result['mean'] = float( frame_mean.mean() )
+            result['rms'] = float( np.sqrt( np.mean( frame_rms ** 2 ) ) )
+            result['worst_frame'] = result['frame'][worst]
+        if len(mismatches) > (1 if other_length else 0):
+            result['status'] = 'mismatch'
+        elif result['max'] > tolerance or other_length:
+            result['status'] = 'changed'
+    return result
+
+def cache_names( cache_dir ):
+    """Gets the names of the PC2 files of a cache directory, including the ones replaced by a compressed cache"""
+    names = set()
+    for name in os.listdir( cache_dir ):
+        base, ext = os.path.splitext( name )
+        if ext.lower() == '.pc2' or ext.lower() in manifest.EXPANDERS:
+            names.add( base + '.pc2' )
+    return names
+
+def readable_pc2( filepath, tmp_dir ):
+    """Gets a PC2 file which can be read for a cache, expanding its compressed version to the temporary folder if needed"""
+    source = manifest.cache_source( filepath )
+    if source == '':
+        return filepath
+    expanded = os.path.join( tmp_dir, str(len(os.listdir(tmp_dir))) + '_' + os.path.basename( filepath ) )
+    manifest.EXPANDERS[ os.path.splitext(source)[1].lower() ]( source, expanded )
+    return expanded
+
+def compare_dirs( dir_a, dir_b, tolerance = 0.0 ):
+    """
+    Compares the caches with the same name in two cache directories.
+    Compressed caches are expanded one by one to a temporary folder, which is removed after each comparison.
+
+    :return: 'files': the comparison of each cache, see compare_files, 'only_a' and 'only_b': the caches missing in the other directory.
+    :rtype: dict
+    """
+    names_a = cache_names( dir_a )
+    names_b = cache_names( dir_b )
+    result = {
+        'dir_a': dir_a,
+        'dir_b': dir_b,
+        'files': [],
+        'only_a': sorted( names_a - names_b ),
+        'only_b': sorted( names_b - names_a ),
+    }
+    for name in sorted( names_a & names_b ):
+        tmp_dir = tempfile.mkdtemp( prefix = 'duvertexcache_diff_' )
+        try:
+            try:
+                comparison = compare_files( readable_pc2( os.path.join( dir_a, name ), tmp_dir ), readable_pc2( os.path.join( dir_b, name ), tmp_dir ), tolerance )
+            except (OSError, ValueError) as e:
+                comparison = { 'status': 'mismatch', 'mismatches': [ str(e) ] }
+        finally:
+            shutil.rmtree( tmp_dir, ignore_errors = True )
+        comparison['name'] = name
+        result['files'].append( comparison )
+    return result
+
+def print_comparison( name, comparison ):
+    line = name + ": " + comparison['status']
+    if comparison.get('compared_samples', 0) > 0:
+        line += " (max " + format(comparison['max'], '.6g') + " at frame " + str(comparison['worst_frame']) + ", mean " + format(comparison['mean'], '.6g') + ", rms " + format(comparison['rms'], '.6g') + ")"
+    print(line)
+    for mismatch in comparison['mismatches']:
+        print("    " + mismatch)
+
+def main( argv ):
+    parser = argparse.ArgumentParser(
+        prog = "python -m duvertexcache.diff",
+        description = "Compares two PC2 files or two vertex cache directories" )
+    parser.add_argument( 'a', help = "The reference PC2 file or cache directory" )
+    parser.add_argument( 'b', help = "The PC2 file or cache directory to compare" )
+    parser.add_argument( '--tolerance', type = float, default = 0.0, help = "The caches are changed if a vertex moved more than this distance" )
+    parser.add_argument( '--json', default = '', help = "Writes the comparison to this JSON file, - for the standard output" )
+    parser.add_argument( '--frames', action = 'store_true', help = "Includes the deviations of each frame in the JSON" )
+    args = parser.parse_args( argv )
+
+    try:
+        if os.path.isdir( args.a ) and os.path.isdir( args.b ):
+            result = compare_dirs( args.a, args.b, args.tolerance )
+            comparisons = result['files']
+        else:
+            result = compare_files( args.a, args.b, args.tolerance )
+            result['name'] = os.path.basename( args.b )
+            comparisons = [ result ]
+    except (OSError, ValueError) as e:
+        print(str(e), file = sys.stderr)
+        return EXIT_ERROR
+
+    if not args.frames:
+        for comparison in comparisons:
+            for key in ('frame', 'frame_max', 'frame_mean', 'frame_rms'):
+                comparison.pop( key, None )
+
+    if args.json != '-':
+        for comparison in comparisons:
+            print_comparison( comparison['name'], comparison )
+        for name in result.get('only_a', []):
+            print(name + ": removed")
+        for name in result.get('only_b', []):
+            print(name + ": added")
+    if args.json == '-':
+        print( json.dumps( result, indent = 4 ) )
+    elif args.json != '':
+        with open(args.json, 'w') as f:
+            json.dump( result, f, indent = 4 )
+
+    statuses = set( comparison['status'] for comparison in comparisons )
+    if 'mismatch' in statuses:
+        return EXIT_ERROR
+    if 'changed' in statuses or len(result.get('only_a', [])) > 0 or len(result.get('only_b', [])) > 0:
+        return EXIT_CHANGED
+    return EXIT_IDENTICAL
+
+if __name__ == '__main__':
+    sys.exit( main( sys.argv[1:] ) )
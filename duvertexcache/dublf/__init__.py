@@ -23,6 +23,9 @@
 import bpy # pylint: disable=import-error
 import time
 import re
+import json
+import contextlib
+import pstats
 from . import rigging
 from . import modifiers
 from . import animation
@@ -40,12 +43,97 @@ class DUBLF_utils():
         print( " ".join( [ self.toolName , " (%.2f s):" % t , log ] ) )
         
     def showMessageBox( self, message = "", title = "Message Box", icon = 'INFO'):
-        """Displays a simple message box"""
+        """Displays a simple message box, message can be a list of lines"""
+        lines = message if isinstance(message, list) else [ message ]
         def draw(self, context):
             self.layout.alert = True
-            self.layout.label(text = message)
+            for line in lines:
+                self.layout.label(text = line)
         bpy.context.window_manager.popup_menu(draw, title = title, icon = icon)
 
+# ========= STATS ======================
+
+class DUBLF_stats( DUBLF_utils ):
+    """Records the time spent in each stage of a process and some counters,
+    in total and for each item (object...) it processes, and writes them to a JSON report"""
+
+    def __init__( self, toolName = "Dublf" ):
+        self.toolName = toolName
+        self.time_start = time.time()
+        self.totals = { 'stages': {}, 'counters': {} }
+        self.items = {}
+        self.profile = []
+
+    @contextlib.contextmanager
+    def timer( self, stage, item = "", verbose = False ):
+        """Times the enclosed code as a stage, for an item if any. With verbose, the time is logged"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.add_time( stage, duration, item )
+            if verbose:
+                self.log( stage + ( " [" + item + "]" if item != "" else "" ) + ": %.3f s" % duration, self.time_start )
+
+    def add_time( self, stage, duration, item = "" ):
+        """Adds some time (in seconds) to a stage"""
+        for record in self._records( item ):
+            stages = record['stages']
+            if not stage in stages:
+                stages[stage] = { 'time': 0.0, 'calls': 0 }
+            stages[stage]['time'] += duration
+            stages[stage]['calls'] += 1
+
+    def count( self, counter, value = 1, item = "" ):
+        """Adds a value to a counter"""
+        for record in self._records( item ):
+            counters = record['counters']
+            counters[counter] = counters.get( counter, 0 ) + value
+
+    def add_profile( self, profiler, filepath = "", limit = 30 ):
+        """Adds the functions which took the most time according to a cProfile.Profile to the report,
+        and saves the complete profile to filepath if any (it can be read with pstats or snakeviz)"""
+        if filepath != "":
+            profiler.dump_stats( filepath )
+        profile_stats = pstats.Stats( profiler )
+        functions = sorted( profile_stats.stats.items(), key = lambda f: f[1][3], reverse = True )
+        self.profile = []
+        for (filename, line, name), (primitive_calls, calls, total_time, cumulative_time, callers) in functions[:limit]:
+            self.profile.append( {
+                'function': filename + ":" + str(line) + "(" + name + ")",
+                'calls': calls,
+                'total_time': total_time,
+                'cumulative_time': cumulative_time,
+            } )
+
+    def to_dict( self, **info ):
+        """Gets the report, with some more info"""
+        report = {
+            'tool': self.toolName,
+            'date': time.strftime( '%Y-%m-%dT%H:%M:%S', time.localtime( self.time_start ) ),
+            'total_time': time.time() - self.time_start,
+        }
+        report.update( info )
+        report['stages'] = self.totals['stages']
+        report['counters'] = self.totals['counters']
+        report['items'] = self.items
+        if len(self.profile) > 0:
+            report['profile'] = self.profile
+        return report
+
+    def write( self, filepath, **info ):
+        """Writes the report to a JSON file"""
+        with open(filepath, 'w') as f:
+            json.dump( self.to_dict( **info ), f, indent = 4 )
+
+    def _records( self, item ):
+        if item == "":
+            return ( self.totals, )
+        if not item in self.items:
+            self.items[item] = { 'stages': {}, 'counters': {} }
+        return ( self.totals, self.items[item] )
+
 # ========= STRING METHODS =============
 
 class DUBLF_string():
@@ -130,6 +218,46 @@ class DUBLF_handlers():
         """Removes a function from frame_change_pre handler"""
         DUBLF_handlers.remove_function( bpy.app.handlers.depsgraph_update_post, fn )
 
+    @staticmethod
+    def load_post_append( fn ):
+        """Appends a function to load_post handler, taking care of duplicates"""
+        DUBLF_handlers.append_function_unique( bpy.app.handlers.load_post, fn )
+
+    @staticmethod
+    def load_post_remove( fn ):
+        """Removes a function from load_post handler"""
+        DUBLF_handlers.remove_function( bpy.app.handlers.load_post, fn )
+
+    @staticmethod
+    def save_post_append( fn ):
+        """Appends a function to save_post handler, taking care of duplicates"""
+        DUBLF_handlers.append_function_unique( bpy.app.handlers.save_post, fn )
+
+    @staticmethod
+    def save_post_remove( fn ):
+        """Removes a function from save_post handler"""
+        DUBLF_handlers.remove_function( bpy.app.handlers.save_post, fn )
+
+    @staticmethod
+    def undo_post_append( fn ):
+        """Appends a function to undo_post handler, taking care of duplicates"""
+        DUBLF_handlers.append_function_unique( bpy.app.handlers.undo_post, fn )
+
+    @staticmethod
+    def undo_post_remove( fn ):
+        """Removes a function from undo_post handler"""
+        DUBLF_handlers.remove_function( bpy.app.handlers.undo_post, fn )
+
+    @staticmethod
+    def redo_post_append( fn ):
+        """Appends a function to redo_post handler, taking care of duplicates"""
+        DUBLF_handlers.append_function_unique( bpy.app.handlers.redo_post, fn )
+
+    @staticmethod
+    def redo_post_remove( fn ):
+        """Removes a function from redo_post handler"""
+        DUBLF_handlers.remove_function( bpy.app.handlers.redo_post, fn )
+
 # ========= RNA ========================
 
 class DuBLF_rna():
@@ -18,6 +18,7 @@
 # <pep8 compliant>
 
 import bpy # pylint: disable=import-error
+import mathutils # pylint: disable=import-error
 
 # Animation (actions) tools and methods
 
@@ -49,6 +50,103 @@ def reset_transform(obj):
     obj.rotation_euler = [0,0,0]
     obj.scale = [1,1,1]
 
+# The properties included in the world matrix of an object
+TRANSFORM_PATHS = {
+    'location', 'rotation_euler', 'rotation_quaternion', 'rotation_axis_angle', 'scale',
+    'delta_location', 'delta_rotation_euler', 'delta_rotation_quaternion', 'delta_scale',
+}
+
+def reset_delta_transform(obj):
+    """
+    Resets the delta transformation of the object
+
+    :arg obj: The object
+    :type onj : Object(ID)
+    """
+    obj.delta_location = [0,0,0]
+    obj.delta_rotation_quaternion = [1,0,0,0]
+    obj.delta_rotation_euler = [0,0,0]
+    obj.delta_scale = [1,1,1]
+
+def bake_matrices(obj, frames, matrices, action_name = ''):
+    """
+    Replaces the transform animation of the object by keyframes of the given world matrices.
+    The object is unparented and its delta transformation is reset; its constraints should be disabled as they're included in the world matrices.
+    A new action is created so that actions shared with other objects are not modified;
+    it keeps the other animation of the previous action (visibility, custom properties...).
+    The NLA tracks are muted, they would be evaluated over the baked keyframes.
+
+    :arg obj: The object
+    :type obj: Object(ID)
+    :arg frames: The frame of each keyframe
+    :type frames: float[]
+    :arg matrices: The world matrix of each keyframe
+    :type matrices: list of 4x4 matrices (mathutils.Matrix or numpy.ndarray)
+    :arg action_name: The name of the new action, the object name followed by "_Baked" if empty
+    :type action_name: str
+    :return: The new action
+    :rtype: Action(ID)
+    """
+    if action_name == '':
+        action_name = obj.name + "_Baked"
+
+    locations = []
+    rotations = []
+    scales = []
+    previous = None
+    for matrix in matrices:
+        loc, rot, scale = mathutils.Matrix(matrix).decompose()
+        # keep the quaternions continuous to interpolate along the shortest path
+        if previous is not None and previous.dot(rot) < 0:
+            rot.negate()
+        previous = rot
+        locations.append(loc)
+        rotations.append(rot)
+        scales.append(scale)
+
+    obj.parent = None
+    obj.rotation_mode = 'QUATERNION'
+    reset_delta_transform(obj)
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    anim = obj.animation_data
+    if anim.use_tweak_mode:
+        anim.use_tweak_mode = False
+    for track in anim.nla_tracks:
+        track.mute = True
+    # keep the fcurves which are not transformations
+    if anim.action is not None:
+        action = anim.action.copy()
+        action.name = action_name
+        for curve in list(action.fcurves):
+            if curve.data_path in TRANSFORM_PATHS:
+                action.fcurves.remove(curve)
+    else:
+        action = bpy.data.actions.new(action_name)
+    anim.action = action
+
+    for data_path, values, size in (
+        ('location', locations, 3),
+        ('rotation_quaternion', rotations, 4),
+        ('scale', scales, 3),
+        ):
+        for index in range(size):
+            curve = action.fcurves.new(data_path, index = index, action_group = "Object Transforms")
+            keyframes = curve.keyframe_points
+            keyframes.add(len(frames))
+            co = []
+            for frame, value in zip(frames, values):
+                co.append(frame)
+                co.append(value[index])
+            keyframes.foreach_set('co', co)
+            for keyframe in keyframes:
+                keyframe.interpolation = 'LINEAR'
+            curve.update()
+
+    if len(matrices) > 0:
+        obj.matrix_world = mathutils.Matrix(matrices[0])
+    return action
+
 classes = (
 
 )
@@ -49,11 +49,8 @@ def collect_modifiers( obj, modifier_type = '', modifier_class='', post='NOTHING
                 continue
             if modifier_class == 'SIMULATE' and not mod.type in DUBLF_Modifiers.simulate_modifiers:
                 continue
-            if post == 'REMOVE' or post == 'APLLY':
-                backupMod = {}
-                for attr in dir(mod):
-                    backupMod[attr] = getattr(mod, attr)
-                modifiers.append(backupMod)
+            if post == 'REMOVE' or post == 'APPLY':
+                modifiers.append(backup_modifier(mod))
                 if post == 'REMOVE': obj.modifiers.remove(mod)
                 elif post == 'APPLY':
                     oc = bpy.context.copy()
@@ -64,19 +61,149 @@ def collect_modifiers( obj, modifier_type = '', modifier_class='', post='NOTHING
                 modifiers.append(mod)
     return modifiers
 
-def has_non_deform_modifiers(obj):
+def has_non_deform_modifiers(obj, stop = -1):
     """
     Checks if the object has modifiers which change vertex count/data (cannot be applied as shape key)
 
     :arg obj: The object to get the modifiers from.
     :type obj: Object(ID)
+    :arg stop: Only check the modifiers below this index, all of them if -1.
+    :type stop: int
     """
 
-    for mod in obj.modifiers:
+    mods = list(obj.modifiers)
+    if stop >= 0:
+        mods = mods[:stop]
+    for mod in mods:
         t = mod.type
         if t in DUBLF_Modifiers.modify_modifiers or t in DUBLF_Modifiers.generate_modifiers or t in DUBLF_Modifiers.simulate_modifiers:
             return True
+    return False
+
+def backup_modifier(mod):
+    """
+    Copies the settings of a modifier, so it can be removed and restored later with restore_modifier.
+
+    :arg mod: The modifier.
+    :type mod: Modifier
+    :return: The value of each property of the modifier, arrays are copied as tuples.
+    :rtype: dict
+    """
+    backupMod = {}
+    for prop in mod.bl_rna.properties:
+        attr = prop.identifier
+        if attr == 'rna_type':
+            continue
+        value = getattr(mod, attr)
+        if prop.type in {'BOOLEAN', 'INT', 'FLOAT'} and prop.is_array:
+            value = tuple(value)
+        elif prop.type == 'ENUM' and prop.is_enum_flag:
+            value = set(value)
+        elif prop.type == 'COLLECTION' or (prop.type == 'POINTER' and not isinstance(value, bpy.types.ID)):
+            continue
+        backupMod[attr] = value
+    return backupMod
+
+def restore_modifier(obj, backupMod):
+    """
+    Adds back a modifier from its backup, at the top of the stack.
+
+    :arg obj: The object to add the modifier to.
+    :type obj: Object(ID)
+    :arg backupMod: The backup made by backup_modifier (or collect_modifiers).
+    :type backupMod: dict
+    :return: The new modifier.
+    :rtype: Modifier
+    """
+    mod = obj.modifiers.new(backupMod['name'], backupMod['type'])
+    for prop in mod.bl_rna.properties:
+        attr = prop.identifier
+        if prop.is_readonly or attr in {'name', 'type'} or not attr in backupMod:
+            continue
+        try:
+            setattr(mod, attr, backupMod[attr])
+        except (AttributeError, TypeError, ValueError):
+            pass
+    return mod
+
+def is_animated_modifier(obj, mod):
+    """Checks if some properties of the modifier are animated or driven"""
+    anim = obj.animation_data
+    if anim is None:
         return False
+    path = 'modifiers["' + mod.name + '"]'
+    fcurves = list(anim.drivers)
+    if anim.action is not None:
+        fcurves = fcurves + list(anim.action.fcurves)
+    for fc in fcurves:
+        if fc.data_path.startswith(path):
+            return True
+    return False
+
+def is_static_modifier(obj, mod):
+    """
+    Checks if a modifier gives the same result at any time for the same input geometry.
+    These modifiers don't need to be cached: they can be kept live above a cache.
+    Deformers, simulations, time-dependent modifiers, modifiers using other objects (which may move)
+    and modifiers with animated properties are not static.
+
+    :arg obj: The object of the modifier.
+    :type obj: Object(ID)
+    :arg mod: The modifier.
+    :type mod: Modifier
+    :rtype: bool
+    """
+    t = mod.type
+    if not t in DUBLF_Modifiers.generate_modifiers and not t in DUBLF_Modifiers.modify_modifiers:
+        return False
+    if t in DUBLF_Modifiers.live_excluded_modifiers:
+        return False
+    for prop in mod.bl_rna.properties:
+        if prop.type != 'POINTER':
+            continue
+        value = getattr(mod, prop.identifier)
+        if isinstance(value, (bpy.types.Object, bpy.types.Collection)):
+            return False
+    return not is_animated_modifier(obj, mod)
+
+def static_modifiers_start(obj):
+    """
+    Analyzes the modifier stack to find where to cut it between a cached part and live modifiers.
+    The modifiers above the cut all have to be static (see is_static_modifier).
+    This is the start of the longest trailing run of static modifiers,
+    after its first modifiers if they only remove vertices and don't depend on the vertex positions (see stable_reducing_modifiers),
+    so that the cache is smaller. Modifiers whose output topology depends on the positions (Decimate, Weld...) stay live,
+    the vertex count of the cached mesh must not change over time.
+
+    :arg obj: The object to analyze.
+    :type obj: Object(ID)
+    :return: The index of the first modifier which can be kept live, len(obj.modifiers) if none.
+    :rtype: int
+    """
+    mods = obj.modifiers
+    start = len(mods)
+    while start > 0 and is_static_modifier(obj, mods[start-1]):
+        start = start - 1
+    while start < len(mods) and mods[start].type in DUBLF_Modifiers.stable_reducing_modifiers:
+        start = start + 1
+    return start
+
+def remove_modifiers(obj, start = 0):
+    """
+    Removes the modifiers of the stack from an index, keeping a backup of their settings.
+
+    :arg obj: The object to remove the modifiers from.
+    :type obj: Object(ID)
+    :arg start: The index of the first modifier to remove.
+    :type start: int
+    :return: The backups of the modifiers, in the order of the stack, see backup_modifier.
+    :rtype: dict[]
+    """
+    backups = []
+    for mod in list(obj.modifiers)[start:]:
+        backups.append(backup_modifier(mod))
+        obj.modifiers.remove(mod)
+    return backups
 
 def remove_all_modifiers(obj, modifier_type='', modifier_class=''):
         """
@@ -161,6 +288,21 @@ class DUBLF_Modifiers():
         'WAVE',
     ]
 
+    # Modifiers which only remove vertices, always the same ones whatever their position:
+    # they can be cached rather than kept live
+    stable_reducing_modifiers = [
+        'MASK',
+    ]
+
+    # Modifiers which can't be kept live above a cache:
+    # they change over time by themselves, or they need the original topology
+    live_excluded_modifiers = [
+        'BUILD',
+        'MESH_CACHE',
+        'MESH_SEQUENCE_CACHE',
+        'MULTIRES',
+    ]
+
     simulate_modifiers = [
         'CLOTH',
         'COLLISION',
@@ -0,0 +1,263 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Handlers run when a file is loaded, to get the caches ready for the Mesh Cache modifiers
+
+import bpy # pylint: disable=import-error
+from bpy.app.handlers import persistent # pylint: disable=import-error
+
+import os
+import shutil
+
+from . import (
+    dublf,
+    compact,
+    pc2,
+    manifest,
+    store,
+)
+
+# The name of the modifiers added by DuVertexCache
+CACHE_MODIFIER_NAME = "Mesh Cache (DuVertexCache)"
+# The modifiers reading the preview caches in the viewport, instead of the full cache which is used for renders
+PREVIEW_MODIFIER_NAME = "Mesh Cache Preview (DuVertexCache)"
+# The custom property storing the compressed file a cache is expanded from
+SOURCE_PROPERTY = 'duvertexcache_source'
+# The custom property storing the topology of the mesh when it was cached, see manifest.topology_fingerprint
+TOPOLOGY_PROPERTY = 'duvertexcache_topology'
+
+# The number of points of the cache files already checked, by path: ((mtime, size), num_points)
+# so that the files which did not change are not read again
+_checked_files = {}
+# The problems found by the last check, see check_caches
+stale_caches = []
+
+def cache_modifiers( obj ):
+    """Gets the Mesh Cache modifiers added by DuVertexCache on an object"""
+    return [ mod for mod in obj.modifiers if mod.type == 'MESH_CACHE' and mod.name.startswith( CACHE_MODIFIER_NAME ) ]
+
+def set_cache_timing( mod, header ):
+    """
+    Makes a Mesh Cache modifier read each sample of a PC2 file at its frame.
+    By default, the modifier reads one sample per frame from frame 0, whatever the start and sampling of the file:
+    it reads the sample frame_scale * frame - frame_start.
+
+    :arg mod: The Mesh Cache modifier.
+    :type mod: MeshCacheModifier
+    :arg header: The header of the file, see pc2.read_header.
+    :type header: dict
+    """
+    sampling = header['sampling'] if header['sampling'] > 0 else 1.0
+    mod.play_mode = 'SCENE'
+    mod.time_mode = 'FRAME'
+    mod.frame_scale = 1.0 / sampling
+    mod.frame_start = header['start'] / sampling
+
+def local_cache( source_path, pc2_path = '' ):
+    """
+    Gets the local PC2 file expanded from a compressed cache, expanding it if it's missing or older than the source.
+
+    :arg source_path: The compressed cache.
+    :arg pc2_path: A PC2 file of the same cache which can be moved instead of expanding the source, if it exists.
+    :return: The path to the local PC2 file.
+    :rtype: str
+    """
+    local_path = compact.local_path( source_path )
+    if pc2_path != '' and os.path.isfile( pc2_path ):
+        os.makedirs( os.path.dirname(local_path), exist_ok = True )
+        shutil.move( pc2_path, local_path )
+        return local_path
+    if os.path.isfile( local_path ) and os.path.getmtime( local_path ) >= os.path.getmtime( source_path ):
+        return local_path
+    expander = manifest.EXPANDERS.get( os.path.splitext(source_path)[1].lower() )
+    if expander is None:
+        raise ValueError( "Unknown cache format: " + source_path )
+    print("Expanding " + source_path + " to " + local_path)
+    return expander( source_path, local_path )
+
+def expand_sources():
+    """Expands the compressed caches of all the objects whose Mesh Cache file is missing or outdated"""
+    for obj in bpy.data.objects:
+        source = obj.get( SOURCE_PROPERTY )
+        if source is None:
+            continue
+        source = bpy.path.abspath( source )
+        mods = cache_modifiers( obj )
+        if len(mods) == 0:
+            continue
+        if not os.path.isfile( source ):
+            print("Missing vertex cache: " + source + " (" + obj.name + ")")
+            continue
+        try:
+            path = local_cache( source )
+        except (OSError, ValueError) as e:
+            print("Cannot expand the vertex cache of " + obj.name + ": " + str(e))
+            continue
+        for mod in mods:
+            if bpy.path.abspath( mod.filepath ) != path:
+                mod.filepath = path
+
+def cache_points( filepath ):
+    """Gets the number of points of a PC2 file, or None if it's missing or invalid.
+    The header is read only if the size or modification time of the file changed since the last call"""
+    try:
+        stat = os.stat( filepath )
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    checked = _checked_files.get( filepath )
+    if checked is not None and checked[0] == key:
+        return checked[1]
+    try:
+        num_points = pc2.read_header( filepath )['num_points']
+    except (OSError, ValueError):
+        num_points = None
+    _checked_files[filepath] = (key, num_points)
+    return num_points
+
+def check_caches():
+    """
+    Checks the Mesh Cache modifiers of all the objects in one pass: their file must exist and have as many points
+    as the mesh has vertices, and the topology of the mesh must be the same as when it was cached.
+    Meshes used by several objects are hashed once.
+
+    :return: The problems found: (object name, description).
+    :rtype: list of tuple (str, str)
+    """
+    problems = []
+    topologies = {}
+    for obj in bpy.data.objects:
+        mods = [ mod for mod in obj.modifiers if mod.type == 'MESH_CACHE' and mod.name.startswith( (CACHE_MODIFIER_NAME, PREVIEW_MODIFIER_NAME) ) ]
+        if len(mods) == 0:
+            continue
+        num_vertices = None
+        if obj.type == 'MESH':
+            num_vertices = len(obj.data.vertices)
+            expected = obj.get( TOPOLOGY_PROPERTY )
+            if expected is not None:
+                topology = topologies.get( obj.data )
+                if topology is None:
+                    topology = manifest.topology_fingerprint( obj.data )
+                    topologies[obj.data] = topology
+                if topology != expected:
+                    problems.append( (obj.name, "the vertex order or topology of the mesh changed since it was cached") )
+        for mod in mods:
+            path = bpy.path.abspath( mod.filepath )
+            num_points = cache_points( path )
+            if num_points is None:
+                problems.append( (obj.name, "missing or invalid cache " + path) )
+            elif num_vertices is not None and num_points != num_vertices:
+                problems.append( (obj.name, path + " has " + str(num_points) + " points for " + str(num_vertices) + " vertices") )
+    return problems
+
+def used_cache_files():
+    """
+    Gets the cache files used by the objects: by their Mesh Cache and Mesh Sequence Cache modifiers,
+    and the compressed caches they're expanded from.
+
+    :return: The users ("object/modifier") of each file, by absolute path.
+    :rtype: dict
+    """
+    files = {}
+    for obj in bpy.data.objects:
+        for mod in obj.modifiers:
+            if mod.type == 'MESH_CACHE':
+                path = mod.filepath
+            elif mod.type == 'MESH_SEQUENCE_CACHE' and mod.cache_file is not None:
+                path = mod.cache_file.filepath
+            else:
+                continue
+            files.setdefault( os.path.abspath( bpy.path.abspath( path ) ), [] ).append( obj.name + "/" + mod.name )
+        source = obj.get( SOURCE_PROPERTY )
+        if source is not None:
+            files.setdefault( os.path.abspath( bpy.path.abspath( source ) ), [] ).append( obj.name + "/" + SOURCE_PROPERTY )
+    return files
+
+def update_references():
+    """Records the cache files used by the current file next to its caches, so that the unused ones can be found, see store.py.
+    The caches of other files it uses are recorded too"""
+    blend_filepath = bpy.data.filepath
+    if blend_filepath == '':
+        return
+    blend_name = os.path.splitext( bpy.path.basename( blend_filepath ) )[0]
+    cache_root = os.path.join( os.path.dirname( blend_filepath ), blend_name + store.CACHE_DIR_SUFFIX )
+    files = used_cache_files()
+    # files which don't use any cache don't get a cache directory;
+    # the ones using the caches of other files get one, to record it
+    if len(files) == 0 and not os.path.isdir( cache_root ):
+        return
+    try:
+        store.write_references( cache_root, blend_filepath, files )
+    except OSError as e:
+        print("Cannot write the vertex cache references of " + blend_filepath + ": " + str(e))
+
+# The maximum number of stale caches listed in the message shown when a file is opened
+STALE_CACHES_SHOWN = 10
+
+def show_stale_caches():
+    """Shows the stale caches of the file in a message box; run by a timer, as there's no window yet when the file is loaded"""
+    if len(stale_caches) == 0 or bpy.context.window_manager is None or len(bpy.context.window_manager.windows) == 0:
+        return None
+    lines = [ name + ": " + problem for name, problem in stale_caches[:STALE_CACHES_SHOWN] ]
+    if len(stale_caches) > STALE_CACHES_SHOWN:
+        lines.append( "... and " + str(len(stale_caches) - STALE_CACHES_SHOWN) + " more, see the console." )
+    lines.append( "They must be cached again before rendering." )
+    dublf.DUBLF_utils().showMessageBox( lines, title = "DuVertexCache: " + str(len(stale_caches)) + " stale or missing vertex caches", icon = 'ERROR' )
+    return None
+
+@persistent
+def load_post( dummy ):
+    manifest.forget_weights()
+    expand_sources()
+    update_references()
+    stale_caches[:] = check_caches()
+    if len(stale_caches) > 0:
+        print("DuVertexCache: " + str(len(stale_caches)) + " stale or missing vertex caches, they must be cached again before rendering:")
+        for name, problem in stale_caches:
+            print("    " + name + ": " + problem)
+        if not bpy.app.background:
+            bpy.app.timers.register( show_stale_caches, first_interval = 0.5 )
+
+@persistent
+def save_post( dummy ):
+    update_references()
+
+@persistent
+def depsgraph_update_post( scene, depsgraph ):
+    # The weights may have been painted
+    for update in depsgraph.updates:
+        data = update.id.original
+        if isinstance( data, bpy.types.Object ):
+            data = data.data
+        if isinstance( data, bpy.types.Mesh ):
+            manifest.forget_weights( data.as_pointer() )
+
+@persistent
+def undo_post( dummy ):
+    manifest.forget_weights()
+
+def register():
+    dublf.DUBLF_handlers.load_post_append( load_post )
+    dublf.DUBLF_handlers.save_post_append( save_post )
+    dublf.DUBLF_handlers.depsgraph_update_post_append( depsgraph_update_post )
+    dublf.DUBLF_handlers.undo_post_append( undo_post )
+    dublf.DUBLF_handlers.redo_post_append( undo_post )
+
+def unregister():
+    dublf.DUBLF_handlers.load_post_remove( load_post )
+    dublf.DUBLF_handlers.save_post_remove( save_post )
+    dublf.DUBLF_handlers.depsgraph_update_post_remove( depsgraph_update_post )
+    dublf.DUBLF_handlers.undo_post_remove( undo_post )
+    dublf.DUBLF_handlers.redo_post_remove( undo_post )
@@ -0,0 +1,376 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# The manifest records what was used to bake each cache of a cache directory,
+# so that objects which did not change since the last bake can be skipped.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from . import (
+    pc2,
+    compact,
+    parts,
+)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+# The transformation properties of objects and pose bones, which may be animated
+TRANSFORM_PROPERTIES = ('rotation_mode', 'location', 'rotation_euler', 'rotation_quaternion', 'rotation_axis_angle', 'scale',
+    'delta_location', 'delta_rotation_euler', 'delta_rotation_quaternion', 'delta_scale')
+POSE_PROPERTIES = ('rotation_mode', 'location', 'rotation_euler', 'rotation_quaternion', 'rotation_axis_angle', 'scale')
+# Caches in an Alembic archive, see alembic.py
+ARCHIVE_EXTENSION = '.abc'
+
+class Manifest():
+    """The manifest of a cache directory"""
+
+    def __init__( self, cache_dir ):
+        self.cache_dir = cache_dir
+        self.filepath = os.path.join( cache_dir, MANIFEST_NAME )
+        self.objects = {}
+        self.load()
+
+    def load( self ):
+        """Reads the manifest file, if there's one"""
+        self.objects = {}
+        try:
+            with open(self.filepath, 'r') as f:
+                data = json.load( f )
+        except (OSError, ValueError):
+            return
+        if data.get('version') != MANIFEST_VERSION:
+            return
+        self.objects = data.get('objects', {})
+
+    def save( self ):
+        """Writes the manifest file"""
+        data = {
+            'version': MANIFEST_VERSION,
+            'objects': self.objects,
+        }
+        tmp_path = self.filepath + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump( data, f, indent = 1, sort_keys = True )
+        os.replace( tmp_path, self.filepath )
+
+    def get( self, name ):
+        """Gets the entry of an object, or None"""
+        return self.objects.get( name )
+
+    def set( self, name, filepath, fingerprint, **info ):
+        """Records the cache of an object"""
+        entry = dict( info )
+        entry['file'] = os.path.basename( filepath )
+        entry['fingerprint'] = fingerprint
+        self.objects[name] = entry
+        return entry
+
+    def shared_file( self, name, filepath ):
+        """Gets the path of the cache of another object used by this object, or an empty string"""
+        entry = self.get( name )
+        if entry is None or entry.get('shared_file', '') == '':
+            return ''
+        return os.path.join( os.path.dirname( filepath ), entry['shared_file'] )
+
+    def is_up_to_date( self, name, filepath, fingerprint ):
+        """Checks if the cache of an object was made with the same fingerprint and is complete"""
+        entry = self.get( name )
+        if entry is None:
+            return False
+        if entry.get('fingerprint') != fingerprint:
+            return False
+        if entry.get('file') != os.path.basename( filepath ):
+            return False
+        # the object may use the cache of an identical object
+        filepath = self.shared_file( name, filepath ) or filepath
+        if os.path.exists( pc2.progress_path(filepath) ):
+            return False
+        # the archive is exported at once by Blender, it's complete if it's there
+        if os.path.splitext( filepath )[1].lower() == ARCHIVE_EXTENSION:
+            return os.path.isfile( filepath )
+        try:
+            # the PC2 file may have been replaced by its rigid parts or compact version
+            if os.path.isfile( filepath ):
+                header = pc2.read_header( filepath )
+            elif os.path.isfile( parts.parts_path(filepath) ):
+                header = parts.read_header( parts.parts_path(filepath) )
+            else:
+                header = compact.read_header( compact.compact_path(filepath) )
+        except (OSError, ValueError):
+            return False
+        return header['num_samples'] > 0
+
+# The functions expanding each kind of compressed cache to a PC2 file: fn( source_path, pc2_path )
+EXPANDERS = {
+    compact.EXTENSION: compact.expand,
+    parts.EXTENSION: parts.expand,
+}
+
+def cache_source( filepath ):
+    """Gets the file replacing a PC2 file which is not there anymore (rigid parts or compact cache),
+    or an empty string if the PC2 file exists or nothing replaces it"""
+    if os.path.isfile( filepath ):
+        return ''
+    for source in ( parts.parts_path(filepath), compact.compact_path(filepath) ):
+        if os.path.isfile( source ):
+            return source
+    return ''
+
+# ========= FINGERPRINTS ===============
+
+def object_fingerprint( obj, settings ):
+    """
+    Computes a fingerprint of everything which changes the cache of an object:
+    its topology and rest shape, its modifier stack, the animation and drivers of the object,
+    its data, its parents and the objects its modifiers and constraints depend on, and the bake settings.
+    Properties which are animated are only hashed through their animation, so the fingerprint does not depend on the current frame.
+
+    :arg obj: The object.
+    :type obj: Object(ID)
+    :arg settings: The bake settings (frame range, sampling...).
+    :type settings: dict
+    :return: The fingerprint.
+    :rtype: str
+    """
+    h = hashlib.sha1()
+    _hash_value( h, sorted( settings.items() ) )
+    _hash_struct_list( h, obj.modifiers )
+
+    # Everything the deformation depends on
+    visited = set()
+    _hash_dependencies( h, obj, visited )
+    return h.hexdigest()
+
+def topology_fingerprint( mesh ):
+    """
+    Computes a fingerprint of the topology of a mesh: its vertex count and the vertex indices of its edges and polygons.
+    A vertex cache only fits a mesh with the same vertices in the same order.
+
+    :rtype: str
+    """
+    h = hashlib.sha1()
+    _hash_value( h, len(mesh.vertices) )
+    _hash_collection( h, mesh.edges, 'vertices', np.int32, 2 )
+    _hash_collection( h, mesh.polygons, 'loop_total', np.int32, 1 )
+    _hash_collection( h, mesh.loops, 'vertex_index', np.int32, 1 )
+    return h.hexdigest()
+
+def _hash_dependencies( h, obj, visited ):
+    if obj is None or obj.name in visited:
+        return
+    visited.add( obj.name )
+    _hash_value( h, obj.name )
+    animated = _animated_paths( obj )
+    _hash_static_values( h, obj, '', TRANSFORM_PROPERTIES, animated )
+    _hash_value( h, [ tuple(row) for row in obj.matrix_parent_inverse ] )
+    _hash_animation( h, obj )
+    _hash_animation( h, obj.data )
+    # the geometry of the targets (lattices, curves, meshes) deforms the object too
+    _hash_geometry( h, obj.data )
+    if len(obj.vertex_groups) > 0 and getattr( obj.data, 'vertices', None ) is not None:
+        _hash_value( h, [ group.name for group in obj.vertex_groups ] )
+        _hash_weights( h, obj.data )
+    shape_keys = getattr( obj.data, 'shape_keys', None )
+    if shape_keys is not None:
+        _hash_animation( h, shape_keys )
+        key_animated = _animated_paths( shape_keys )
+        for k in shape_keys.key_blocks:
+            _hash_value( h, (k.name, k.mute, getattr(k.relative_key, 'name', ''), k.vertex_group, k.slider_min, k.slider_max, k.interpolation) )
+            _hash_static_values( h, k, 'key_blocks[' + _path_key( k.name ) + ']', ('value',), key_animated )
+            _hash_collection( h, k.data, 'co', np.float32, 3 )
+    if obj.type == 'ARMATURE':
+        # the rest pose
+        _hash_value( h, [ (bone.name, getattr(bone.parent, 'name', ''), bone.use_deform, tuple(bone.head_local), tuple(bone.tail_local),
+            [ tuple(row) for row in bone.matrix_local ], bone.envelope_distance, bone.envelope_weight, bone.head_radius, bone.tail_radius) for bone in obj.data.bones ] )
+    _hash_struct_list( h, obj.constraints )
+    if obj.pose is not None:
+        for bone in obj.pose.bones:
+            _hash_value( h, bone.name )
+            _hash_static_values( h, bone, 'pose.bones[' + _path_key( bone.name ) + ']', POSE_PROPERTIES, animated )
+            _hash_struct_list( h, bone.constraints )
+    # parents, modifier and constraint targets
+    _hash_dependencies( h, obj.parent, visited )
+    for item in list(obj.modifiers) + list(obj.constraints):
+        for target in _object_pointers( item ):
+            _hash_dependencies( h, target, visited )
+
+def _path_key( name ):
+    """Quotes a name in a data path, like bpy.utils.escape_identifier"""
+    return '"' + name.replace( '\\', '\\\\' ).replace( '"', '\\"' ) + '"'
+
+def _animated_paths( id_data ):
+    """
+    Gets the properties of an ID which are animated by its action, its NLA strips or drivers.
+    Their current value depends on the current frame, only their animation is hashed.
+
+    :rtype: set of tuple (data_path, array_index)
+    """
+    anim = getattr( id_data, 'animation_data', None )
+    if anim is None:
+        return set()
+    actions = [ anim.action ] + [ strip.action for track in anim.nla_tracks for strip in track.strips ]
+    fcurves = [ fcurve for action in actions if action is not None for fcurve in action.fcurves ] + list( anim.drivers )
+    return set( (fcurve.data_path, fcurve.array_index) for fcurve in fcurves )
+
+def _hash_static_values( h, struct, path, attrs, animated ):
+    """Hashes the values of some properties of a struct, except the animated ones.
+    path is the data path of the struct from its ID, empty for the ID itself"""
+    for attr in attrs:
+        value = getattr( struct, attr )
+        data_path = path + '.' + attr if path != '' else attr
+        try:
+            values = tuple( value )
+        except TypeError:
+            values = ( value, )
+        _hash_value( h, (attr, [ None if (data_path, i) in animated else v for i, v in enumerate(values) ]) )
+
+# The digests of the vertex weights of the meshes, by mesh pointer.
+# Weights can't be read in bulk, so they're read again only after the mesh has been edited (see forget_weights)
+_weights_digests = {}
+
+def forget_weights( pointer = None ):
+    """Drops the cached weight digest of a mesh, or of all meshes
+
+    :arg pointer: The pointer of the mesh, None for all meshes
+    :type pointer: int
+    """
+    if pointer is None:
+        _weights_digests.clear()
+    else:
+        _weights_digests.pop( pointer, None )
+
+def _hash_weights( h, mesh ):
+    """Hashes the vertex group weights of a mesh"""
+    pointer = mesh.as_pointer()
+    digest = _weights_digests.get( pointer )
+    if digest is None:
+        vertices = mesh.vertices
+        counts = np.array( [ len(vertex.groups) for vertex in vertices ], dtype = np.int32 )
+        offsets = np.zeros( len(counts) + 1, dtype = np.int64 )
+        np.cumsum( counts, out = offsets[1:] )
+        groups = np.empty( offsets[-1], dtype = np.int32 )
+        weights = np.empty( offsets[-1], dtype = np.float32 )
+        for i in np.flatnonzero( counts ):
+            vertex_groups = vertices[ int(i) ].groups
+            vertex_groups.foreach_get( 'group', groups[ offsets[i]:offsets[i+1] ] )
+            vertex_groups.foreach_get( 'weight', weights[ offsets[i]:offsets[i+1] ] )
+        weights_hash = hashlib.sha1()
+        weights_hash.update( counts.tobytes() )
+        weights_hash.update( groups.tobytes() )
+        weights_hash.update( weights.tobytes() )
+        digest = weights_hash.digest()
+        _weights_digests[pointer] = digest
+    h.update( digest )
+
+def _object_pointers( struct ):
+    """Gets the objects a modifier or constraint points to"""
+    objs = []
+    for prop in struct.bl_rna.properties:
+        if prop.type != 'POINTER':
+            continue
+        value = getattr( struct, prop.identifier, None )
+        if value is not None and value.bl_rna.identifier == 'Object':
+            objs.append( value )
+    for target in getattr( struct, 'targets', () ):
+        if getattr( target, 'target', None ) is not None:
+            objs.append( target.target )
+    return objs
+
+def _hash_geometry( h, data ):
+    """Hashes the topology and rest shape of the object data"""
+    if data is None:
+        return
+    vertices = getattr( data, 'vertices', None )
+    if vertices is not None:
+        _hash_collection( h, vertices, 'co', np.float32, 3 )
+        _hash_collection( h, data.edges, 'vertices', np.int32, 2 )
+        _hash_collection( h, data.polygons, 'loop_total', np.int32, 1 )
+        _hash_collection( h, data.loops, 'vertex_index', np.int32, 1 )
+        return
+    # lattices
+    points = getattr( data, 'points', None )
+    if points is not None:
+        _hash_value( h, (data.points_u, data.points_v, data.points_w, data.interpolation_type_u, data.interpolation_type_v, data.interpolation_type_w) )
+        _hash_collection( h, points, 'co_deform', np.float32, 3 )
+        return
+    # curves, surfaces and texts
+    for spline in getattr( data, 'splines', () ):
+        _hash_collection( h, spline.points, 'co', np.float32, 4 )
+        for attr in ('co', 'handle_left', 'handle_right'):
+            _hash_collection( h, spline.bezier_points, attr, np.float32, 3 )
+    _hash_value( h, getattr( data, 'body', '' ) )
+
+def _hash_collection( h, collection, attr, dtype, size ):
+    buffer = np.empty( len(collection) * size, dtype = dtype )
+    if len(buffer) > 0:
+        collection.foreach_get( attr, buffer )
+    _hash_value( h, len(collection) )
+    h.update( buffer.tobytes() )
+
+def _hash_animation( h, id_data ):
+    """Hashes the action and drivers of an ID"""
+    anim = getattr( id_data, 'animation_data', None )
+    if anim is None:
+        return
+    if anim.action is not None:
+        _hash_value( h, anim.action.name )
+        for fcurve in anim.action.fcurves:
+            _hash_fcurve( h, fcurve )
+    for fcurve in anim.drivers:
+        _hash_fcurve( h, fcurve )
+        driver = fcurve.driver
+        _hash_value( h, (driver.type, driver.expression) )
+        for var in driver.variables:
+            _hash_value( h, (var.name, var.type) )
+            for target in var.targets:
+                _hash_value( h, (getattr(target.id, 'name', ''), target.data_path, target.bone_target, target.transform_type, target.transform_space) )
+    for track in anim.nla_tracks:
+        _hash_value( h, (track.name, track.mute) )
+        for strip in track.strips:
+            _hash_value( h, (strip.name, getattr(strip.action, 'name', ''), strip.frame_start, strip.frame_end, strip.mute, strip.influence,
+                strip.blend_type, strip.extrapolation, strip.action_frame_start, strip.action_frame_end, strip.repeat, strip.scale, strip.use_reverse) )
+            if strip.action is not None:
+                for fcurve in strip.action.fcurves:
+                    _hash_fcurve( h, fcurve )
+
+def _hash_fcurve( h, fcurve ):
+    _hash_value( h, (fcurve.data_path, fcurve.array_index, fcurve.mute) )
+    points = fcurve.keyframe_points
+    for attr in ('co', 'handle_left', 'handle_right'):
+        _hash_collection( h, points, attr, np.float32, 2 )
+    _hash_value( h, [ (k.interpolation, k.easing) for k in points ] )
+    _hash_struct_list( h, fcurve.modifiers )
+
+def _hash_struct_list( h, structs ):
+    """Hashes all the settings of a list of modifiers or constraints"""
+    for struct in structs:
+        values = []
+        for prop in struct.bl_rna.properties:
+            if prop.type == 'COLLECTION' or prop.identifier == 'rna_type':
+                continue
+            value = getattr( struct, prop.identifier, None )
+            if prop.type == 'POINTER':
+                value = getattr( value, 'name', None )
+            elif getattr( prop, 'is_array', False ):
+                value = tuple( value )
+            values.append( (prop.identifier, value) )
+        _hash_value( h, values )
+
+def _hash_value( h, value ):
+    h.update( repr(value).encode('utf-8') )
@@ -0,0 +1,1281 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+import bpy # pylint: disable=import-error
+
+from pathlib import Path
+import cProfile
+import json
+import os
+import time
+
+import numpy as np
+
+from . import (
+    dublf,
+    bake,
+    manifest,
+    parallel,
+    compact,
+    handlers,
+    pc2,
+    rigid,
+    parts,
+    dependencies,
+    autosampling,
+    alembic,
+    store,
+)
+
+# Number of samples evaluated to find the objects which may be static or rigid
+RIGID_PROBE_SAMPLES = 9
+# Rigid parts caches are used only if they're at most this size compared to the PC2 file
+RIGID_PARTS_MAX_RATIO = 0.5
+# The samplings which can be chosen (frames per sample)
+SAMPLING_VALUES = ('0.01', '0.05', '0.1', '0.2', '0.25', '0.5', '1', '2', '3', '4', '5', '10')
+# Automatic sampling: the sampling of the objects which don't get their own one, and the motion is measured on this number of vertices at most
+AUTO_REFERENCE_SAMPLING = 0.1
+AUTO_PROBE_POINTS = 1000
+# Non-blocking bake: seconds between two time slices, and duration of each slice
+MODAL_TIMER_INTERVAL = 0.01
+MODAL_TIME_SLICE = 0.1
+
+def orphan_data():
+    """Gets the meshes and curves which no object uses"""
+    return [ data for data in list(bpy.data.meshes) + list(bpy.data.curves) if data.users == 0 ]
+
+class CreateVertexCache():
+    """The settings and methods of the Create Vertex Cache operators, with and without undo"""
+
+    world_space: bpy.props.BoolProperty(
+        name="Export into World Space",
+        description="Transform the Vertex coordinates into World Space",
+        default=True,)
+    bake_transforms: bpy.props.BoolProperty(
+        name="Bake Object Transforms",
+        description="Cache only the deformation, in local space, and bake the world transformation of the objects at each sample to keyframes. Caches are smaller and compress better, and the object animation stays editable. Replaces World Space",
+        default=False,)
+    sampling: bpy.props.EnumProperty(
+        name='Sampling',
+        description='Sampling --> frames per sample (0.1 yields 10 samples per frame)',
+        items=tuple( (value, value, '') for value in SAMPLING_VALUES ) + (
+            ('AUTO', 'Auto', 'For each object, the coarsest sampling which reproduces its motion within the Sampling Tolerance'),
+            ),
+        default='1',)
+    auto_tolerance: bpy.props.FloatProperty(
+        name="Sampling Tolerance",
+        description="Auto sampling: the maximum distance between a vertex interpolated between two samples and its actual position",
+        default = 0.001,
+        min = 0.0,
+        precision = 6,
+        subtype = 'DISTANCE' )
+    backend: bpy.props.EnumProperty(
+        name="Cache Format",
+        description="How the caches are stored and read back",
+        items=(
+            ('PC2', "PC2 files", "One PC2 file per object, read by a Mesh Cache modifier"),
+            ('ALEMBIC', "Alembic archive", "All the meshes in a single Alembic archive exported in one pass, read by Mesh Sequence Cache modifiers sharing one Cache File. Supports meshes whose topology changes; other objects still use PC2 files. Samples at least once per frame, Auto sampling uses one sample per frame"),
+        ),
+        default = 'PC2' )
+    make_unique_data: bpy.props.BoolProperty(
+        name="Make single-user data when needed",
+        description="When applying non deform modifiers (which change vertex count), make single data if it is multi-user, or ignore this object",
+        default=False )
+    apply_subsurf: bpy.props.BoolProperty(
+        name="Apply Subdivision Surface",
+        description="Applies the subdivision (and all the other modifiers at the end of the stack which don't need to be cached) before exporting cache, instead of keeping them live above the cache",
+        default = False )
+    linked_object: bpy.props.EnumProperty(
+        name="Linked Objects",
+        description="What to do with linked objects",
+        items=(
+            ('IGNORE', "Ignore", "Ignore objects"),
+            ('MAKE_LOCAL', "Make Local", "Make objects local. They will be unlinked"),
+        ),
+        default = 'MAKE_LOCAL' )
+    remove_armatures: bpy.props.BoolProperty(
+        name="Remove unused Armatures",
+        description="After caching, remove all Armatures which are not used anymore",
+        default = True )
+    export_only: bpy.props.BoolProperty(
+        name="Export only",
+        description="Just exports the point caches, and don't add the Mesh Cache modifier",
+        default = False )
+    resume: bpy.props.BoolProperty(
+        name="Resume interrupted caches",
+        description="If a previous export was interrupted, continue it from its last complete sample instead of starting over",
+        default = False )
+    patch: bpy.props.BoolProperty(
+        name="Patch Frame Range",
+        description="Only bake the frames from Patch Start to Patch End, and overwrite them in the existing PC2 caches, which must have the same vertex count, start frame and sampling. The caches are extended if the range goes past their end",
+        default = False )
+    patch_start: bpy.props.IntProperty(
+        name="Patch Start",
+        description="The first frame to bake again",
+        default = 1 )
+    patch_end: bpy.props.IntProperty(
+        name="Patch End",
+        description="The last frame to bake again",
+        default = 250 )
+    compact: bpy.props.EnumProperty(
+        name="Compact Cache",
+        description="Also write a compact (quantized and compressed) version of the caches, which is much smaller to store and transfer",
+        items=(
+            ('NONE', "None", "Only write PC2 files"),
+            ('ALONGSIDE', "Next to PC2", "Write the compact cache next to the PC2 file"),
+            ('REPLACE', "Instead of PC2", "Only keep the compact cache; it is expanded to a local PC2 file when the scene is opened"),
+        ),
+        default = 'NONE' )
+    compact_max_error: bpy.props.FloatProperty(
+        name="Maximum Error",
+        description="The maximum distance between the original vertices and the ones read from the compact cache",
+        default = 0.0001,
+        min = 0.000001,
+        precision = 6,
+        subtype = 'DISTANCE' )
+    preview: bpy.props.BoolProperty(
+        name="Preview Cache",
+        description="Also write a lower sampling version of the caches, resampled from them, which the viewport reads instead of the full cache for a faster playback. Renders still use the full cache",
+        default = False )
+    preview_sampling: bpy.props.EnumProperty(
+        name="Preview Sampling",
+        description="Frames per sample of the preview caches",
+        items=tuple( (value, value, '') for value in SAMPLING_VALUES ),
+        default='1',)
+    detect_rigid: bpy.props.BoolProperty(
+        name="Detect static and rigid objects",
+        description="Objects which don't deform get their transformation baked to keyframes and their constraints muted, instead of a vertex cache (rigid motion needs World Space). The objects which finally deform are baked in a second pass",
+        default = False )
+    rigid_tolerance: bpy.props.FloatProperty(
+        name="Rigid Tolerance",
+        description="The maximum distance a vertex can move away from its rigid position for an object to be considered rigid",
+        default = 0.0001,
+        min = 0.0,
+        precision = 6,
+        subtype = 'DISTANCE' )
+    rigid_parts: bpy.props.BoolProperty(
+        name="Rigid Parts",
+        description="For mechanical objects: store one transformation per loose part of the mesh instead of all the vertices, when they move rigidly (within the Rigid Tolerance)",
+        default = False )
+    skip_unchanged: bpy.props.BoolProperty(
+        name="Skip unchanged objects",
+        description="Don't bake again objects whose geometry, modifiers, animation and settings did not change since their cache was made",
+        default = True )
+    workers: bpy.props.IntProperty(
+        name="Processes",
+        description="Number of background Blender processes baking slices of the frame range at the same time. With 1, the bake runs in this Blender session. Simulations can't be baked in parallel",
+        default = 1,
+        min = 1,
+        soft_max = 64 )
+    single_pass: bpy.props.BoolProperty(
+        name="Single Pass",
+        description="Step the timeline only once and cache all the selected objects at each sample, instead of stepping it once per object",
+        default = True )
+    share_identical: bpy.props.BoolProperty(
+        name="Share identical caches",
+        description="Objects with exactly the same evaluated vertices at all samples (e.g. duplicates of the same mesh, with the same animation) use a single cache file and mesh data. The vertices are compared in the space of the caches: in World Space, only objects at the same place match; with Bake Object Transforms or without World Space, copies placed anywhere share their deformation. Needs Single Pass, one Process and no Resume",
+        default = True )
+    batch_size: bpy.props.IntProperty(
+        name="Batch Size",
+        description="Low memory mode for large selections: bake and finish the objects by batches of this number, removing the mesh data they don't use anymore after each batch, so that the memory used does not grow with the number of objects. The timeline is stepped once per batch. With 0, all the objects are processed at once",
+        default = 0,
+        min = 0,
+        soft_max = 1000 )
+    modal: bpy.props.BoolProperty(
+        name="Non-blocking",
+        description="Bake in small time slices, showing the progress and keeping the interface responsive. Press Esc to cancel",
+        default = True )
+    profile: bpy.props.BoolProperty(
+        name="Profile",
+        description="Profile the whole run with cProfile. The profile is saved next to the caches, and the slowest functions are listed in the report",
+        default = False )
+
+    @classmethod
+    def poll(self, context):
+        obj = context.active_object
+        return (
+            obj is not None
+            and obj.type in {'MESH', 'CURVE', 'SURFACE', 'FONT'}
+        )
+
+    def invoke( self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        lay = self.layout
+        col = lay.column()
+        col.prop(self, 'backend')
+        col.prop(self, 'world_space')
+        col.prop(self, 'bake_transforms')
+        col.prop(self, 'remove_armatures')
+        col.prop(self, 'apply_subsurf')
+        col.prop(self, 'make_unique_data')
+        col.prop(self, 'linked_object')
+        col.prop(self, 'sampling')
+        if self.sampling == 'AUTO':
+            col.prop(self, 'auto_tolerance')
+        col.prop(self, 'export_only')
+        if not self.export_only:
+            col.prop(self, 'detect_rigid')
+        col.prop(self, 'rigid_parts')
+        if self.rigid_parts or (self.detect_rigid and not self.export_only):
+            col.prop(self, 'rigid_tolerance')
+        col.prop(self, 'compact')
+        if self.compact != 'NONE':
+            col.prop(self, 'compact_max_error')
+        col.prop(self, 'preview')
+        if self.preview:
+            col.prop(self, 'preview_sampling')
+        col.prop(self, 'single_pass')
+        if self.single_pass:
+            col.prop(self, 'share_identical')
+        col.prop(self, 'workers')
+        col.prop(self, 'resume')
+        col.prop(self, 'patch')
+        if self.patch:
+            col.prop(self, 'patch_start')
+            col.prop(self, 'patch_end')
+        col.prop(self, 'skip_unchanged')
+        col.prop(self, 'batch_size')
+        col.prop(self, 'modal')
+        col.prop(self, 'profile')
+
+    def execute( self, context ):
+
+        print("\n___VERTEX CACHE___")
+        # get object(s)
+        objs = context.selected_objects
+
+        if len(objs) == 0:
+            return {'CANCELLED'}
+
+        # get file path (and create cache dir if not already there)
+        blend_filepath = bpy.data.filepath
+        blend_dir = os.path.dirname(blend_filepath)
+        blend_file = bpy.path.basename(blend_filepath)
+        blend_name = os.path.splitext(blend_file)[0]
+        # create cache dir
+        cache_dir = blend_dir + "/" + blend_name + "_VertexCache/" + context.scene.name
+        cache_dirObj = Path(cache_dir)
+        try:
+            cache_dirObj.mkdir(parents = True, exist_ok=True)
+            # print('Vertex Cache will be saved in "' + cache_dir + '"')
+        except:
+            self.report({'ERROR'}, 'Cannot create directory for Vertex Cache at "' + cache_dir + '"')
+            print('Cannot create directory for Vertex Cache at "' + cache_dir + '"')
+            return {'CANCELLED'}
+
+        # Per object and per stage timers, written to a report next to the caches
+        self.stats = dublf.DUBLF_stats( "DuVertexCache" )
+        self.profiler = cProfile.Profile() if self.profile else None
+        self.cache_dir = cache_dir
+        self.jobs = []
+        self.cancellable = True
+        self.progress = (0.0, "Preparing")
+        self.result = {'CANCELLED'}
+        # the orphan data of the file is left as is, only the data made unused by the run is purged, see purge_orphan_data
+        self.orphans = set( data.as_pointer() for data in orphan_data() ) if self.batch_size > 0 else set()
+        self.steps = self.cache_steps( context, objs, cache_dir )
+
+        # In the interface, the work is done by small time slices on a timer, so it can be followed and cancelled
+        if self.modal and context.window is not None and not bpy.app.background:
+            wm = context.window_manager
+            self._timer = wm.event_timer_add( MODAL_TIMER_INTERVAL, window = context.window )
+            wm.modal_handler_add( self )
+            wm.progress_begin( 0, 100 )
+            return {'RUNNING_MODAL'}
+
+        self._timer = None
+        try:
+            self.run_steps()
+        except Exception:
+            self.restore_after_error()
+            raise
+        finally:
+            self.end_run( context )
+        return self.result
+
+    def modal( self, context, event ):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            if self.cancellable:
+                self.cancel_run()
+                self.end_run( context )
+                self.report({'WARNING'}, "Vertex cache cancelled, the scene is restored.")
+                return {'CANCELLED'}
+            self.report({'INFO'}, "The objects are being finished, the vertex cache can't be cancelled anymore.")
+            return {'RUNNING_MODAL'}
+
+        if event.type != 'TIMER' or event.timer != self._timer:
+            return {'PASS_THROUGH'}
+
+        try:
+            running = self.run_steps( MODAL_TIME_SLICE )
+        except Exception:
+            self.restore_after_error()
+            self.end_run( context )
+            raise
+        if not running:
+            self.end_run( context )
+            return self.result
+
+        progress, message = self.progress
+        context.window_manager.progress_update( progress * 100 )
+        context.workspace.status_text_set( "Vertex Cache: " + message + " (" + str(int(progress * 100)) + "%) - Esc to cancel" )
+        return {'RUNNING_MODAL'}
+
+    def run_steps( self, duration = 0.0 ):
+        """Advances the run during some seconds, or until the end if duration is 0.
+        Returns False when the run is over"""
+        if self.profiler is not None:
+            self.profiler.enable()
+        try:
+            deadline = time.perf_counter() + duration
+            for progress in self.steps:
+                self.progress = progress
+                if duration > 0 and time.perf_counter() >= deadline:
+                    return True
+            return False
+        finally:
+            if self.profiler is not None:
+                self.profiler.disable()
+
+    def cancel_run( self ):
+        """Stops the run and restores the objects as they were. Interrupted caches can be resumed later"""
+        # closes the cache files and restores the current frame
+        self.steps.close()
+        for job in self.jobs:
+            self.restore_modifiers( job )
+            self.restore_data( job )
+        self.result = {'CANCELLED'}
+
+    def restore_after_error( self ):
+        """Restores the objects after an unexpected error, if they were not being finished"""
+        if self.cancellable:
+            self.cancel_run()
+
+    def end_run( self, context ):
+        """Cleans up the interface and writes the report"""
+        if self._timer is not None:
+            wm = context.window_manager
+            wm.event_timer_remove( self._timer )
+            wm.progress_end()
+            context.workspace.status_text_set( None )
+            self._timer = None
+        if self.profiler is not None:
+            self.stats.add_profile( self.profiler, self.cache_dir + "/profile.prof" )
+        self.write_report( context, self.cache_dir )
+
+    def cache_steps( self, context, objs, cache_dir ):
+        """Bakes the objects and replaces their modifiers and animation by their cache.
+        This is a generator which does a small part of the work each time it is advanced, and yields the progress
+        (from 0 to 1) and what it is doing. The result of the operator is in self.result at the end"""
+        stats = self.stats
+        scene = context.scene
+        cache_manifest = manifest.Manifest( cache_dir )
+        settings = {
+            'frame_start': scene.frame_start,
+            'frame_end': scene.frame_end,
+            'sampling': self.sampling,
+            'world_space': self.world_space,
+            'apply_subsurf': self.apply_subsurf,
+        }
+        auto_sampling = self.sampling == 'AUTO'
+        if auto_sampling:
+            settings['auto_tolerance'] = self.auto_tolerance
+        if self.bake_transforms:
+            settings['bake_transforms'] = True
+        # all the meshes go to a single archive instead of their own PC2 file
+        archive = ''
+        if self.backend == 'ALEMBIC':
+            settings['backend'] = self.backend
+            archive = alembic.archive_path( cache_dir, [ obj for obj in objs if obj.type == 'MESH' ] )
+
+        # Deformer targets are processed before the objects they deform
+        with stats.timer( 'dependency_index' ):
+            index = dependencies.DependencyIndex( bpy.data.objects )
+            objs = index.sort( objs )
+
+        jobs = self.jobs
+        for i, obj in enumerate(objs):
+            job = self.prepare_object( context, obj, cache_dir, cache_manifest, settings, archive )
+            if job is not None:
+                jobs.append( job )
+            yield 0.05 * (i + 1) / len(objs), "Preparing " + obj.name
+
+        # Export Caches
+        # In a single pass, the timeline is stepped only once for all the objects
+        # objects sharing the cache of another one are up to date only if the other one is
+        own_files = { job.filepath: job for job in jobs }
+        for job in jobs:
+            if job.shared_filepath == '':
+                continue
+            job.leader = own_files.get( job.shared_filepath )
+            if job.leader is not None and not job.leader.up_to_date:
+                job.up_to_date = False
+                job.leader = None
+                job.shared_filepath = ''
+        # the archive is exported again as a whole if any of its objects changed
+        archive_jobs = [ job for job in jobs if job.filepath == archive ]
+        archive_export = []
+        if any( not job.up_to_date for job in archive_jobs ):
+            for job in archive_jobs:
+                job.up_to_date = False
+            archive_export = archive_jobs
+        bake_jobs = [ job for job in jobs if not job.up_to_date and job.filepath != archive ]
+        # with auto sampling, each job gets its own sampling
+        sampling = AUTO_REFERENCE_SAMPLING if auto_sampling else float(self.sampling)
+        times = pc2.sample_times( scene.frame_start, scene.frame_end, sampling )
+        if self.patch:
+            errors = [ self.check_patch( context, job ) for job in bake_jobs ]
+            errors = [ error for error in errors if error != '' ]
+            if len(errors) > 0:
+                for job in jobs:
+                    self.restore_modifiers( job )
+                    self.restore_data( job )
+                self.report({'ERROR'}, "\n".join( errors ))
+                print("\n".join( errors ))
+                return
+        try:
+            if len(archive_export) > 0:
+                yield 0.1, "Exporting the Alembic archive"
+                with stats.timer( 'alembic_export', verbose = True ):
+                    alembic.export_archive( context, [ job.obj for job in archive_export ], archive, scene.frame_start, scene.frame_end,
+                        1.0 if auto_sampling else float(self.sampling) )
+            if auto_sampling and not self.patch:
+                with stats.timer( 'auto_sampling', verbose = True ):
+                    batches = self.job_batches( bake_jobs )
+                    for i, batch in enumerate(batches):
+                        for done, total in self.choose_sampling( context, batch ):
+                            yield 0.05 + 0.05 * (i + done / total) / len(batches), "Choosing the sampling"
+            if self.detect_rigid and not self.export_only and self.workers <= 1 and not self.patch:
+                with stats.timer( 'detect_rigid', verbose = True ):
+                    for batch in self.job_batches( bake_jobs ):
+                        self.detect_rigid_jobs( context, batch, times )
+            if self.share_identical and self.single_pass and self.workers <= 1 and not self.resume and not self.patch:
+                with stats.timer( 'find_identical', verbose = True ):
+                    self.find_identical_jobs( context, bake_jobs, sampling )
+            with stats.timer( 'bake', verbose = True ):
+                if self.patch:
+                    # only the samples of the range are evaluated, and written in place
+                    for done in self.batch_bake_steps( context, bake_jobs, sampling, patch_range = (self.patch_start, self.patch_end) ):
+                        yield 0.1 + 0.7 * done, "Patching frame " + str(scene.frame_current)
+                elif self.workers > 1:
+                    # workers bake slices of the samples, which must be the same for all the jobs they get
+                    samplings = sorted( set( job.sampling or sampling for job in bake_jobs ) )
+                    for i, job_sampling in enumerate(samplings):
+                        group = [ job for job in bake_jobs if (job.sampling or sampling) == job_sampling ]
+                        for done, total in parallel.bake_steps( group, scene.frame_start, scene.frame_end, job_sampling, self.workers ):
+                            yield 0.1 + 0.7 * (i + done / total) / len(samplings), "Baking with " + str(self.workers) + " processes"
+                elif self.single_pass:
+                    for done in self.batch_bake_steps( context, bake_jobs, sampling, resume = self.resume ):
+                        yield 0.1 + 0.7 * done, "Baking frame " + str(scene.frame_current)
+                else:
+                    for i, job in enumerate(bake_jobs):
+                        for done, total in bake.bake_steps( context, [job], scene.frame_start, scene.frame_end, sampling, resume = self.resume, stats = stats ):
+                            yield 0.1 + 0.7 * (i + done / total) / len(bake_jobs), "Baking " + job.obj.name
+                # objects which finally deformed on some samples are baked again, to a file
+                not_rigid = [ job for job in bake_jobs if job.tracker is not None and not job.tracker.is_rigid ]
+                for job in not_rigid:
+                    print(job.obj.name + " is not rigid, baking its vertex cache")
+                    job.tracker = None
+                    if job.matrices is not None:
+                        job.matrices = []
+                for done in self.batch_bake_steps( context, not_rigid, sampling ):
+                    yield 0.8 + 0.1 * done, "Baking the objects which are not rigid"
+        except (RuntimeError, ValueError, OSError) as e:
+            # the cache files can't be written: disk full, permissions, network share lost...
+            for job in jobs:
+                self.restore_modifiers( job )
+                self.restore_data( job )
+            self.report({'ERROR'}, str(e))
+            print(str(e))
+            return
+
+        if self.bake_transforms:
+            with stats.timer( 'transforms', verbose = True ):
+                self.collect_transforms( context, [ job for job in jobs if job.filepath != archive ], sampling )
+
+        for job in bake_jobs:
+            if job.shared:
+                job.shared_filepath = job.leader.filepath
+                print(job.obj.name + " is identical to " + job.leader.obj.name + ", sharing its cache")
+
+        for job in jobs:
+            if job.tracker is not None or job.shared_filepath != '' or job.filepath == archive:
+                continue
+            if self.rigid_parts and job.obj.type == 'MESH':
+                with stats.timer( 'rigid_parts', job.obj.name ):
+                    self.write_rigid_parts( context, job )
+            if self.compact != 'NONE' and job.source == '':
+                with stats.timer( 'compact', job.obj.name ):
+                    self.write_compact( job )
+        for job in jobs:
+            # a previous run may have replaced the PC2 file by its rigid parts or compact version, whatever the current options
+            if job.up_to_date and job.source == '' and job.tracker is None and job.shared_filepath == '' and job.filepath != archive:
+                job.source = manifest.cache_source( job.filepath )
+        for job in jobs:
+            if self.preview and job.tracker is None and job.shared_filepath == '' and job.filepath != archive:
+                with stats.timer( 'preview', job.obj.name ):
+                    self.write_preview( job )
+        for job in jobs:
+            if job.shared_filepath != '':
+                job.source = job.leader.source if job.leader is not None else manifest.cache_source( job.shared_filepath )
+                if self.preview:
+                    job.preview = job.leader.preview if job.leader is not None else self.existing_preview( job.shared_filepath )
+
+        with stats.timer( 'manifest' ):
+            for job in bake_jobs:
+                if job.tracker is None:
+                    cache_manifest.set( job.obj.name, job.filepath, job.fingerprint, sampling_used = job.sampling or sampling,
+                        shared_file = os.path.basename( job.shared_filepath ), **settings )
+            # so up-to-date caches aren't encoded again to be rejected again
+            for job in jobs:
+                entry = cache_manifest.get( job.obj.name )
+                if entry is not None and job.rigid_parts_rejected is not None:
+                    entry['rigid_parts_rejected'] = job.rigid_parts_rejected
+            for job in archive_export:
+                cache_manifest.set( job.obj.name, job.filepath, job.fingerprint, sampling_used = 1.0 if auto_sampling else float(self.sampling), **settings )
+            try:
+                cache_manifest.save()
+            except OSError:
+                print('Cannot write the Vertex Cache manifest at "' + cache_manifest.filepath + '"')
+
+        # from now on, the objects are modified
+        self.cancellable = False
+        yield 0.9, "Finishing"
+
+        cache_file = None
+        if len(archive_jobs) > 0:
+            stats.count( 'bytes', os.path.getsize( archive ) )
+            if not self.export_only:
+                cache_file = alembic.load_cache_file( archive )
+
+        # objects sharing a cache are finished after the one which owns it
+        for i, job in enumerate( sorted( jobs, key = lambda job: job.shared_filepath != '' ) ):
+            stats.count( 'vertices', job.num_points, job.obj.name )
+            for filepath in ( job.filepath, job.source ):
+                if job.shared_filepath == '' and filepath not in ('', archive) and os.path.isfile( filepath ):
+                    stats.count( 'bytes', os.path.getsize( filepath ), job.obj.name )
+            if job.filepath == archive:
+                self.finish_archive_object( context, job, cache_file )
+            elif job.tracker is not None:
+                self.finish_rigid_object( context, job, pc2.sample_times( scene.frame_start, scene.frame_end, job.sampling or sampling ) )
+            else:
+                try:
+                    self.finish_object( context, job )
+                    print(job.obj.name + " is cached!")
+                except (OSError, ValueError) as e:
+                    # the other objects are still finished
+                    self.restore_modifiers( job )
+                    self.report({'WARNING'}, job.obj.name + " is left as is, its cache can't be read: " + str(e))
+                    print(job.obj.name + " is left as is, its cache can't be read: " + str(e))
+                    continue
+            # the topology the cache was made for is recorded with it
+            entry = cache_manifest.get( job.obj.name )
+            if entry is not None and handlers.TOPOLOGY_PROPERTY in job.obj:
+                entry['topology'] = job.obj[handlers.TOPOLOGY_PROPERTY]
+            # the modifiers and parent of the object have changed
+            index.update( job.obj )
+            if self.batch_size > 0 and (i + 1) % self.batch_size == 0:
+                self.purge_orphan_data()
+            yield 0.9 + 0.1 * (i + 1) / len(jobs), "Finishing " + job.obj.name
+
+        try:
+            cache_manifest.save()
+        except OSError:
+            print('Cannot write the Vertex Cache manifest at "' + cache_manifest.filepath + '"')
+        if self.batch_size > 0:
+            self.purge_orphan_data( final = True )
+
+        # remove all unused armatures
+        if self.remove_armatures:
+            with stats.timer( 'armature_cleanup', verbose = True ):
+                for armature in index.unused_armatures( bpy.data.objects, bpy.data.armatures ):
+                    bpy.data.armatures.remove(armature)
+
+        # add Mesh Cache modifier on all objects, move at first position on the stack (above remaining subdivs)
+        self.result = {'FINISHED'}
+
+    def write_report( self, context, cache_dir ):
+        """Writes the timers and counters of the run to a JSON report in the cache directory"""
+        report_file = cache_dir + "/report.json"
+        self.stats.log( "Vertex cache done, see " + report_file, self.stats.time_start )
+        try:
+            self.stats.write( report_file,
+                blend_file = bpy.data.filepath,
+                scene = context.scene.name,
+                frame_start = context.scene.frame_start,
+                frame_end = context.scene.frame_end,
+                settings = { prop.identifier: getattr(self, prop.identifier) for prop in self.properties.bl_rna.properties if prop.identifier != 'rna_type' },
+                )
+        except OSError:
+            print('Cannot write the Vertex Cache report at "' + report_file + '"')
+
+    def prepare_object( self, context, obj, cache_dir, cache_manifest, settings, archive = '' ):
+        """Checks and prepares an object before baking. Returns its bake job, or None if it must be ignored.
+        Meshes are cached to the archive if there's one, instead of their own PC2 file"""
+        if not obj.type in {'MESH', 'CURVE', 'SURFACE', 'FONT'}:
+            return None
+
+        stats = self.stats
+        # make local
+        if not self.export_only or self.apply_subsurf:
+            # Make override/local/ignore for object
+            if obj.library is not None:
+                if self.linked_object == 'MAKE_LOCAL':
+                    with stats.timer( 'make_local', obj.name ):
+                        obj = obj.make_local()
+                    print(obj.name + " Was Made Local")
+                else:
+                    return None
+
+        # before it's made single-user, to find the objects which can share it again once cached
+        original_data = obj.data
+
+        # the trailing modifiers which don't need to be cached (subdivision...) are kept live above the cache
+        live_start = len(obj.modifiers)
+        if not self.apply_subsurf:
+            with stats.timer( 'analyze_modifiers', obj.name ):
+                live_start = dublf.modifiers.static_modifiers_start( obj )
+
+        # The archive replaces the whole mesh, its data is not modified
+        in_archive = archive != '' and obj.type == 'MESH'
+
+        # If data is linked and trying to apply non-deformers, will not work: let's make a local copy of the data
+        if not in_archive and obj.data.library is not None and dublf.modifiers.has_non_deform_modifiers(obj, live_start):
+            if self.linked_object == 'MAKE_LOCAL':
+                obj.data = obj.data.make_local()
+            else:
+                self.report({'INFO'}, obj.name + " ignored because it is linked.")
+                print(obj.name + " ignored because it is linked.")
+                return None
+
+        # If data is still multi user and trying to apply non-deformers, will not work: let's make a copy of the data
+        if not in_archive and obj.data.users > 1 and dublf.modifiers.has_non_deform_modifiers(obj, live_start):
+            if self.make_unique_data:
+                obj.data = obj.data.copy()
+            else:
+                self.report({'INFO'}, obj.name + " ignored because it has multi-user data.")
+                print(obj.name + " ignored because it has multi-user-data.")
+                return None
+
+        # pc2 file
+        pc2_file = archive if in_archive else cache_dir + "/" + obj.name + "_Cache.pc2"
+        # with baked transforms, only the deformation is cached
+        job = bake.CacheJob( obj, pc2_file, world_space = self.world_space and not self.bake_transforms )
+        job.original_data = original_data
+        if self.bake_transforms:
+            job.matrices = []
+
+        # The fingerprint is made before the stack is changed
+        with stats.timer( 'fingerprint', obj.name ):
+            job.fingerprint = manifest.object_fingerprint( obj, settings )
+        if self.skip_unchanged and cache_manifest.is_up_to_date( obj.name, pc2_file, job.fingerprint ):
+            job.up_to_date = True
+            job.shared_filepath = cache_manifest.shared_file( obj.name, pc2_file )
+            job.rigid_parts_rejected = cache_manifest.get( obj.name ).get( 'rigid_parts_rejected' )
+            print(obj.name + " did not change, its cache is kept")
+        else:
+            print('Caching ' + obj.name)
+
+        # save and remove the live modifiers, they're restored above the cache
+        with stats.timer( 'collect_modifiers', obj.name ):
+            job.removed_modifiers = dublf.modifiers.remove_modifiers( obj, live_start )
+        if len(job.removed_modifiers) > 0:
+            print("Keeping " + ", ".join( [ mod['name'] for mod in job.removed_modifiers ] ) + " live above the cache of " + obj.name)
+
+        return job
+
+    def check_patch( self, context, job ):
+        """Checks that the existing cache of an object can be patched, and sets the sampling of its job to the one of the cache.
+        The vertex count is checked when the cache is opened. Returns why it can't be patched, or an empty string"""
+        scene = context.scene
+        try:
+            header = pc2.read_header( job.filepath )
+        except (OSError, ValueError):
+            return job.obj.name + " has no PC2 cache to patch, it must be cached entirely."
+        if self.patch_start > self.patch_end:
+            return "The patch starts after its end."
+        if abs( header['start'] - scene.frame_start ) > 1e-3:
+            return job.obj.name + ": the cache starts at frame " + str(header['start']) + " instead of " + str(scene.frame_start) + ", it must be cached entirely."
+        if self.sampling != 'AUTO' and abs( header['sampling'] - float(self.sampling) ) > 1e-6:
+            return job.obj.name + ": the cache has a sampling of " + str(round(header['sampling'], 6)) + " instead of " + self.sampling + ", it must be cached entirely."
+        # the index of the first sample at or after the start of the patch
+        first = max( int(np.ceil( (self.patch_start - header['start']) / header['sampling'] - 1e-6 )), 0 )
+        if first > header['num_samples']:
+            return job.obj.name + ": the cache ends before frame " + str(self.patch_start) + ", the patch would leave a gap."
+        job.sampling = header['sampling']
+        return ''
+
+    def job_batches( self, jobs ):
+        """Splits the jobs in batches of Batch Size jobs, or a single batch without batch size.
+        Objects sharing the cache of another one stay in its batch, they're compared to it while it's baked"""
+        if self.batch_size <= 0:
+            return [ jobs ]
+        ids = set( id(job) for job in jobs )
+        groups = {}
+        for job in jobs:
+            leader = job.leader if id(job.leader) in ids else job
+            groups.setdefault( id(leader), [] ).append( job )
+        batches = [ [] ]
+        for group in groups.values():
+            if len(batches[-1]) > 0 and len(batches[-1]) + len(group) > self.batch_size:
+                batches.append( [] )
+            batches[-1].extend( group )
+        return batches
+
+    def batch_bake_steps( self, context, jobs, sampling, **options ):
+        """Bakes the jobs batch by batch, in a single pass per batch, see job_batches and bake.bake_steps.
+        Only the buffers and files of one batch are open at a time.
+        This is a generator which bakes one frame each time it is advanced, and yields the part of the bake done, from 0 to 1"""
+        scene = context.scene
+        batches = self.job_batches( jobs )
+        for i, batch in enumerate(batches):
+            if len(batches) > 1:
+                print("Baking batch " + str(i + 1) + "/" + str(len(batches)) + ": " + str(len(batch)) + " objects")
+            for done, total in bake.bake_steps( context, batch, scene.frame_start, scene.frame_end, sampling, stats = self.stats, **options ):
+                yield (i + done / total) / len(batches)
+
+    def choose_sampling( self, context, jobs ):
+        """Sets the sampling of each job to the coarsest one whose interpolation reproduces the motion within the tolerance.
+        The objects are evaluated at whole frames first, which gives the samplings of one frame or more;
+        the motion between frames is then checked at finer samplings only where it is not linear, see autosampling.SegmentRefiner.
+        This is a generator which evaluates one frame each time it is advanced, and yields the number of frames done and to do"""
+        scene = context.scene
+        frames = pc2.sample_times( scene.frame_start, scene.frame_end, 1.0 )
+        if len(jobs) == 0 or len(frames) == 0:
+            return
+        candidates = [ float(value) for value in SAMPLING_VALUES ]
+        chain = autosampling.refinement_chain( candidates )
+        frame_current = scene.frame_current
+        estimators = []
+        subsets = []
+        frame_samples = [ [] for job in jobs ]
+        try:
+            bake.set_frame( scene, frames[0] )
+            depsgraph = context.evaluated_depsgraph_get()
+            for job in jobs:
+                job.allocate( depsgraph )
+                # the error is measured on evenly spread vertices
+                subsets.append( np.linspace( 0, job.num_points - 1, min( job.num_points, AUTO_PROBE_POINTS ) ).astype(np.int64) )
+                estimators.append( autosampling.SamplingEstimator( 1.0, [ c for c in candidates if c >= 1.0 ], self.auto_tolerance ) )
+            for done, frame in enumerate(frames):
+                bake.set_frame( scene, frame )
+                for i, job in enumerate(jobs):
+                    points = job.read_coords( depsgraph )[subsets[i]]
+                    estimators[i].add( points )
+                    frame_samples[i].append( np.array( points, dtype=np.float64 ) )
+                yield done + 1, len(frames)
+
+            # the objects which need a sample per frame at least are checked between the frames where they don't move linearly
+            refiners = {}
+            for i, estimator in enumerate(estimators):
+                estimator.finish()
+                if estimator.choose()[0] > 1.0:
+                    continue
+                samples = np.stack( frame_samples[i] )
+                refiner = autosampling.SegmentRefiner( chain, self.auto_tolerance )
+                for segment in autosampling.curved_segments( samples, self.auto_tolerance ):
+                    refiner.add_segment( frames[segment], samples[segment], samples[segment + 1] )
+                refiners[i] = refiner
+            frame_samples = None
+            done = len(frames)
+            while any( not refiner.is_done for refiner in refiners.values() ):
+                times = {}
+                for i, refiner in refiners.items():
+                    for t in refiner.times():
+                        times.setdefault( t, [] ).append( i )
+                evaluated = { i: {} for i in refiners }
+                for k, t in enumerate( sorted( times ) ):
+                    bake.set_frame( scene, t )
+                    for i in times[t]:
+                        evaluated[i][t] = np.array( jobs[i].read_coords( depsgraph )[subsets[i]], dtype=np.float64 )
+                    yield done + k + 1, done + len(times)
+                done = done + len(times)
+                for i, refiner in refiners.items():
+                    if not refiner.is_done:
+                        refiner.refine( evaluated[i] )
+        finally:
+            for job in jobs:
+                job.close()
+            scene.frame_set( frame_current )
+
+        for i, (job, estimator) in enumerate( zip(jobs, estimators) ):
+            job.sampling, error = estimator.choose()
+            refiner = refiners.get( i )
+            if refiner is not None:
+                job.sampling = refiner.sampling
+                error = refiner.error
+            print(job.obj.name + ": sampling " + str(round(job.sampling, 6)) + " (max error: " + str(error) + ")")
+
+    def find_identical_jobs( self, context, jobs, sampling ):
+        """Compares the hashes of the objects at their first, middle and last samples, and makes the first of identical objects
+        the leader of the others. The samples of the others are then fully compared to the leader during the bake,
+        and written only if they differ.
+        The samples are in the space of the caches: in local space (baked transforms or no World Space),
+        copies of an object at different places share their deformation"""
+        scene = context.scene
+        groups = {}
+        for job in jobs:
+            if job.tracker is None:
+                groups.setdefault( job.sampling or sampling, [] ).append( job )
+        for job_sampling, group in groups.items():
+            if len(group) < 2:
+                continue
+            times = pc2.sample_times( scene.frame_start, scene.frame_end, job_sampling )
+            if len(times) == 0:
+                continue
+            probe_times = sorted( set( (times[0], times[len(times) // 2], times[-1]) ) )
+            leaders = {}
+            # only the hashes of the samples are kept, the objects are evaluated by batches
+            for batch in self.job_batches( group ):
+                for job, digest in zip( batch, bake.hash_samples( context, batch, probe_times ) ):
+                    leader = leaders.setdefault( (job.num_points, digest), job )
+                    if leader is not job:
+                        job.leader = leader
+
+    def detect_rigid_jobs( self, context, jobs, times ):
+        """Evaluates the objects on a few samples and sets a rigid tracker on the ones which may be static or rigid.
+        Their motion is then checked on all the samples during the bake, instead of writing a vertex cache"""
+        candidates = [ job for job in jobs if job.obj.type == 'MESH' ]
+        if len(candidates) == 0 or len(times) == 0:
+            return
+        count = min( RIGID_PROBE_SAMPLES, len(times) )
+        probe_times = [ times[ round(i * (len(times) - 1) / max(count - 1, 1)) ] for i in range(count) ]
+        probes = bake.read_samples( context, candidates, probe_times )
+        for job, samples in zip( candidates, probes ):
+            kind = rigid.classify( samples, self.rigid_tolerance, allow_rigid = self.world_space and not self.bake_transforms )
+            if kind == '':
+                continue
+            job.tracker = rigid.RigidTracker( samples[0], self.rigid_tolerance, allow_rigid = self.world_space and not self.bake_transforms )
+            print(job.obj.name + " may be " + kind.lower() + ", checking all samples")
+
+    def finish_rigid_object( self, context, job, times ):
+        """Replaces the modifiers and animation of a static or rigid object by its rest shape and baked transformations"""
+        obj = job.obj
+        tracker = job.tracker
+
+        if obj.data.users > 1:
+            obj.data = obj.data.copy()
+        with self.stats.timer( 'apply_modifiers', obj.name ):
+            self.apply_modifiers( context, obj )
+        vertices = obj.data.vertices
+        if len(vertices) != len(tracker.rest):
+            self.report({'WARNING'}, obj.name + " has a different vertex count after applying its modifiers, it is left as is.")
+            self.restore_modifiers( job )
+            return
+        vertices.foreach_set( 'co', tracker.rest.astype(np.float32).ravel() )
+        obj.data.update()
+
+        if self.bake_transforms:
+            self.bake_object_transforms( job )
+        elif self.world_space:
+            with self.stats.timer( 'remove_keyframes', obj.name ):
+                dublf.animation.remove_keyframes_from_object( obj )
+                obj.parent = None
+                dublf.animation.reset_transform(obj)
+            if not tracker.is_static:
+                # constraints are included in the baked transformations
+                for constraint in obj.constraints:
+                    constraint.mute = True
+                with self.stats.timer( 'bake_transforms', obj.name ):
+                    dublf.animation.bake_matrices( obj, times[:tracker.num_samples], tracker.matrices, obj.name + "_DuVertexCache" )
+
+        self.restore_modifiers( job )
+        print(obj.name + " is " + ("static" if tracker.is_static else "rigid") + " (max error: " + str(tracker.max_error) + "), no vertex cache needed!")
+
+    def collect_transforms( self, context, jobs, sampling ):
+        """Gets the world matrices of the objects at each of their samples, and stores them next to their cache.
+        They're recorded during the bake; the ones of the objects which were not baked again are read from their file,
+        patched bakes replace the patched samples in this file, and the missing ones (resumed bakes...) are evaluated"""
+        scene = context.scene
+        missing = {}
+        for job in jobs:
+            times = pc2.sample_times( scene.frame_start, scene.frame_end, job.sampling or sampling )
+            filepath = bake.transforms_path( job.filepath )
+            if job.matrices is not None and len(job.matrices) == len(times):
+                job.transforms = (times, job.matrices)
+                self.save_transforms( job )
+                continue
+            if self.patch and not job.up_to_date and job.matrices is not None:
+                patch_from, patch_times = bake.patch_samples( times, (self.patch_start, self.patch_end) )
+                existing = bake.load_transforms( filepath )
+                if existing is not None and len(job.matrices) == len(patch_times) and len(existing[0]) == len(times) and np.allclose( existing[0], times, atol = 1e-5 ):
+                    matrices = np.array( existing[1] )
+                    if len(patch_times) > 0:
+                        matrices[patch_from:patch_from + len(patch_times)] = job.matrices
+                    job.transforms = (times, matrices)
+                    self.save_transforms( job )
+                    continue
+            if job.up_to_date:
+                job.transforms = bake.load_transforms( filepath )
+                if job.transforms is not None:
+                    continue
+                # the sampling of the cache may have been chosen automatically
+                try:
+                    times = pc2.sample_times( scene.frame_start, scene.frame_end, pc2.read_header( manifest.cache_source( job.filepath ) or job.filepath )['sampling'] )
+                except (OSError, ValueError):
+                    pass
+            missing.setdefault( tuple(times), [] ).append( job )
+        for times, group in missing.items():
+            print("Evaluating the transformations of " + ", ".join( [ job.obj.name for job in group ] ))
+            for job, matrices in zip( group, bake.read_matrices( context, [ job.obj for job in group ], times ) ):
+                job.transforms = (list(times), matrices)
+                self.save_transforms( job )
+
+    def save_transforms( self, job ):
+        """Stores the world matrices of an object next to its cache, so that they're not evaluated again while the cache is up to date"""
+        filepath = bake.transforms_path( job.filepath )
+        try:
+            bake.save_transforms( filepath, *job.transforms )
+        except OSError:
+            print('Cannot write the transformations of ' + job.obj.name + ' at "' + filepath + '"')
+
+    def bake_object_transforms( self, job ):
+        """Replaces the transform animation, parent and constraints of an object by keyframes of its world matrix at each sample"""
+        obj = job.obj
+        if job.transforms is None:
+            return
+        frames, matrices = job.transforms
+        if len(matrices) == 0:
+            return
+        matrices = np.asarray( matrices )
+        # an object which does not move gets a single keyframe
+        if np.allclose( matrices, matrices[0], atol = 1e-6 ):
+            frames, matrices = frames[:1], matrices[:1]
+        with self.stats.timer( 'bake_transforms', obj.name ):
+            # constraints are included in the baked transformations
+            for constraint in obj.constraints:
+                constraint.mute = True
+            dublf.animation.bake_matrices( obj, frames, matrices, obj.name + "_DuVertexCache" )
+
+    def apply_modifiers( self, context, obj ):
+        """Applies or removes the modifiers of the object, which are replaced by the cache"""
+        context_override = context.copy()
+        context_override['selected_objects'] = [obj]
+        context_override['active_object'] = obj
+        context_override['object'] = obj
+
+        # apply all modifiers to object(s) 
+        # We need to apply and not just remove to keep vertex count.
+        # They will be overriden by the mesh cache anyway
+        if dublf.modifiers.has_non_deform_modifiers(obj) and self.batch_size > 0 and obj.type == 'MESH':
+            # Low memory: the whole stack is evaluated once, instead of once per modifier, without any operator.
+            # The replaced mesh is removed with the orphan data of the batch
+            depsgraph = context.evaluated_depsgraph_get()
+            mesh = bpy.data.meshes.new_from_object( obj.evaluated_get( depsgraph ), preserve_all_data_layers = True, depsgraph = depsgraph )
+            replaced_data = obj.data
+            name = replaced_data.name
+            replaced_data.name = name + "_Replaced"
+            mesh.name = name
+            obj.data = mesh
+            dublf.modifiers.remove_all_modifiers(obj)
+        elif dublf.modifiers.has_non_deform_modifiers(obj):
+            bpy.ops.object.modifiers_apply_all(context_override, apply_as='DATA') # This operator is registered by DuBLF
+        # remove
+        else:
+            dublf.modifiers.remove_all_modifiers(obj)
+
+    def finish_object( self, context, job ):
+        """Replaces the modifiers and animation of a baked object by its cache"""
+        obj = job.obj
+
+        stats = self.stats
+
+        filepath = job.shared_filepath or job.filepath
+
+        if not self.export_only:
+            # the cache is read before the object is modified, so it's left as is if the file is missing
+            cache_path = filepath
+            if job.source != '':
+                # the PC2 file is replaced by a local copy, expanded from the compressed cache when the file is opened
+                cache_path = handlers.local_cache( job.source, filepath )
+            header = pc2.read_header( cache_path )
+
+            with stats.timer( 'apply_modifiers', obj.name ):
+                leader = job.leader
+                if job.shared_filepath != '' and leader is not None and obj.type == 'MESH' and job.original_data == leader.original_data:
+                    # identical objects which were using the same data share the data of the leader
+                    replaced_data = obj.data
+                    obj.data = leader.obj.data
+                    dublf.modifiers.remove_all_modifiers( obj )
+                    if replaced_data.users == 0:
+                        bpy.data.meshes.remove( replaced_data )
+                else:
+                    self.apply_modifiers( context, obj )
+
+            # remove animation if world space only (for now)
+            if self.bake_transforms:
+                self.bake_object_transforms( job )
+            elif (self.world_space):
+                with stats.timer( 'remove_keyframes', obj.name ):
+                    dublf.animation.remove_keyframes_from_object( obj )
+                    obj.parent = None
+                    dublf.animation.reset_transform(obj)
+
+            # add Mesh Cache
+            with stats.timer( 'add_cache_modifier', obj.name ):
+                cacheMod = obj.modifiers.new(handlers.CACHE_MODIFIER_NAME, 'MESH_CACHE')
+                cacheMod.cache_format = 'PC2'
+                cacheMod.filepath = cache_path
+                if job.source != '':
+                    obj[handlers.SOURCE_PROPERTY] = job.source
+                # each object may have its own sampling
+                handlers.set_cache_timing( cacheMod, header )
+
+                # the viewport reads the preview, renders the full cache
+                if job.preview != '':
+                    cacheMod.show_viewport = False
+                    previewMod = obj.modifiers.new(handlers.PREVIEW_MODIFIER_NAME, 'MESH_CACHE')
+                    previewMod.cache_format = 'PC2'
+                    previewMod.filepath = job.preview
+                    previewMod.show_render = False
+                    # the preview has its own sampling, its samples must play at the same frames as the full cache
+                    handlers.set_cache_timing( previewMod, pc2.read_header( job.preview ) )
+
+            # to detect a change of vertex order which would make the cache explode, see handlers.check_caches
+            if obj.type == 'MESH':
+                obj[handlers.TOPOLOGY_PROPERTY] = manifest.topology_fingerprint( obj.data )
+
+        elif job.source != '' and job.shared_filepath == '' and os.path.isfile( job.filepath ):
+            os.remove( job.filepath )
+
+        self.restore_modifiers( job )
+
+    def finish_archive_object( self, context, job, cache_file ):
+        """Replaces the modifiers and animation of an object by its mesh and transformation in the Alembic archive"""
+        obj = job.obj
+        stats = self.stats
+
+        if cache_file is not None:
+            xform_path, mesh_path = alembic.object_paths( cache_file, obj )
+            if mesh_path == '':
+                self.report({'WARNING'}, obj.name + " was not found in the Alembic archive, it is left as is.")
+                print(obj.name + " was not found in the Alembic archive, it is left as is.")
+                self.restore_modifiers( job )
+                return
+
+            # the mesh is entirely read from the archive, including its topology
+            with stats.timer( 'apply_modifiers', obj.name ):
+                dublf.modifiers.remove_all_modifiers( obj )
+
+            if self.world_space:
+                with stats.timer( 'remove_keyframes', obj.name ):
+                    dublf.animation.remove_keyframes_from_object( obj )
+                    obj.parent = None
+                    dublf.animation.reset_transform(obj)
+
+            with stats.timer( 'add_cache_modifier', obj.name ):
+                alembic.add_cache( obj, cache_file, self.world_space )
+
+        self.restore_modifiers( job )
+
+    def write_compact( self, job ):
+        """Writes the compact version of a cache, if it's missing or outdated"""
+        compact_file = compact.compact_path( job.filepath )
+        if not (job.up_to_date and os.path.isfile( compact_file )):
+            if not os.path.isfile( job.filepath ):
+                return
+            try:
+                compact.encode( job.filepath, compact_file, max_error = self.compact_max_error )
+            except ValueError as e:
+                # keep the PC2 file
+                if os.path.isfile( compact_file ):
+                    os.remove( compact_file )
+                self.report({'WARNING'}, str(e))
+                print(str(e))
+                return
+        if self.compact == 'REPLACE':
+            job.source = compact_file
+
+    def existing_preview( self, filepath ):
+        """Gets the preview of a cache if it exists with the preview sampling, or an empty string"""
+        preview_file = pc2.preview_path( filepath )
+        try:
+            if abs( pc2.read_header( preview_file )['sampling'] - float(self.preview_sampling) ) < 1e-6:
+                return preview_file
+        except (OSError, ValueError):
+            pass
+        return ''
+
+    def write_preview( self, job ):
+        """Resamples a cache to its preview, if it's missing or outdated and the preview sampling is coarser than the one of the cache"""
+        if job.up_to_date:
+            job.preview = self.existing_preview( job.filepath )
+            if job.preview != '':
+                return
+        if not os.path.isfile( job.filepath ):
+            return
+        preview_sampling = float(self.preview_sampling)
+        if pc2.read_header( job.filepath )['sampling'] >= preview_sampling - 1e-6:
+            return
+        preview_file = pc2.preview_path( job.filepath )
+        pc2.resample( job.filepath, preview_file, preview_sampling )
+        job.preview = preview_file
+        self.stats.count( 'preview_bytes', os.path.getsize( preview_file ), job.obj.name )
+
+    def write_rigid_parts( self, context, job ):
+        """Replaces the cache by the transformations of the loose parts of the object, if they move rigidly"""
+        parts_file = parts.parts_path( job.filepath )
+        if job.up_to_date and os.path.isfile( parts_file ):
+            job.source = parts_file
+            return
+        if job.up_to_date and job.rigid_parts_rejected == self.rigid_tolerance:
+            return
+        if not os.path.isfile( job.filepath ):
+            return
+        edges = bake.evaluated_edges( job.obj, context.evaluated_depsgraph_get() )
+        try:
+            parts_file, report = parts.encode( job.filepath, edges, parts_file, tolerance = self.rigid_tolerance )
+        except ValueError as e:
+            print(str(e))
+            return
+        print(job.obj.name + ": " + str(report['num_rigid_parts']) + "/" + str(report['num_parts']) + " rigid parts (max error: " + str(report['max_error']) + "), "
+            + str(report['num_fallback_points']) + " vertices stored as is, " + str(round(report['ratio'] * 100, 2)) + "% of the vertex cache size")
+        if report['ratio'] > RIGID_PARTS_MAX_RATIO:
+            os.remove( parts_file )
+            job.rigid_parts_rejected = self.rigid_tolerance
+            return
+        job.source = parts_file
+
+    def purge_orphan_data( self, final = False ):
+        """Removes the meshes and curves the run made unused, like the ones replaced when applying modifiers,
+        which would otherwise stay in memory until the file is saved and opened again.
+        The original data of the objects is compared when they're finished, it's kept until the final purge"""
+        kept = set( self.orphans )
+        if not final:
+            kept.update( job.original_data.as_pointer() for job in self.jobs if job.original_data is not None )
+        orphans = [ data for data in orphan_data() if not data.as_pointer() in kept ]
+        if len(orphans) == 0:
+            return
+        with self.stats.timer( 'purge_orphan_data' ):
+            bpy.data.batch_remove( orphans )
+        self.stats.count( 'purged_data', len(orphans) )
+
+    def restore_data( self, job ):
+        """Gives back its original data to an object which was made single-user before baking"""
+        obj = job.obj
+        if job.original_data is None or obj.data == job.original_data:
+            return
+        copy = obj.data
+        obj.data = job.original_data
+        if copy.users == 0:
+            if obj.type == 'MESH':
+                bpy.data.meshes.remove( copy )
+            else:
+                bpy.data.curves.remove( copy )
+
+    def restore_modifiers( self, job ):
+        """Adds back the modifiers which were removed before baking, in their original order"""
+        for mod in job.removed_modifiers:
+            dublf.modifiers.restore_modifier( job.obj, mod )
+        job.removed_modifiers = []
+
+class DUVERTEXCACHE_OT_create_vertex_cache ( CreateVertexCache, bpy.types.Operator ):
+    """Exports a point cache of the selected objects, removes their modifiers and imports back the cache with a new Mesh Cache modifier.
+    Settings can be adjusted in the Properties > Object panel."""
+    bl_idname = "duvertexcache.create_vertex_cache"
+    bl_label = "Create Vertex Cache"
+    bl_options = {'REGISTER','UNDO'}
+
+class DUVERTEXCACHE_OT_create_vertex_cache_no_undo ( CreateVertexCache, bpy.types.Operator ):
+    """Creates the vertex caches without an undo step: the converted scene is not copied to the undo history,
+    which saves a lot of memory on heavy scenes, but the conversion can't be undone"""
+    bl_idname = "duvertexcache.create_vertex_cache_no_undo"
+    bl_label = "Create Vertex Cache (No Undo)"
+    bl_options = {'REGISTER'}
+
+class DUVERTEXCACHE_OT_clean_cache_store ( bpy.types.Operator ):
+    """Removes the vertex caches of the project which no Mesh Cache modifier uses anymore, the least recently used first.
+    Only the Blender files saved with DuVertexCache enabled know which caches they use, the caches of the other files are kept"""
+    bl_idname = "duvertexcache.clean_cache_store"
+    bl_label = "Clean Vertex Caches"
+    bl_options = {'REGISTER'}
+
+    directory: bpy.props.StringProperty(
+        name="Project Folder",
+        description="The folder searched for vertex caches, the folder of the current file if empty",
+        subtype = 'DIR_PATH',
+        default = '' )
+    quota: bpy.props.FloatProperty(
+        name="Disk Quota (GB)",
+        description="Unused caches are removed until all the caches fit in this size. With 0, all the unused caches are removed",
+        default = 0.0,
+        min = 0.0 )
+    dry_run: bpy.props.BoolProperty(
+        name="Dry Run",
+        description="Only report the caches which would be removed",
+        default = True )
+
+    def invoke( self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute( self, context ):
+        root = bpy.path.abspath( self.directory ) if self.directory != '' else os.path.dirname( bpy.data.filepath )
+        if root == '' or not os.path.isdir( root ):
+            self.report({'ERROR'}, "Choose the project folder, or save the file first.")
+            return {'CANCELLED'}
+
+        # the current file may not be saved yet
+        handlers.update_references()
+        quota = int( self.quota * 1024 ** 3 ) if self.quota > 0 else -1
+        report = store.clean( root, quota, dry_run = self.dry_run )
+
+        verb = "Would remove " if self.dry_run else "Removed "
+        for entry in report['evicted']:
+            print(verb + entry['path'])
+        for path in report['failed']:
+            print("Cannot remove " + path)
+        report_file = os.path.join( root, "vertex_cache_store.json" )
+        try:
+            with open(report_file, 'w') as f:
+                json.dump( report, f, indent = 4 )
+        except OSError:
+            print('Cannot write the Vertex Cache store report at "' + report_file + '"')
+        message = (verb + str(len(report['evicted'])) + " unused caches (" + store.format_size( report['evicted_size'] ) + ") out of "
+            + str(report['num_files']) + " (" + store.format_size( report['total_size'] ) + "), see " + report_file)
+        self.report({'WARNING'} if report['over_quota'] or len(report['failed']) > 0 else {'INFO'}, message)
+        return {'FINISHED'}
+
+def menu_func(self, context):
+    self.layout.operator('duvertexcache.create_vertex_cache', icon = 'PACKAGE')
+    self.layout.operator('duvertexcache.create_vertex_cache_no_undo', icon = 'PACKAGE')
+
+def cleanup_menu_func(self, context):
+    self.layout.operator('duvertexcache.clean_cache_store')
+
+classes = (
+    DUVERTEXCACHE_OT_create_vertex_cache,
+    DUVERTEXCACHE_OT_create_vertex_cache_no_undo,
+    DUVERTEXCACHE_OT_clean_cache_store,
+)
+
+def register():
+    # register
+    for cls in classes:
+        bpy.utils.register_class(cls)
+
+    # menus
+    bpy.types.VIEW3D_MT_object_animation.append(menu_func)
+    bpy.types.TOPBAR_MT_file_cleanup.append(cleanup_menu_func)
+
+def unregister():
+    # unregister
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+
+    # menu
+    bpy.types.VIEW3D_MT_object_animation.remove(menu_func)
+    bpy.types.TOPBAR_MT_file_cleanup.remove(cleanup_menu_func)
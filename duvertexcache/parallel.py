@@ -0,0 +1,201 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Bakes the frame range in slices, each slice in its own background Blender process
+
+import bpy # pylint: disable=import-error
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from . import (
+    pc2,
+    bake,
+)
+
+WORKER_SCRIPT = os.path.join( os.path.dirname(os.path.abspath(__file__)), 'worker.py' )
+# Seconds between two checks of the workers
+POLL_INTERVAL = 0.05
+
+def split_samples( num_samples, num_slices ):
+    """
+    Splits the samples in consecutive slices of (almost) the same size.
+
+    :return: The slices, as (first, stop) sample indices. There are no empty slices.
+    :rtype: list of tuple
+    """
+    num_slices = max( min(num_slices, num_samples), 1 )
+    size, extra = divmod( num_samples, num_slices )
+    slices = []
+    first = 0
+    for i in range(num_slices):
+        stop = first + size + (1 if i < extra else 0)
+        if stop > first:
+            slices.append( (first, stop) )
+        first = stop
+    return slices
+
+# The data which may have drivers
+DRIVEN_DATA = ('objects', 'meshes', 'shape_keys', 'curves', 'lattices', 'armatures', 'materials', 'node_groups', 'scenes', 'worlds')
+
+def python_drivers():
+    """
+    Lists the drivers which need Python to be evaluated: the scripted ones which aren't simple expressions.
+
+    :return: The drivers, as (ID name, data path).
+    :rtype: list of tuple
+    """
+    drivers = []
+    for collection in DRIVEN_DATA:
+        for id_data in getattr( bpy.data, collection ):
+            anim = getattr( id_data, 'animation_data', None )
+            if anim is None:
+                continue
+            for fcurve in anim.drivers:
+                driver = fcurve.driver
+                if driver.type == 'SCRIPTED' and not driver.is_simple_expression:
+                    drivers.append( (id_data.name, fcurve.data_path) )
+    return drivers
+
+def autoexec_args():
+    """
+    The arguments for the workers to run the scripts of the file like the current session does.
+    The workers run with --factory-startup, which disables the automatic execution of scripts,
+    so Python drivers and rig scripts would silently not be evaluated.
+
+    :return: The Blender arguments.
+    :rtype: list of str
+    :raises RuntimeError: If the file has Python drivers but the current session doesn't run them.
+    """
+    if not bpy.app.autoexec_fail:
+        return [ '--enable-autoexec' ]
+    drivers = python_drivers()
+    if len(drivers) > 0:
+        raise RuntimeError( "Can't bake in parallel: the automatic execution of Python scripts is disabled for this file, "
+            "and it has Python drivers (" + drivers[0][0] + ": " + drivers[0][1] + "). Allow the execution of the scripts, or bake without parallel processes." )
+    return [ '--disable-autoexec' ]
+
+def bake_steps( jobs, start, end, sampling, num_workers ):
+    """
+    Bakes the jobs with several background Blender processes, each one evaluating a slice of the frame range.
+    The current file is saved as a temporary copy which is opened by all the workers;
+    their partial caches are then concatenated into the final files.
+
+    Note that simulations which depend on the previous frames (cloth, soft body...) can't be split this way.
+
+    :arg jobs: The jobs to bake.
+    :type jobs: bake.CacheJob[]
+    :arg num_workers: The number of processes to run at the same time.
+    :type num_workers: int
+    :return: A generator which checks the workers each time it is advanced, and yields the number of workers done and started.
+        If it is closed before the end, the workers are stopped.
+    :rtype: generator of tuple (int, int)
+    """
+    if len(jobs) == 0:
+        return
+    num_samples = pc2.sample_count( start, end, sampling )
+    slices = split_samples( num_samples, num_workers )
+    autoexec = autoexec_args()
+
+    temp_dir = tempfile.mkdtemp( prefix = 'duvertexcache_' )
+    processes = []
+    try:
+        # The workers open a copy of the current state (with the modifiers which are not cached already removed)
+        blend_path = os.path.join( temp_dir, 'bake.blend' )
+        bpy.ops.wm.save_as_mainfile( filepath = blend_path, copy = True )
+
+        for i, sample_range in enumerate(slices):
+            task = {
+                'start': start,
+                'end': end,
+                'sampling': sampling,
+                'sample_range': sample_range,
+                'objects': [
+                    {
+                        'name': job.obj.name,
+                        'filepath': _part_path( temp_dir, j, i ),
+                        'world_space': job.world_space,
+                        # the world matrices are recorded with the samples, see bake.CacheJob.matrices
+                        'transforms': _transforms_part_path( temp_dir, j, i ) if job.matrices is not None else '',
+                    } for j, job in enumerate(jobs)
+                ],
+            }
+            task_path = os.path.join( temp_dir, 'task_' + str(i) + '.json' )
+            with open(task_path, 'w') as f:
+                json.dump( task, f )
+            log = open( os.path.join( temp_dir, 'worker_' + str(i) + '.log' ), 'w' )
+            args = [
+                bpy.app.binary_path,
+                '--factory-startup',
+            ] + autoexec + [
+                '--background', blend_path,
+                '--python-exit-code', '1',
+                '--python', WORKER_SCRIPT,
+                '--', task_path,
+            ]
+            print("Starting bake worker " + str(i+1) + "/" + str(len(slices)) + ": samples " + str(sample_range[0]) + " to " + str(sample_range[1] - 1))
+            processes.append( (subprocess.Popen( args, stdout = log, stderr = subprocess.STDOUT ), log) )
+
+        failed = []
+        running = list(range(len(processes)))
+        while len(running) > 0:
+            for i in list(running):
+                process, log = processes[i]
+                if process.poll() is None:
+                    continue
+                log.close()
+                running.remove( i )
+                if process.returncode != 0:
+                    failed.append( i )
+            yield len(processes) - len(running), len(processes)
+            if len(running) > 0:
+                time.sleep( POLL_INTERVAL )
+        if len(failed) > 0:
+            with open( os.path.join( temp_dir, 'worker_' + str(failed[0]) + '.log' ), 'r' ) as f:
+                print( f.read()[-4000:] )
+            raise RuntimeError( "The bake failed in " + str(len(failed)) + " of the " + str(len(slices)) + " worker processes." )
+
+        for j, job in enumerate(jobs):
+            pc2.concatenate( [ _part_path( temp_dir, j, i ) for i in range(len(slices)) ], job.filepath )
+            if job.matrices is not None:
+                job.matrices = []
+                for i in range(len(slices)):
+                    transforms = bake.load_transforms( _transforms_part_path( temp_dir, j, i ) )
+                    if transforms is None:
+                        raise RuntimeError( "The worker " + str(i+1) + " did not write the transformations of " + job.obj.name + "." )
+                    job.matrices.extend( transforms[1] )
+    finally:
+        # stop the workers still running if the bake is cancelled
+        for process, log in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            log.close()
+        shutil.rmtree( temp_dir, ignore_errors = True )
+
+def bake( jobs, start, end, sampling, num_workers ):
+    """Bakes with several processes and waits for them, see bake_steps"""
+    for progress in bake_steps( jobs, start, end, sampling, num_workers ):
+        pass
+
+def _part_path( temp_dir, job_index, slice_index ):
+    return os.path.join( temp_dir, 'cache_' + str(job_index) + '_' + str(slice_index) + '.pc2' )
+
+def _transforms_part_path( temp_dir, job_index, slice_index ):
+    return bake.transforms_path( _part_path( temp_dir, job_index, slice_index ) )
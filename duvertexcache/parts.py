@@ -0,0 +1,176 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Rigid parts cache (.duvr) format
+# This module only depends on NumPy, it does not need Blender.
+#
+# Each loose part of the mesh which moves rigidly is stored as one transform (3x4 float32) per sample;
+# the vertices of the other parts are stored as is.
+#
+# Layout: header | part of each vertex (int32) | rigid flag of each part (uint8) | error of each part (float32)
+#         | rest position of each vertex (3 float32) | indices of the vertices stored as is (int32)
+#         | samples: transforms of the rigid parts, then the vertices stored as is
+
+import os
+import struct
+
+import numpy as np
+
+from . import (
+    pc2,
+    rigid,
+)
+
+EXTENSION = '.duvr'
+# signature, version, num_points, start, sampling, num_samples, num_parts, num_rigid_parts, num_fallback_points, tolerance
+HEADER_FORMAT = '<4siiffiiiif'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SIGNATURE = b'DUVR'
+FILE_VERSION = 1
+
+def parts_path( pc2_path ):
+    """Gets the path of the rigid parts file stored next to a PC2 file"""
+    return os.path.splitext( pc2_path )[0] + EXTENSION
+
+def read_header( filepath ):
+    """
+    Reads the header of a rigid parts cache.
+
+    :rtype: dict
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError( filepath + " is not a rigid parts cache: the header is incomplete." )
+    values = struct.unpack(HEADER_FORMAT, data)
+    if values[0] != SIGNATURE:
+        raise ValueError( filepath + " is not a rigid parts cache: wrong signature." )
+    if values[1] != FILE_VERSION:
+        raise ValueError( filepath + " uses an unsupported rigid parts cache version (" + str(values[1]) + ")." )
+    return {
+        'num_points': values[2],
+        'start': values[3],
+        'sampling': values[4],
+        'num_samples': values[5],
+        'num_parts': values[6],
+        'num_rigid_parts': values[7],
+        'num_fallback_points': values[8],
+        'tolerance': values[9],
+    }
+
+def encode( pc2_path, edges, filepath = '', tolerance = 0.0001 ):
+    """
+    Writes the rigid parts version of a PC2 file.
+    The parts are fitted on all the samples a first time to find the ones which are rigid,
+    then a second time to write the transforms, so memory use does not depend on the number of samples.
+
+    :arg pc2_path: The PC2 file.
+    :arg edges: The vertex indices of the edges of the cached mesh.
+    :type edges: numpy.ndarray of shape (num_edges, 2)
+    :arg filepath: The rigid parts file, next to the PC2 file if empty.
+    :arg tolerance: The maximum distance between a vertex and its position predicted by the transform of its part.
+        Parts with a larger error are stored as is.
+    :return: The path to the file and the report:
+        'num_parts', 'num_rigid_parts', 'num_fallback_points', 'max_error' (of the rigid parts),
+        'part_errors' (the largest error of each part), 'ratio' (size of the file / size of the PC2 file).
+    :rtype: tuple (str, dict)
+    """
+    if filepath == '':
+        filepath = parts_path( pc2_path )
+
+    with pc2.PC2File( pc2_path ) as cache:
+        if cache.num_samples == 0:
+            raise ValueError( pc2_path + " does not contain any sample." )
+        labels = rigid.connected_components( cache.num_points, edges )
+        rest = np.array( cache.samples[0], dtype=np.float64 )
+        fitter = rigid.PartFitter( rest, labels )
+
+        # first pass: errors
+        errors = np.zeros( fitter.num_parts )
+        for first, chunk in cache.chunks():
+            for points in chunk:
+                errors = np.maximum( errors, fitter.fit( points )[1] )
+        is_rigid = errors <= tolerance
+        rigid_parts = np.flatnonzero( is_rigid )
+        fallback = np.flatnonzero( ~is_rigid[labels] ).astype(np.int32)
+
+        # second pass: data
+        with open(filepath, 'wb') as f:
+            f.write( struct.pack( HEADER_FORMAT, SIGNATURE, FILE_VERSION,
+                cache.num_points, cache.start, cache.sampling, cache.num_samples,
+                fitter.num_parts, len(rigid_parts), len(fallback), tolerance ) )
+            f.write( labels.astype('<i4').tobytes() )
+            f.write( is_rigid.astype(np.uint8).tobytes() )
+            f.write( errors.astype('<f4').tobytes() )
+            f.write( rest.astype('<f4').tobytes() )
+            f.write( fallback.astype('<i4').tobytes() )
+            for first, chunk in cache.chunks():
+                for points in chunk:
+                    transforms = fitter.fit( points )[0]
+                    f.write( transforms[rigid_parts].astype('<f4').tobytes() )
+                    f.write( np.ascontiguousarray( points[fallback], dtype='<f4' ).tobytes() )
+
+    report = {
+        'num_parts': fitter.num_parts,
+        'num_rigid_parts': len(rigid_parts),
+        'num_fallback_points': len(fallback),
+        'max_error': float( errors[is_rigid].max() ) if len(rigid_parts) > 0 else 0.0,
+        'part_errors': errors.tolist(),
+        'ratio': os.path.getsize( filepath ) / max( os.path.getsize( pc2_path ), 1 ),
+    }
+    return filepath, report
+
+def expand( filepath, pc2_path ):
+    """
+    Rebuilds a PC2 file which can be read by the Mesh Cache modifier from a rigid parts cache.
+
+    :arg filepath: The rigid parts file.
+    :arg pc2_path: The PC2 file to write.
+    :return: The path to the PC2 file.
+    :rtype: str
+    """
+    header = read_header( filepath )
+    num_points = header['num_points']
+    num_parts = header['num_parts']
+    num_rigid = header['num_rigid_parts']
+    num_fallback = header['num_fallback_points']
+
+    os.makedirs( os.path.dirname( os.path.abspath(pc2_path) ), exist_ok = True )
+    tmp_path = pc2_path + '.tmp'
+    with open(filepath, 'rb') as f:
+        f.seek( HEADER_SIZE )
+        labels = np.frombuffer( f.read( num_points * 4 ), dtype='<i4' ).astype(np.int64)
+        is_rigid = np.frombuffer( f.read( num_parts ), dtype=np.uint8 ).astype(bool)
+        f.read( num_parts * 4 ) # errors
+        rest = np.frombuffer( f.read( num_points * 12 ), dtype='<f4' ).reshape( (-1, 3) )
+        fallback = np.frombuffer( f.read( num_fallback * 4 ), dtype='<i4' )
+        fitter = rigid.PartFitter( rest, labels )
+        rigid_parts = np.flatnonzero( is_rigid )
+        transforms = np.zeros( (num_parts, 3, 4) )
+        # parts stored as is keep the identity, their vertices are overwritten
+        transforms[:, :, :3] = np.identity(3)
+        sample_size = num_rigid * 48 + num_fallback * 12
+
+        with pc2.PC2Writer( tmp_path, num_points, header['start'], header['sampling'], header['num_samples'] ) as writer:
+            for i in range(header['num_samples']):
+                data = f.read( sample_size )
+                if len(data) < sample_size:
+                    raise ValueError( filepath + " is truncated." )
+                transforms[rigid_parts] = np.frombuffer( data[:num_rigid * 48], dtype='<f4' ).reshape( (-1, 3, 4) )
+                points = fitter.apply( transforms )
+                points[fallback] = np.frombuffer( data[num_rigid * 48:], dtype='<f4' ).reshape( (-1, 3) )
+                writer.write_sample( points )
+    os.replace( tmp_path, pc2_path )
+    return pc2_path
@@ -0,0 +1,515 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Point Cache 2 (.pc2) file format
+# This module only depends on NumPy, it does not need Blender.
+
+import json
+import math
+import os
+import struct
+import numpy as np
+
+# Header: signature, file version, number of points, start frame, sample rate, number of samples
+HEADER_FORMAT = '<12siiffi'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+SIGNATURE = b'POINTCACHE2\0'
+FILE_VERSION = 1
+# Each point of each sample is three little endian float32
+POINT_DTYPE = np.dtype('<f4')
+# Added to the name of the lower sampling versions of the caches, used for viewport playback
+PREVIEW_SUFFIX = '_Preview'
+
+def sample_count( start, end, sampling ):
+    """
+    Gets the number of samples needed to cover a frame range.
+    The last sample is at or after the last frame, so that the Mesh Cache modifier interpolates
+    the frames after the last whole sample instead of holding it.
+
+    :arg start: The first frame.
+    :type start: float
+    :arg end: The last frame (included).
+    :type end: float
+    :arg sampling: The number of frames per sample.
+    :type sampling: float
+    :return: The number of samples.
+    :rtype: int
+    """
+    if end < start:
+        return 0
+    # the epsilon prevents 10 / 0.1 from becoming 100.0001...
+    return int(math.ceil( (end - start) / sampling - 1e-6 )) + 1
+
+def sample_times( start, end, sampling ):
+    """
+    Gets the frames (including subframes) at which samples are taken.
+
+    :return: The list of frames.
+    :rtype: float[]
+    """
+    return [ start + i * sampling for i in range( sample_count(start, end, sampling) ) ]
+
+def pack_header( num_points, start, sampling, num_samples ):
+    """Builds the 32 bytes header of a PC2 file"""
+    return struct.pack(HEADER_FORMAT, SIGNATURE, FILE_VERSION, num_points, start, sampling, num_samples)
+
+def progress_path( filepath ):
+    """Gets the path of the progress file written next to a cache being exported"""
+    return filepath + '.progress'
+
+class PC2Writer():
+    """
+    Writes a PC2 file sample by sample.
+    Each sample is written to disk with a single call as soon as it is available, from an array of shape (num_points, 3).
+    Samples have a fixed size, so the file can be resumed or patched by seeking to any sample.
+
+    While the file is being written, its header declares no sample and a small progress file is kept next to it;
+    the header is finalized and the progress file is removed when all the samples have been written.
+    """
+
+    def __init__( self, filepath, num_points, start, sampling, num_samples, resume = False ):
+        """
+        :arg resume: If True and an interrupted export with the same settings exists, continues it
+            after its last complete sample instead of starting over.
+        """
+        self.filepath = filepath
+        self.num_points = num_points
+        self.start = start
+        self.sampling = sampling
+        self.num_samples = num_samples
+        self.samples_written = 0
+        self.sample_size = num_points * 3 * POINT_DTYPE.itemsize
+        self._file = None
+
+        if resume:
+            self.samples_written = self._resumable_samples()
+        if self.samples_written > 0:
+            self._file = open(filepath, 'r+b')
+            # drop any incomplete sample
+            self._file.truncate( HEADER_SIZE + self.samples_written * self.sample_size )
+            self._file.seek( 0, os.SEEK_END )
+        else:
+            self._file = open(filepath, 'wb')
+            self._file.write( pack_header(num_points, start, sampling, 0) )
+        self._write_progress()
+
+    def write_sample( self, coords ):
+        """
+        Appends a sample to the file.
+
+        :arg coords: The point coordinates.
+        :type coords: numpy.ndarray of shape (num_points, 3) or (num_points * 3,)
+        """
+        if coords.size != self.num_points * 3:
+            raise ValueError( "Expected %i points, got %i" % (self.num_points, coords.size // 3) )
+        np.ascontiguousarray(coords, dtype=POINT_DTYPE).tofile(self._file)
+        self.samples_written = self.samples_written + 1
+
+    def write_samples( self, coords ):
+        """
+        Appends several samples to the file at once.
+
+        :arg coords: The point coordinates of the samples.
+        :type coords: numpy.ndarray of shape (n, num_points, 3)
+        """
+        if coords.shape[1:] != (self.num_points, 3):
+            raise ValueError( "Expected samples of %i points, got %s" % (self.num_points, str(coords.shape)) )
+        np.ascontiguousarray(coords, dtype=POINT_DTYPE).tofile(self._file)
+        self.samples_written = self.samples_written + len(coords)
+
+    def read_samples( self, first, count ):
+        """
+        Reads back samples already written to the file.
+
+        :rtype: numpy.ndarray of shape (count, num_points, 3)
+        """
+        count = max( min( count, self.samples_written - first ), 0 )
+        self._file.flush()
+        with open(self.filepath, 'rb') as f:
+            f.seek( HEADER_SIZE + first * self.sample_size )
+            data = np.fromfile( f, dtype=POINT_DTYPE, count = count * self.num_points * 3 )
+        return data.reshape( (count, self.num_points, 3) )
+
+    @property
+    def is_complete( self ):
+        """True when all the samples have been written"""
+        return self.samples_written >= self.num_samples
+
+    def close( self ):
+        """Finalizes the header with the number of samples actually written and closes the file.
+        The progress file is kept if the export is not complete, so that it can be resumed."""
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.write( pack_header(self.num_points, self.start, self.sampling, self.samples_written) )
+        self._file.close()
+        self._file = None
+        if self.is_complete:
+            try:
+                os.remove( progress_path(self.filepath) )
+            except OSError:
+                pass
+        else:
+            self._write_progress()
+
+    def _write_progress( self ):
+        progress = {
+            'num_points': self.num_points,
+            'start': self.start,
+            'sampling': self.sampling,
+            'num_samples': self.num_samples,
+            'samples_written': self.samples_written,
+        }
+        with open( progress_path(self.filepath), 'w' ) as f:
+            json.dump( progress, f )
+
+    def _resumable_samples( self ):
+        """Gets the number of complete samples of an interrupted export which can be continued"""
+        try:
+            with open( progress_path(self.filepath), 'r' ) as f:
+                progress = json.load( f )
+            size = os.path.getsize( self.filepath )
+        except (OSError, ValueError):
+            return 0
+        if progress.get('num_points') != self.num_points:
+            return 0
+        if not math.isclose( progress.get('start', math.nan), self.start, abs_tol=1e-4 ):
+            return 0
+        if not math.isclose( progress.get('sampling', math.nan), self.sampling, abs_tol=1e-6 ):
+            return 0
+        if size < HEADER_SIZE or self.sample_size == 0:
+            return 0
+        # what's on disk is the reference, the progress file may be late
+        complete = (size - HEADER_SIZE) // self.sample_size
+        return min( complete, self.num_samples )
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        self.close()
+
+class PC2Patcher( PC2Writer ):
+    """
+    Overwrites some consecutive samples of an existing PC2 file in place.
+    Samples have a fixed size, so only the patched samples are written, with a seek to the first one;
+    the file is extended if the patch goes past its last sample.
+    """
+
+    def __init__( self, filepath, num_points, start, sampling, first ):
+        """
+        :arg start: The first frame of the file.
+        :arg first: The index of the first sample to overwrite.
+        :raises ValueError: If the file does not have the same number of points, start frame and sampling,
+            or if it ends before the first sample to overwrite.
+        """
+        header = read_header( filepath )
+        if header['num_points'] != num_points:
+            raise ValueError( filepath + " has " + str(header['num_points']) + " points instead of " + str(num_points) + ", it can't be patched." )
+        if not math.isclose( header['start'], start, abs_tol=1e-3 ):
+            raise ValueError( filepath + " starts at frame " + str(header['start']) + " instead of " + str(start) + ", it can't be patched." )
+        if not math.isclose( header['sampling'], sampling, abs_tol=1e-6 ):
+            raise ValueError( filepath + " has a sampling of " + str(header['sampling']) + " instead of " + str(sampling) + ", it can't be patched." )
+        if first > header['num_samples']:
+            raise ValueError( filepath + " ends before the samples to patch, it can't be patched." )
+        self.filepath = filepath
+        self.num_points = num_points
+        self.start = start
+        self.sampling = sampling
+        self.first = first
+        self.num_samples = header['num_samples']
+        # the number of samples patched
+        self.samples_written = 0
+        self.sample_size = num_points * 3 * POINT_DTYPE.itemsize
+        self._file = open(filepath, 'r+b')
+        self._file.seek( HEADER_SIZE + first * self.sample_size )
+
+    @property
+    def is_complete( self ):
+        return True
+
+    def read_samples( self, first, count ):
+        """Reads back samples already patched, first is relative to the first patched sample"""
+        count = max( min( count, self.samples_written - first ), 0 )
+        self._file.flush()
+        with open(self.filepath, 'rb') as f:
+            f.seek( HEADER_SIZE + (self.first + first) * self.sample_size )
+            data = np.fromfile( f, dtype=POINT_DTYPE, count = count * self.num_points * 3 )
+        return data.reshape( (count, self.num_points, 3) )
+
+    def close( self ):
+        """Updates the number of samples in the header if the file was extended, and closes the file"""
+        if self._file is None:
+            return
+        self.num_samples = max( self.num_samples, self.first + self.samples_written )
+        self._file.seek(0)
+        self._file.write( pack_header(self.num_points, self.start, self.sampling, self.num_samples) )
+        self._file.close()
+        self._file = None
+
+def concatenate( part_paths, filepath ):
+    """
+    Concatenates PC2 files covering consecutive frame ranges into a single file.
+    The samples are copied block by block and the header is written once.
+
+    :arg part_paths: The files to concatenate, in order.
+    :type part_paths: str[]
+    :arg filepath: The resulting file.
+    :type filepath: str
+    :return: The number of samples of the resulting file.
+    :rtype: int
+    """
+    headers = [ read_header(part) for part in part_paths ]
+    if len(headers) == 0:
+        raise ValueError( "There is no file to concatenate." )
+    first = headers[0]
+    num_samples = 0
+    for part, header in zip(part_paths, headers):
+        if header['num_points'] != first['num_points']:
+            raise ValueError( part + " has " + str(header['num_points']) + " points instead of " + str(first['num_points']) + "." )
+        if not math.isclose( header['sampling'], first['sampling'], abs_tol=1e-6 ):
+            raise ValueError( part + " does not have the same sample rate." )
+        expected_start = first['start'] + num_samples * first['sampling']
+        if not math.isclose( header['start'], expected_start, abs_tol=1e-3 ):
+            raise ValueError( part + " starts at frame " + str(header['start']) + " instead of " + str(expected_start) + "." )
+        num_samples = num_samples + header['num_samples']
+
+    sample_size = first['num_points'] * 3 * POINT_DTYPE.itemsize
+    with open(filepath, 'wb') as f:
+        f.write( pack_header(first['num_points'], first['start'], first['sampling'], num_samples) )
+        for part, header in zip(part_paths, headers):
+            with open(part, 'rb') as p:
+                p.seek( HEADER_SIZE )
+                remaining = header['num_samples'] * sample_size
+                while remaining > 0:
+                    block = p.read( min(remaining, 16 * 1024 * 1024) )
+                    if len(block) == 0:
+                        raise ValueError( part + " is shorter than declared in its header." )
+                    f.write( block )
+                    remaining = remaining - len(block)
+    return num_samples
+
+def preview_path( filepath ):
+    """Gets the path of the preview (lower sampling) version of a cache"""
+    return os.path.splitext( filepath )[0] + PREVIEW_SUFFIX + '.pc2'
+
+def resample( filepath, out_path, sampling ):
+    """
+    Writes a copy of a PC2 file with another sampling, without evaluating the scene again.
+    The new samples are linearly interpolated between the original ones, the same way the Mesh Cache modifier does,
+    by blocks so that the memory used does not depend on the size of the file.
+
+    :arg sampling: The number of frames per sample of the new file.
+    :type sampling: float
+    :return: The number of samples of the new file.
+    :rtype: int
+    """
+    with PC2File( filepath ) as source:
+        if source.num_samples == 0:
+            raise ValueError( filepath + " does not contain any sample." )
+        num_samples = sample_count( source.start, source.end, sampling )
+        sample_size = max( source.num_points * 3 * POINT_DTYPE.itemsize, 1 )
+        # each block of new samples reads twice as many original samples
+        step = max( PC2File.chunk_bytes // (sample_size * 3), 1 )
+        with PC2Writer( out_path, source.num_points, source.start, sampling, num_samples ) as writer:
+            for first in range(0, num_samples, step):
+                indices = np.arange( first, min(first + step, num_samples) ) * (sampling / source.sampling)
+                indices = np.minimum( indices, source.num_samples - 1 )
+                i = np.floor( indices + 1e-6 ).astype(np.int64)
+                t = np.clip( indices - i, 0.0, 1.0 ).astype(POINT_DTYPE)[:, np.newaxis, np.newaxis]
+                j = np.minimum( i + 1, source.num_samples - 1 )
+                writer.write_samples( source.samples[i] * (np.float32(1.0) - t) + source.samples[j] * t )
+    return num_samples
+
+def read_header( filepath ):
+    """
+    Reads the header of a PC2 file.
+
+    :return: The header values: 'num_points', 'start', 'sampling', 'num_samples'.
+    :rtype: dict
+    """
+    with open(filepath, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError( filepath + " is not a PC2 file: the header is incomplete." )
+    signature, version, num_points, start, sampling, num_samples = struct.unpack(HEADER_FORMAT, data)
+    if signature != SIGNATURE:
+        raise ValueError( filepath + " is not a PC2 file: wrong signature." )
+    if version != FILE_VERSION:
+        raise ValueError( filepath + " uses an unsupported PC2 version (" + str(version) + ")." )
+    return {
+        'num_points': num_points,
+        'start': start,
+        'sampling': sampling,
+        'num_samples': num_samples,
+    }
+
+class PC2File():
+    """
+    Gives access to the samples of a PC2 file without loading it in memory.
+    The samples are a numpy.memmap of shape (num_samples, num_points, 3):
+    any sample can be read in constant time, the OS loads only the pages which are actually used.
+    """
+
+    # Maximum number of bytes read at once by the methods going through all the samples
+    chunk_bytes = 64 * 1024 * 1024
+
+    def __init__( self, filepath, mode = 'r' ):
+        """
+        :arg filepath: The path to the PC2 file.
+        :arg mode: 'r' for read-only access, 'r+' to be able to modify the samples in place.
+        """
+        header = read_header( filepath )
+        self.filepath = filepath
+        self.mode = mode
+        self.num_points = header['num_points']
+        self.start = header['start']
+        self.sampling = header['sampling']
+        self.header_samples = header['num_samples']
+        # An interrupted export may contain less samples than declared in its header
+        sample_size = self.num_points * 3 * POINT_DTYPE.itemsize
+        available = self.header_samples
+        if sample_size > 0:
+            available = (os.path.getsize(filepath) - HEADER_SIZE) // sample_size
+        self.num_samples = min(self.header_samples, available)
+        shape = (self.num_samples, self.num_points, 3)
+        if self.num_samples * sample_size == 0:
+            # numpy can't map an empty file region
+            self.samples = np.empty(shape, dtype=POINT_DTYPE)
+        else:
+            self.samples = np.memmap(filepath, dtype=POINT_DTYPE, mode=mode, offset=HEADER_SIZE, shape=shape)
+
+    @property
+    def end( self ):
+        """The frame of the last sample"""
+        return self.start + (self.num_samples - 1) * self.sampling
+
+    @property
+    def is_complete( self ):
+        """False if the file contains less samples than declared in its header"""
+        return self.num_samples == self.header_samples
+
+    def sample_index( self, frame ):
+        """Gets the (fractional) index of the sample at a given frame, clamped to the cached range"""
+        if self.num_samples == 0:
+            raise IndexError( self.filepath + " does not contain any sample." )
+        index = (frame - self.start) / self.sampling
+        return min( max(index, 0.0), self.num_samples - 1.0 )
+
+    def frame( self, frame ):
+        """
+        Gets the coordinates at a given frame, linearly interpolated between samples
+        the same way the Mesh Cache modifier does.
+
+        :rtype: numpy.ndarray of shape (num_points, 3)
+        """
+        index = self.sample_index(frame)
+        i = int(index)
+        t = index - i
+        if t < 1e-6 or i + 1 >= self.num_samples:
+            return np.array(self.samples[i])
+        return self.samples[i] * np.float32(1.0 - t) + self.samples[i+1] * np.float32(t)
+
+    def chunks( self ):
+        """
+        Iterates over the samples by blocks small enough to fit in memory.
+
+        :return: Tuples (first sample index, samples)
+        :rtype: generator of (int, numpy.ndarray of shape (n, num_points, 3))
+        """
+        sample_size = max( self.num_points * 3 * POINT_DTYPE.itemsize, 1 )
+        step = max( self.chunk_bytes // sample_size, 1 )
+        for first in range(0, self.num_samples, step):
+            yield first, self.samples[first:first + step]
+
+    def bounding_box( self ):
+        """
+        Gets the bounding box of all the points over all the samples.
+
+        :return: min and max corners.
+        :rtype: tuple of two numpy.ndarray of shape (3,)
+        """
+        bounds = self.sample_bounds()
+        if len(bounds) == 0:
+            return np.zeros(3, dtype=POINT_DTYPE), np.zeros(3, dtype=POINT_DTYPE)
+        return bounds[:, 0].min(axis=0), bounds[:, 1].max(axis=0)
+
+    def sample_bounds( self ):
+        """
+        Gets the bounding box of each sample.
+
+        :rtype: numpy.ndarray of shape (num_samples, 2, 3): min and max corners of each sample
+        """
+        bounds = np.zeros( (self.num_samples, 2, 3), dtype=POINT_DTYPE )
+        if self.num_points == 0:
+            return bounds
+        for first, chunk in self.chunks():
+            bounds[first:first + len(chunk), 0] = chunk.min(axis=1)
+            bounds[first:first + len(chunk), 1] = chunk.max(axis=1)
+        return bounds
+
+    def sample_stats( self ):
+        """
+        Gets statistics for each sample.
+
+        :return: Arrays of length num_samples:
+            'frame': the frame of the sample,
+            'min', 'max': the bounding box corners, shape (num_samples, 3),
+            'centroid': the mean of the points, shape (num_samples, 3),
+            'max_motion': the largest distance travelled by a point since the previous sample,
+            'mean_motion': the mean distance travelled by the points since the previous sample.
+        :rtype: dict
+        """
+        stats = {
+            'frame': self.start + np.arange(self.num_samples) * self.sampling,
+            'min': np.zeros( (self.num_samples, 3), dtype=POINT_DTYPE ),
+            'max': np.zeros( (self.num_samples, 3), dtype=POINT_DTYPE ),
+            'centroid': np.zeros( (self.num_samples, 3), dtype=np.float64 ),
+            'max_motion': np.zeros( self.num_samples, dtype=POINT_DTYPE ),
+            'mean_motion': np.zeros( self.num_samples, dtype=np.float64 ),
+        }
+        if self.num_points == 0:
+            return stats
+        previous = None
+        for first, chunk in self.chunks():
+            last = first + len(chunk)
+            stats['min'][first:last] = chunk.min(axis=1)
+            stats['max'][first:last] = chunk.max(axis=1)
+            stats['centroid'][first:last] = chunk.mean(axis=1, dtype=np.float64)
+            # motion since the previous sample, including the last sample of the previous chunk
+            if previous is None:
+                deltas = np.diff(chunk, axis=0)
+                offset = first + 1
+            else:
+                deltas = np.diff( np.concatenate( (previous, chunk) ), axis=0 )
+                offset = first
+            if len(deltas) > 0:
+                distances = np.sqrt( np.einsum('sij,sij->si', deltas, deltas) )
+                stats['max_motion'][offset:last] = distances.max(axis=1)
+                stats['mean_motion'][offset:last] = distances.mean(axis=1, dtype=np.float64)
+            previous = np.array(chunk[-1:])
+        return stats
+
+    def close( self ):
+        """Releases the memory map"""
+        if self.mode != 'r' and isinstance(self.samples, np.memmap):
+            self.samples.flush()
+        self.samples = None
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        self.close()
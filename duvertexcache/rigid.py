@@ -0,0 +1,240 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Rigid motion detection and fitting
+# This module only depends on NumPy, it does not need Blender.
+
+import numpy as np
+
+def fit_rigid( rest_centered, rest_centroid, points ):
+    """
+    Finds the rotation and translation which best move the rest points onto the given points (Kabsch algorithm).
+
+    :arg rest_centered: The rest points minus their centroid.
+    :type rest_centered: numpy.ndarray of shape (n, 3)
+    :arg rest_centroid: The centroid of the rest points.
+    :type rest_centroid: numpy.ndarray of shape (3,)
+    :arg points: The moved points.
+    :type points: numpy.ndarray of shape (n, 3)
+    :return: The transform and the largest distance between a transformed rest point and its moved point.
+    :rtype: tuple (numpy.ndarray of shape (4, 4), float)
+    """
+    points = np.asarray( points, dtype=np.float64 )
+    centroid = points.mean( axis=0 )
+    covariance = rest_centered.T @ (points - centroid)
+    u, s, vt = np.linalg.svd( covariance )
+    # avoid reflections
+    d = np.sign( np.linalg.det( vt.T @ u.T ) )
+    if d == 0:
+        d = 1.0
+    rotation = vt.T @ np.diag( (1.0, 1.0, d) ) @ u.T
+    translation = centroid - rotation @ rest_centroid
+    matrix = np.identity( 4 )
+    matrix[:3, :3] = rotation
+    matrix[:3, 3] = translation
+    residual = rest_centered @ rotation.T + centroid - points
+    error = float( np.sqrt( np.einsum('ij,ij->i', residual, residual).max() ) ) if len(points) > 0 else 0.0
+    return matrix, error
+
+class RigidTracker():
+    """
+    Checks, sample after sample, if points stay still or only move rigidly from their rest position,
+    and keeps the transform of each sample.
+    """
+
+    def __init__( self, rest, tolerance, allow_rigid = True ):
+        """
+        :arg rest: The rest position of the points.
+        :type rest: numpy.ndarray of shape (n, 3)
+        :arg tolerance: The maximum distance between a point and its position predicted by the transform.
+        :type tolerance: float
+        :arg allow_rigid: If False, only static points are accepted.
+        :type allow_rigid: bool
+        """
+        self.rest = np.array( rest, dtype=np.float64 )
+        self.tolerance = tolerance
+        self.allow_rigid = allow_rigid
+        self.rest_centroid = self.rest.mean( axis=0 ) if len(self.rest) > 0 else np.zeros(3)
+        self.rest_centered = self.rest - self.rest_centroid
+        self.matrices = []
+        self.is_static = True
+        self.failed = False
+        self.max_error = 0.0
+
+    @property
+    def num_samples( self ):
+        return len(self.matrices)
+
+    @property
+    def is_rigid( self ):
+        """True if all the samples are a rigid transform of the rest position (static included)"""
+        return not self.failed
+
+    def update( self, points ):
+        """
+        Adds a sample.
+
+        :return: False as soon as the points don't follow the rest position rigidly anymore.
+        :rtype: bool
+        """
+        if self.failed:
+            return False
+        points = np.asarray( points, dtype=np.float64 ).reshape( (-1, 3) )
+        if len(points) != len(self.rest):
+            self.failed = True
+            return False
+        if self.is_static:
+            delta = points - self.rest
+            error = float( np.sqrt( np.einsum('ij,ij->i', delta, delta).max() ) ) if len(points) > 0 else 0.0
+            if error <= self.tolerance:
+                self.max_error = max( self.max_error, error )
+                self.matrices.append( np.identity(4) )
+                return True
+            self.is_static = False
+        if not self.allow_rigid:
+            self.failed = True
+            return False
+        matrix, error = fit_rigid( self.rest_centered, self.rest_centroid, points )
+        if error > self.tolerance:
+            self.failed = True
+            return False
+        self.max_error = max( self.max_error, error )
+        self.matrices.append( matrix )
+        return True
+
+def classify( samples, tolerance, allow_rigid = True ):
+    """
+    Checks if some samples are static or a rigid transform of the first one.
+
+    :arg samples: The samples.
+    :type samples: numpy.ndarray of shape (num_samples, n, 3)
+    :return: 'STATIC', 'RIGID', or '' if the points deform.
+    :rtype: str
+    """
+    if len(samples) == 0:
+        return ''
+    tracker = RigidTracker( samples[0], tolerance, allow_rigid )
+    for sample in samples:
+        if not tracker.update( sample ):
+            return ''
+    return 'STATIC' if tracker.is_static else 'RIGID'
+
+# ========= LOOSE PARTS ================
+
+def connected_components( num_points, edges ):
+    """
+    Finds the loose parts of a mesh.
+
+    :arg num_points: The number of vertices.
+    :type num_points: int
+    :arg edges: The vertex indices of the edges.
+    :type edges: numpy.ndarray of shape (num_edges, 2)
+    :return: The part index of each vertex, parts are numbered from 0 in the order of their first vertex.
+    :rtype: numpy.ndarray of shape (num_points,)
+    """
+    labels = np.arange( num_points, dtype=np.int64 )
+    edges = np.asarray( edges, dtype=np.int64 ).reshape( (-1, 2) )
+    a = edges[:, 0]
+    b = edges[:, 1]
+    while len(edges) > 0:
+        la = labels[a]
+        lb = labels[b]
+        if np.array_equal( la, lb ):
+            break
+        # hook the root with the highest index to the lowest one
+        np.minimum.at( labels, np.maximum(la, lb), np.minimum(la, lb) )
+        # pointer jumping, until each vertex points to its root
+        while True:
+            jumped = labels[labels]
+            if np.array_equal( jumped, labels ):
+                break
+            labels = jumped
+    return np.unique( labels, return_inverse = True )[1].reshape( -1 )
+
+class PartFitter():
+    """Fits a rigid transform on each loose part of a mesh at once"""
+
+    def __init__( self, rest, labels ):
+        """
+        :arg rest: The rest position of the vertices.
+        :type rest: numpy.ndarray of shape (n, 3)
+        :arg labels: The part of each vertex, see connected_components.
+        :type labels: numpy.ndarray of shape (n,)
+        """
+        self.rest = np.asarray( rest, dtype=np.float64 ).reshape( (-1, 3) )
+        self.labels = np.asarray( labels, dtype=np.int64 )
+        self.num_parts = int( self.labels.max() ) + 1 if len(self.labels) > 0 else 0
+        self.counts = np.bincount( self.labels, minlength = self.num_parts ).astype(np.float64)
+        self.rest_centroids = self._centroids( self.rest )
+        self.rest_centered = self.rest - self.rest_centroids[self.labels]
+        # to reduce per-vertex values to per-part values
+        self._order = np.argsort( self.labels, kind = 'stable' )
+        self._starts = np.concatenate( ([0], np.cumsum( self.counts ).astype(np.int64)[:-1]) )
+
+    def fit( self, points ):
+        """
+        Fits the transforms of all the parts on a sample.
+
+        :arg points: The position of the vertices.
+        :type points: numpy.ndarray of shape (n, 3)
+        :return: The transform of each part (rotation and translation), and the largest distance
+            between a transformed rest vertex and its actual position, for each part.
+        :rtype: tuple (numpy.ndarray of shape (num_parts, 3, 4), numpy.ndarray of shape (num_parts,))
+        """
+        points = np.asarray( points, dtype=np.float64 ).reshape( (-1, 3) )
+        centroids = self._centroids( points )
+        centered = points - centroids[self.labels]
+        covariances = np.empty( (self.num_parts, 3, 3) )
+        for i in range(3):
+            for j in range(3):
+                covariances[:, i, j] = np.bincount( self.labels, self.rest_centered[:, i] * centered[:, j], minlength = self.num_parts )
+        u, s, vt = np.linalg.svd( covariances )
+        v = vt.transpose( 0, 2, 1 )
+        ut = u.transpose( 0, 2, 1 )
+        # avoid reflections
+        d = np.sign( np.linalg.det( v @ ut ) )
+        d[d == 0] = 1.0
+        v[:, :, 2] *= d[:, np.newaxis]
+        rotations = v @ ut
+        translations = centroids - np.einsum( 'pij,pj->pi', rotations, self.rest_centroids )
+
+        transforms = np.empty( (self.num_parts, 3, 4) )
+        transforms[:, :, :3] = rotations
+        transforms[:, :, 3] = translations
+        return transforms, self.errors( transforms, points )
+
+    def apply( self, transforms ):
+        """
+        Moves the rest vertices with the transforms of their part.
+
+        :rtype: numpy.ndarray of shape (n, 3)
+        """
+        transforms = np.asarray( transforms, dtype=np.float64 )
+        rotated = np.einsum( 'vij,vj->vi', transforms[self.labels, :, :3], self.rest )
+        return rotated + transforms[self.labels, :, 3]
+
+    def errors( self, transforms, points ):
+        """Gets the largest distance between the transformed rest vertices and the given points, for each part"""
+        if len(points) == 0:
+            return np.zeros( self.num_parts )
+        delta = self.apply( transforms ) - points
+        distances = np.sqrt( np.einsum( 'ij,ij->i', delta, delta ) )
+        return np.maximum.reduceat( distances[self._order], self._starts )
+
+    def _centroids( self, points ):
+        centroids = np.empty( (self.num_parts, 3) )
+        for axis in range(3):
+            centroids[:, axis] = np.bincount( self.labels, points[:, axis], minlength = self.num_parts )
+        return centroids / np.maximum( self.counts, 1.0 )[:, np.newaxis]
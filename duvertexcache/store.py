@@ -0,0 +1,336 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Manages the cache directories of a project: finds the cache files which are not used anymore,
+# and removes the least recently used ones to keep the caches under a disk quota.
+# This module does not need Blender.
+# Usage: python -m duvertexcache.store project_dir [--quota 50G] [--delete] [--json report.json]
+#
+# The caches of a file are in <blend>_VertexCache/<scene>/ next to it. Each time the file is saved or opened in Blender,
+# the cache files its modifiers use, wherever they are, are written to <blend>_VertexCache/references.json (see handlers.py),
+# so that the caches of all the files of a project can be checked without opening them.
+# A cache is used if any file of the project references it, not only the file which made it
+# (e.g. a lighting file using the caches exported by an animation file).
+# The caches of a file without references are never removed unless another file uses them or the file itself is gone,
+# and neither are the caches written since the file was last saved or opened.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from . import (
+    pc2,
+    compact,
+    parts,
+    manifest,
+    bake,
+)
+
+CACHE_DIR_SUFFIX = '_VertexCache'
+REFERENCES_NAME = 'references.json'
+# The extensions of the files which can be removed
+CACHE_EXTENSIONS = ('.pc2', compact.EXTENSION, parts.EXTENSION, manifest.ARCHIVE_EXTENSION, '.progress', bake.TRANSFORMS_SUFFIX)
+
+class CacheEntry():
+    """A cache file of a project"""
+
+    def __init__( self, path, blend_file ):
+        self.path = path
+        stat = os.stat( path )
+        self.size = stat.st_size
+        # access times are not updated on many file systems, the modification time is the minimum
+        self.last_use = max( stat.st_mtime, stat.st_atime )
+        # the Blender file whose cache directory contains the cache
+        self.blend_file = blend_file
+        # the objects and modifiers using the cache: "object/modifier"
+        self.users = []
+        # False if it's unknown whether the cache is used, when the Blender file has no references
+        self.known = True
+
+    @property
+    def is_used( self ):
+        return len(self.users) > 0 or not self.known
+
+    def to_dict( self ):
+        return {
+            'path': self.path,
+            'size': self.size,
+            'last_use': self.last_use,
+            'blend_file': self.blend_file,
+            'users': self.users,
+            'known': self.known,
+        }
+
+def references_path( cache_root ):
+    """Gets the references file of the cache directory of a Blender file"""
+    return os.path.join( cache_root, REFERENCES_NAME )
+
+def related_files( filepath ):
+    """Gets the files which belong to the same cache as a file: its compact, rigid parts and preview versions,
+    its progress file and transformations"""
+    base = os.path.splitext( filepath )[0]
+    if base.endswith( pc2.PREVIEW_SUFFIX ):
+        base = base[:-len(pc2.PREVIEW_SUFFIX)]
+    pc2_path = base + '.pc2'
+    return {
+        pc2_path,
+        pc2.progress_path( pc2_path ),
+        compact.compact_path( pc2_path ),
+        parts.parts_path( pc2_path ),
+        pc2.preview_path( pc2_path ),
+        bake.transforms_path( pc2_path ),
+        filepath,
+    }
+
+def read_references( cache_root ):
+    """
+    Reads the cache files used by a Blender file, see write_references.
+
+    :return: The users ("object/modifier") of each file, by absolute path, and the last time the Blender file used them;
+        or None if the Blender file has no references.
+    :rtype: tuple (dict, float)
+    """
+    try:
+        with open( references_path( cache_root ), 'r' ) as f:
+            data = json.load( f )
+    except (OSError, ValueError):
+        return None
+    users = {}
+    for path, file_users in data.get('files', {}).items():
+        # paths are relative to the cache directory, so that the project can be moved
+        path = os.path.normpath( os.path.join( os.path.abspath( cache_root ), path ) )
+        # the other versions of the same cache are used too
+        for related in related_files( path ):
+            users.setdefault( related, [] ).extend( file_users )
+    return users, data.get('last_used', 0.0)
+
+def relative_path( path, start ):
+    """Gets a path relative to a folder, or the absolute path if it's on another drive"""
+    path = os.path.abspath( path )
+    try:
+        return os.path.relpath( path, os.path.abspath( start ) )
+    except ValueError:
+        return path
+
+def write_references( cache_root, blend_file, files ):
+    """
+    Records the cache files used by a Blender file.
+
+    :arg files: The users ("object/modifier") of each file, by path.
+    :type files: dict
+    """
+    data = {
+        'blend_file': blend_file,
+        'last_used': time.time(),
+        'files': { relative_path( path, cache_root ): users for path, users in files.items() },
+    }
+    os.makedirs( cache_root, exist_ok = True )
+    tmp_path = references_path( cache_root ) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump( data, f, indent = 1, sort_keys = True )
+    os.replace( tmp_path, references_path( cache_root ) )
+
+def index_project( root ):
+    """
+    Finds all the cache files under a folder, with their size, last use and users.
+
+    :rtype: CacheEntry[]
+    """
+    cache_roots = []
+    for dirpath, dirnames, filenames in os.walk( root ):
+        names = [ name for name in dirnames if name.endswith( CACHE_DIR_SUFFIX ) ]
+        for name in names:
+            cache_roots.append( (os.path.join( dirpath, name ), os.path.join( dirpath, name[:-len(CACHE_DIR_SUFFIX)] + '.blend' )) )
+        # the cache directories are not searched for other projects
+        dirnames[:] = [ name for name in dirnames if not name in names ]
+    project_users = project_references( cache_roots )
+    entries = []
+    for cache_root, blend_file in cache_roots:
+        entries.extend( index_cache_root( cache_root, blend_file, project_users ) )
+    return entries
+
+def project_references( cache_roots ):
+    """
+    Merges the references of all the Blender files of a project: a cache is used if any of them uses it.
+
+    :arg cache_roots: The cache directories of the Blender files, and the Blender files.
+    :type cache_roots: list of tuple (str, str)
+    :return: The users ("file.blend:object/modifier") of each cache file, and the last time one of them used it, by absolute path.
+    :rtype: dict of tuple (str[], float)
+    """
+    project_users = {}
+    for cache_root, blend_file in cache_roots:
+        if not os.path.isfile( blend_file ):
+            continue
+        references = read_references( cache_root )
+        if references is None:
+            continue
+        users, last_used = references
+        blend_name = os.path.basename( blend_file )
+        for path, file_users in users.items():
+            all_users, all_last_used = project_users.get( path, ([], 0.0) )
+            project_users[path] = ( all_users + [ blend_name + ":" + user for user in file_users ], max( all_last_used, last_used ) )
+    return project_users
+
+def index_cache_root( cache_root, blend_file, project_users = None ):
+    """Indexes the cache files of a Blender file, in all its scenes.
+    project_users are the caches used by all the files of the project, see project_references; only the ones of this file by default"""
+    blend_exists = os.path.isfile( blend_file )
+    references = read_references( cache_root ) if blend_exists else None
+    if project_users is None:
+        project_users = project_references( [ (cache_root, blend_file) ] )
+    entries = []
+    for dirpath, dirnames, filenames in os.walk( cache_root ):
+        for filename in filenames:
+            if not filename.lower().endswith( CACHE_EXTENSIONS ):
+                continue
+            path = os.path.normpath( os.path.abspath( os.path.join( dirpath, filename ) ) )
+            try:
+                entry = CacheEntry( path, blend_file )
+            except OSError:
+                continue
+            users, last_used = project_users.get( path, ([], 0.0) )
+            if len(users) > 0:
+                entry.users = users
+                entry.last_use = max( entry.last_use, last_used )
+            elif references is not None:
+                if os.path.getmtime( path ) > references[1]:
+                    # cached after the Blender file was last saved or opened, its unsaved changes may use it
+                    entry.known = False
+            elif blend_exists:
+                entry.known = False
+            entries.append( entry )
+    return entries
+
+def parse_size( value ):
+    """Converts a size like 500M or 1.5T to bytes"""
+    units = { 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4 }
+    value = value.strip().upper().rstrip('B')
+    if value != '' and value[-1] in units:
+        return int( float(value[:-1]) * units[value[-1]] )
+    return int( float(value) )
+
+def plan_eviction( entries, quota = -1 ):
+    """
+    Chooses the caches to remove: all the unused ones if quota is negative,
+    or the least recently used unused ones until the total size is under the quota.
+
+    :arg quota: The maximum size of all the caches, in bytes.
+    :type quota: int
+    :return: The caches to remove, the least recently used first.
+    :rtype: CacheEntry[]
+    """
+    unused = sorted( [ entry for entry in entries if not entry.is_used ], key = lambda entry: entry.last_use )
+    if quota < 0:
+        return unused
+    total = sum( entry.size for entry in entries )
+    evicted = []
+    for entry in unused:
+        if total <= quota:
+            break
+        evicted.append( entry )
+        total = total - entry.size
+    return evicted
+
+def evict( entries, dry_run = True ):
+    """
+    Removes cache files, and the scene directories which are then empty.
+
+    :return: The files which could not be removed.
+    :rtype: str[]
+    """
+    failed = []
+    if dry_run:
+        return failed
+    for entry in entries:
+        try:
+            os.remove( entry.path )
+        except OSError:
+            failed.append( entry.path )
+            continue
+        directory = os.path.dirname( entry.path )
+        try:
+            if len(os.listdir( directory )) == 0:
+                os.rmdir( directory )
+        except OSError:
+            pass
+    return failed
+
+def clean( root, quota = -1, dry_run = True ):
+    """
+    Indexes the caches of a project and removes the unused ones, see plan_eviction.
+
+    :return: The report: 'total_size', 'used_size', 'unused_size', 'unknown_size', 'evicted' (the caches removed, or to remove with dry_run),
+        'evicted_size', 'failed', 'over_quota' (True if the caches are still over the quota).
+    :rtype: dict
+    """
+    entries = index_project( root )
+    evicted = plan_eviction( entries, quota )
+    failed = evict( evicted, dry_run )
+    total = sum( entry.size for entry in entries )
+    evicted_size = sum( entry.size for entry in evicted if not entry.path in failed )
+    return {
+        'root': os.path.abspath( root ),
+        'dry_run': dry_run,
+        'quota': quota,
+        'num_files': len(entries),
+        'total_size': total,
+        'used_size': sum( entry.size for entry in entries if len(entry.users) > 0 ),
+        'unused_size': sum( entry.size for entry in entries if not entry.is_used ),
+        'unknown_size': sum( entry.size for entry in entries if not entry.known ),
+        'evicted': [ entry.to_dict() for entry in evicted ],
+        'evicted_size': evicted_size,
+        'failed': failed,
+        'over_quota': quota >= 0 and total - evicted_size > quota,
+    }
+
+def format_size( size ):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return str(round(size, 1)) + " " + unit
+        size = size / 1024
+    return str(round(size, 1)) + " TB"
+
+def main( argv ):
+    parser = argparse.ArgumentParser(
+        prog = "python -m duvertexcache.store",
+        description = "Lists the vertex caches of a project which are not used anymore, and removes them to keep the caches under a quota" )
+    parser.add_argument( 'root', help = "The project folder, searched for _VertexCache directories" )
+    parser.add_argument( '--quota', default = '', help = "The maximum size of the caches, like 500G. Without a quota, all the unused caches are removed" )
+    parser.add_argument( '--delete', action = 'store_true', help = "Actually removes the files; only reports what would be removed by default" )
+    parser.add_argument( '--json', default = '', help = "Writes the report to this JSON file" )
+    args = parser.parse_args( argv )
+
+    quota = parse_size( args.quota ) if args.quota != '' else -1
+    report = clean( args.root, quota, dry_run = not args.delete )
+    verb = "Removed " if args.delete else "Would remove "
+    for entry in report['evicted']:
+        print(verb + entry['path'] + " (" + format_size(entry['size']) + ", last used " + time.strftime( '%Y-%m-%d', time.localtime(entry['last_use']) ) + ")")
+    print(str(report['num_files']) + " cache files, " + format_size(report['total_size']) + ": " + format_size(report['used_size']) + " used, "
+        + format_size(report['unused_size']) + " unused, " + format_size(report['unknown_size']) + " of files without references")
+    print(verb + format_size(report['evicted_size']))
+    if report['over_quota']:
+        print("The caches are still over the quota, the remaining ones are used")
+    for path in report['failed']:
+        print("Cannot remove " + path)
+    if args.json != '':
+        with open(args.json, 'w') as f:
+            json.dump( report, f, indent = 4 )
+    return 1 if len(report['failed']) > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit( main( sys.argv[1:] ) )
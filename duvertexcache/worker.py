@@ -0,0 +1,64 @@
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTIBILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# <pep8 compliant>
+
+# Bakes a slice of the frame range in a background Blender process, see parallel.py
+# Usage: blender --background file.blend --python worker.py -- task.json
+
+import bpy # pylint: disable=import-error
+
+import importlib
+import json
+import os
+import sys
+
+# This script is run by Blender as a file, make the package importable, whatever the name of its folder
+package_dir = os.path.dirname( os.path.abspath(__file__) )
+sys.path.insert( 0, os.path.dirname( package_dir ) )
+bake = importlib.import_module( os.path.basename( package_dir ) + '.bake' )
+pc2 = importlib.import_module( os.path.basename( package_dir ) + '.pc2' )
+
+def main():
+    task_path = sys.argv[ sys.argv.index('--') + 1 ]
+    with open(task_path, 'r') as f:
+        task = json.load( f )
+
+    jobs = []
+    for item in task['objects']:
+        obj = bpy.data.objects.get( item['name'] )
+        if obj is None:
+            raise RuntimeError( "Object " + item['name'] + " not found" )
+        job = bake.CacheJob( obj, item['filepath'], world_space = item['world_space'] )
+        if item.get( 'transforms', '' ) != '':
+            job.matrices = []
+        jobs.append( job )
+
+    bake.bake(
+        bpy.context,
+        jobs,
+        task['start'],
+        task['end'],
+        task['sampling'],
+        sample_range = tuple(task['sample_range'])
+        )
+
+    # the world matrices of the samples of the slice
+    first, stop = task['sample_range']
+    times = pc2.sample_times( task['start'], task['end'], task['sampling'] )[first:stop]
+    for job, item in zip( jobs, task['objects'] ):
+        if job.matrices is not None:
+            bake.save_transforms( item['transforms'], times, job.matrices )
+
+if __name__ == '__main__':
+    main()